@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Local stand-in for api.leneda.eu (Pure Python stdlib)
+License: GPL-3.0
+
+Serves deterministic synthetic 15-minute and aggregated series in the shape
+of the real Leneda API, with configurable latency, 429 injection and payload
+padding. Used by run_benchmark.py; can also be started on its own:
+
+    python3 fake_leneda.py --port 8765 --latency-ms 150 --rate-limit 0.05
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+STEP_SECONDS = 900
+
+PRODUCTION_OBIS = '1-1:2.29.0'
+
+
+def parse_time(value):
+    """Parse a Leneda date or ISO-8601 timestamp to epoch seconds (UTC)"""
+    if len(value) == 10:
+        value += 'T00:00:00Z'
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+
+
+def format_time(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def power_kw(obis_code, ts):
+    """Deterministic synthetic average power of the interval starting at ts"""
+    hour = (ts % 86400) / 3600
+    noise = ((ts * 2654435761) % 1000) / 1000
+    if obis_code == PRODUCTION_OBIS:
+        # Solar bell curve between 06:00 and 20:00 UTC
+        return round(max(0.0, math.sin((hour - 6) / 14 * math.pi)) * 4.0 * (0.8 + 0.2 * noise), 3)
+    # Base load with morning and evening peaks
+    shape = 0.3 + 0.8 * math.exp(-((hour - 7.5) ** 2) / 2) + 1.4 * math.exp(-((hour - 19) ** 2) / 4)
+    return round(shape * (0.7 + 0.6 * noise), 3)
+
+
+class FakeLeneda:
+    """Settings and call statistics shared by all request threads"""
+
+    def __init__(self, latency_ms=100, rate_limit=0.0, pad_bytes=0, seed=1):
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.padding = 'x' * pad_bytes
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.rate_limited = 0
+        self.bytes_sent = 0
+
+    def record(self, endpoint, size=0, limited=False):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            self.bytes_sent += size
+            if limited:
+                self.rate_limited += 1
+
+    def should_limit(self):
+        with self.lock:
+            return self.random.random() < self.rate_limit
+
+    def stats(self):
+        with self.lock:
+            return {
+                'calls': dict(self.calls),
+                'total_calls': sum(self.calls.values()),
+                'rate_limited': self.rate_limited,
+                'bytes_sent': self.bytes_sent,
+            }
+
+    def time_series(self, metering_point, obis_code, start, end):
+        first = start - start % STEP_SECONDS
+        items = []
+        for ts in range(first, end + 1, STEP_SECONDS):
+            item = {
+                'value': power_kw(obis_code, ts),
+                'startedAt': format_time(ts),
+                'type': 'Actual',
+                'version': 2,
+                'calculated': False,
+            }
+            if self.padding:
+                item['padding'] = self.padding
+            items.append(item)
+        return {
+            'meteringPointCode': metering_point,
+            'obisCode': obis_code,
+            'intervalLength': 'PT15M',
+            'unit': 'kW',
+            'items': items,
+        }
+
+    def aggregated(self, metering_point, obis_code, start, end, level):
+        width = {'Hour': 3600, 'Day': 86400, 'Week': 7 * 86400, 'Month': 30 * 86400}.get(level)
+        end = end + 86400
+        buckets = [(start, end)] if width is None else [
+            (bucket, min(bucket + width, end)) for bucket in range(start, end, width)
+        ]
+        return {
+            'meteringPointCode': metering_point,
+            'obisCode': obis_code,
+            'aggregationLevel': level,
+            'unit': 'kWh',
+            'aggregatedTimeSeries': [
+                {
+                    'value': round(sum(power_kw(obis_code, ts) for ts in range(first, last, STEP_SECONDS)) / 4, 3),
+                    'startedAt': format_time(first),
+                    'endedAt': format_time(last),
+                    'calculated': False,
+                }
+                for first, last in buckets
+            ],
+        }
+
+
+class FakeLenedaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, data, headers=()):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        parts = parsed.path.strip('/').split('/')
+
+        if parsed.path == '/__stats':
+            self.send_body(200, self.fake.stats())
+            return
+        if len(parts) < 4 or parts[:2] != ['api', 'metering-points'] or parts[3] != 'time-series':
+            self.send_body(404, {'error': 'not found'})
+            return
+        if not self.headers.get('X-API-KEY') or not self.headers.get('X-ENERGY-ID'):
+            self.send_body(401, {'error': 'missing credentials'})
+            return
+
+        endpoint = 'aggregated-time-series' if parts[-1] == 'aggregated' else 'time-series'
+        time.sleep(self.fake.latency)
+        if self.fake.should_limit():
+            self.fake.record(endpoint, limited=True)
+            self.send_body(429, {'error': 'Too Many Requests'}, [('Retry-After', '1')])
+            return
+
+        try:
+            metering_point = parts[2]
+            obis_code = query['obisCode']
+            if endpoint == 'time-series':
+                data = self.fake.time_series(metering_point, obis_code, parse_time(query['startDateTime']),
+                                             parse_time(query['endDateTime']))
+            else:
+                data = self.fake.aggregated(metering_point, obis_code, parse_time(query['startDate']),
+                                            parse_time(query['endDate']), query.get('aggregationLevel', 'Day'))
+        except (KeyError, ValueError) as e:
+            self.send_body(400, {'error': f'bad request: {e}'})
+            return
+        self.fake.record(endpoint, self.send_body(200, data))
+
+
+def start(port=0, **settings):
+    """Start the fake API in a background thread; return (server, FakeLeneda)"""
+    fake = FakeLeneda(**settings)
+    handler = type('BoundFakeLenedaHandler', (FakeLenedaHandler,), {'fake': fake})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-leneda', daemon=True).start()
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for api.leneda.eu')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--pad-bytes', type=int, default=0, help='extra bytes per time-series item')
+    args = parser.parse_args()
+
+    server, _ = start(args.port, latency_ms=args.latency_ms, rate_limit=args.rate_limit,
+                      pad_bytes=args.pad_bytes)
+    print(f"Fake Leneda API on http://127.0.0.1:{server.server_address[1]}/api", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Offline benchmark (Pure Python stdlib)
+License: GPL-3.0
+
+Starts the fake Leneda API and the real add-on server (rootfs/app/server.py)
+in a subprocess with a throw-away store, then drives it with concurrent
+simulated dashboard sessions that follow the request pattern of app.js:
+page and assets, health, config, the batched dashboard, the chart tab's
+consumption/production series for week/month/year, the invoice and an
+auto-refresh. Reports throughput, p50/p99 latency per route, upstream call
+counts and the server's peak RSS.
+
+    python3 benchmarks/run_benchmark.py --sessions 8 --rounds 5 --latency-ms 150
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import shutil
+import socket
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import date, timedelta
+
+import fake_leneda
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'rootfs', 'app')
+
+CONSUMPTION_OBIS = '1-1:1.29.0'
+PRODUCTION_OBIS = '1-1:2.29.0'
+
+_ASSET_RE = re.compile(r'(?:src|href)="([^"?#:]+\.(?:js|css))"')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def peak_rss_kb(pid):
+    """Peak resident set size of a running process (Linux), or None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def session_requests(meter_codes, today=None):
+    """The (route, path) sequence of one dashboard visit, mirroring app.js"""
+    yesterday = (today or date.today()) - timedelta(days=1)
+    last_month_end = yesterday.replace(day=1) - timedelta(days=1)
+    last_month_start = last_month_end.replace(day=1)
+    meter = meter_codes[0]
+
+    requests = [
+        ('/api/health', '/api/health'),
+        ('/api/config', '/api/config'),
+        ('/api/dashboard', '/api/dashboard'),
+    ]
+    for days, level in ((7, 'Day'), (30, 'Day'), (365, 'Month')):
+        start = yesterday - timedelta(days=days)
+        for obis_code in (CONSUMPTION_OBIS, PRODUCTION_OBIS):
+            requests.append(('/api/aggregated-data',
+                             f'/api/aggregated-data?metering_point={meter}&obis_code={obis_code}'
+                             f'&start_date={start}&end_date={yesterday}&aggregation_level={level}'))
+    requests.append(('/api/metering-data',
+                     f'/api/metering-data?metering_point={meter}&obis_code={CONSUMPTION_OBIS}'
+                     f'&start_date={yesterday}T00:00:00Z&end_date={yesterday}T23:59:59Z'))
+    requests.append(('/api/calculate-invoice',
+                     f'/api/calculate-invoice?metering_point={meter}'
+                     f'&start_date={last_month_start}&end_date={last_month_end}'))
+    # Auto-refresh
+    requests.append(('/api/dashboard', '/api/dashboard'))
+    return requests
+
+
+class Recorder:
+    """Latency samples per route, shared by all session threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.bytes = 0
+
+    def add(self, route, seconds, status, size):
+        with self.lock:
+            self.samples.setdefault(route, []).append(seconds)
+            self.bytes += size
+            if status >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def run_session(port, meter_codes, rounds, recorder):
+    """One browser tab: a keep-alive connection replaying the dashboard visit"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+
+    def fetch(route, path):
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            body = response.read()
+            status = response.status
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            body, status = b'', 599
+        recorder.add(route, time.perf_counter() - started, status, len(body))
+        return body
+
+    for _ in range(rounds):
+        page = fetch('static', '/')
+        for asset in _ASSET_RE.findall(page.decode('utf-8', 'replace')):
+            fetch('static', '/' + asset)
+        for route, path in session_requests(meter_codes):
+            fetch(route, path)
+    conn.close()
+
+
+def free_port(port=0):
+    """port if nothing listens on it on 127.0.0.1, else OSError; port 0 picks a free one"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', port))
+        return sock.getsockname()[1]
+
+
+def wait_for_health(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                # Another process holding the port answers too; the server under test must still run
+                if process.poll() is not None:
+                    raise RuntimeError(f"server exited with status {process.returncode}")
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not become healthy')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the Leneda dashboard server')
+    parser.add_argument('--sessions', type=int, default=4, help='concurrent dashboard sessions')
+    parser.add_argument('--rounds', type=int, default=3, help='dashboard visits per session')
+    parser.add_argument('--meters', type=int, default=1, help='configured metering points')
+    parser.add_argument('--latency-ms', type=float, default=100, help='fake upstream latency')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='fraction of upstream calls answered 429')
+    parser.add_argument('--pad-bytes', type=int, default=0, help='extra bytes per upstream time-series item')
+    parser.add_argument('--port', type=int, default=0, help='port for the server under test (default: a free one)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary directory and server log')
+    args = parser.parse_args()
+    try:
+        args.port = free_port(args.port)
+    except OSError as e:
+        parser.error(f"port {args.port} is not available: {e}")
+
+    fake_server, fake = fake_leneda.start(latency_ms=args.latency_ms, rate_limit=args.rate_limit,
+                                          pad_bytes=args.pad_bytes)
+    workdir = tempfile.mkdtemp(prefix='leneda-bench-')
+    meter_codes = [f"LU{i:030d}" for i in range(1, args.meters + 1)]
+    with open(os.path.join(workdir, 'test_options.json'), 'w') as f:
+        json.dump({
+            'api_key': 'benchmark-api-key',
+            'energy_id': 'benchmark-energy-id',
+            'metering_points': [{'code': code, 'name': f'Meter {i}', 'type': 'both'}
+                                for i, code in enumerate(meter_codes, start=1)],
+            'billing': {},
+            'prefetch': {'enabled': False},
+            'log_level': 'warning',
+        }, f)
+
+    env = dict(os.environ,
+               LENEDA_API_BASE=f"http://127.0.0.1:{fake_server.server_address[1]}/api",
+               LENEDA_STATIC_DIR=os.path.join(APP_DIR, 'static'),
+               LENEDA_STORE_FILE=os.path.join(workdir, 'cache.sqlite3'),
+               LENEDA_PORT=str(args.port))
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    process = subprocess.Popen([sys.executable, os.path.join(APP_DIR, 'server.py')],
+                               cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    recorder = Recorder()
+    try:
+        wait_for_health(args.port, process)
+        started = time.perf_counter()
+        threads = [threading.Thread(target=run_session, args=(args.port, meter_codes, args.rounds, recorder))
+                   for _ in range(args.sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        rss_kb = peak_rss_kb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        log.close()
+        fake_server.shutdown()
+    if rss_kb is None:
+        rss_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    total_requests = sum(len(samples) for samples in recorder.samples.values())
+    everything = [s for samples in recorder.samples.values() for s in samples]
+    report = {
+        'sessions': args.sessions,
+        'rounds': args.rounds,
+        'requests': total_requests,
+        'errors': sum(recorder.errors.values()),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(total_requests / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(everything, 0.50) * 1000, 1),
+        'p99_ms': round(percentile(everything, 0.99) * 1000, 1),
+        'response_bytes': recorder.bytes,
+        'routes': {
+            route: {
+                'count': len(samples),
+                'errors': recorder.errors.get(route, 0),
+                'p50_ms': round(percentile(samples, 0.50) * 1000, 1),
+                'p99_ms': round(percentile(samples, 0.99) * 1000, 1),
+            }
+            for route, samples in sorted(recorder.samples.items())
+        },
+        'upstream': fake.stats(),
+        'server_peak_rss_kb': rss_kb,
+    }
+
+    if args.keep:
+        report['workdir'] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Sessions: {args.sessions} x {args.rounds} rounds, upstream latency {args.latency_ms:.0f} ms, "
+          f"429 rate {args.rate_limit:.0%}")
+    print(f"Requests: {total_requests} in {elapsed:.2f}s = {report['throughput_rps']} req/s, "
+          f"{report['errors']} errors, {recorder.bytes} response bytes")
+    print(f"Latency:  p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms")
+    print(f"{'route':<26}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for route, stats in report['routes'].items():
+        print(f"{route:<26}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}{stats['p99_ms']:>10}")
+    upstream = report['upstream']
+    print(f"Upstream: {upstream['total_calls']} calls {upstream['calls']}, "
+          f"{upstream['rate_limited']} answered 429, {upstream['bytes_sent']} bytes")
+    print(f"Server peak RSS: {rss_kb / 1024:.1f} MiB")
+    if args.keep:
+        print(f"Work directory: {workdir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Add-on configuration (Pure Python stdlib)
+License: GPL-3.0
+
+Loads /data/options.json once, validates it against the add-on schema and
+exposes it as an immutable, typed AddonConfig. The file is only re-read when
+its mtime, inode or size changes, so request handlers get the current
+configuration without touching the disk or flooding the log.
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from dataclasses import dataclass, field, asdict
+
+from tariffs import TARIFF_TYPES, parse_windows
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = '/data/options.json'
+CONFIG_PATHS = (CONFIG_FILE, 'test_options.json', './test_options.json')
+
+PLACEHOLDER_API_KEY = 'your-test-api-key'
+PLACEHOLDER_ENERGY_ID = 'your-test-energy-id'
+PLACEHOLDER_METER_CODE = 'LU000000000000000000000000000000'
+
+# Mirror of the `schema:` section in config.yaml - keep both in sync
+SCHEMA = {
+    'api_key': 'password',
+    'energy_id': 'str',
+    'metering_points': [{
+        'code': 'str',
+        'name': 'str',
+        'type': 'list(consumption|production|both)',
+        'sharing': 'bool?',
+    }],
+    'billing': {
+        'energy_supplier_name': 'str?',
+        'energy_fixed_fee_monthly': 'float(0,1000)',
+        'energy_variable_rate_per_kwh': 'float(0,2)',
+        'network_operator_name': 'str?',
+        'network_metering_fee_monthly': 'float(0,100)',
+        'network_power_reference_fee_monthly': 'float(0,300)',
+        'network_variable_rate_per_kwh': 'float(0,1)',
+        'exceedance_rate_per_kwh': 'float(0,1)',
+        'compensation_fund_rate_per_kwh': 'float?',
+        'electricity_tax_per_kwh': 'float(0,0.1)',
+        'vat_rate': 'float(0,0.5)',
+        'reference_power_kw': 'float(1,100)',
+        'currency': 'list(EUR|USD|CHF)?',
+        'tariff': 'str?',
+    },
+    'tariffs': [{
+        'name': 'str',
+        'type': f"list({'|'.join(TARIFF_TYPES)})",
+        'rate_per_kwh': 'float(0,2)?',
+        'windows': 'str?',
+        'prices_file': 'str?',
+        'markup_per_kwh': 'float(-1,2)?',
+    }],
+    'display': {
+        'theme': 'list(dark|light|auto)?',
+        'language': 'list(en|de|fr|lb)?',
+        'update_interval_seconds': 'int(60,3600)?',
+        'default_date_range': 'list(day|week|month|year)?',
+        'show_gas_data': 'bool?',
+    },
+    'prefetch': {
+        'enabled': 'bool?',
+        'time': 'match(^([01]\\d|2[0-3]):[0-5]\\d$)?',
+        'jitter_minutes': 'int(0,120)?',
+        'retry_interval_minutes': 'int(5,360)?',
+        'max_retries': 'int(0,24)?',
+    },
+    'backfill': {
+        'enabled': 'bool?',
+        'start_date': 'match(^(\\d{4}-\\d{2}-\\d{2})?$)?',
+        'months': 'int(1,120)?',
+        'requests_per_minute': 'int(1,120)?',
+        'workers': 'int(1,4)?',
+    },
+    'api_timeout_seconds': 'int(5,120)?',
+    'api_max_retries': 'int(0,10)?',
+    'api_requests_per_minute': 'int(1,600)?',
+    'api_burst': 'int(1,60)?',
+    'log_level': 'list(debug|info|warning|error)?',
+    'log_format': 'list(text|json)?',
+}
+
+_RULE_RE = re.compile(r'^(\w+)(?:\((.*)\))?(\?)?$')
+
+
+class ConfigError(ValueError):
+    """A configuration value does not match the add-on schema"""
+
+
+def validate_value(rule, value, path):
+    """Check a scalar against a Supervisor schema rule like 'float(0,2)' and return it"""
+    kind, args, _optional = _RULE_RE.match(rule).groups()
+    if kind in ('str', 'password'):
+        if not isinstance(value, str):
+            raise ConfigError(f"{path}: expected a string")
+        return value
+    if kind == 'bool':
+        if not isinstance(value, bool):
+            raise ConfigError(f"{path}: expected a boolean")
+        return value
+    if kind == 'list':
+        if value not in args.split('|'):
+            raise ConfigError(f"{path}: must be one of {args.replace('|', ', ')}")
+        return value
+    if kind == 'match':
+        if not isinstance(value, str) or not re.match(args, value):
+            raise ConfigError(f"{path}: must match {args}")
+        return value
+    if kind in ('int', 'float'):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ConfigError(f"{path}: expected a number")
+        if kind == 'int' and value != int(value):
+            raise ConfigError(f"{path}: expected an integer")
+        value = int(value) if kind == 'int' else float(value)
+        if args:
+            low, high = (float(bound) if bound else None for bound in args.split(','))
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise ConfigError(f"{path}: {value} outside range {args}")
+        return value
+    raise ConfigError(f"{path}: unknown schema rule {rule}")
+
+
+def validate_section(schema, raw, path, problems):
+    """Return the values of raw that satisfy schema, collecting problems"""
+    valid = {}
+    for key, rule in schema.items():
+        if key not in raw or raw[key] is None:
+            if not rule.endswith('?'):
+                problems.append(f"{path}{key}: missing, using default")
+            continue
+        try:
+            valid[key] = validate_value(rule, raw[key], f"{path}{key}")
+        except ConfigError as e:
+            problems.append(str(e))
+    return valid
+
+
+@dataclass(frozen=True)
+class MeteringPoint:
+    code: str
+    name: str = 'Unnamed'
+    type: str = 'consumption'
+    sharing: bool = False
+
+
+@dataclass(frozen=True)
+class BillingConfig:
+    energy_supplier_name: str = 'Enovos'
+    energy_fixed_fee_monthly: float = 1.50
+    energy_variable_rate_per_kwh: float = 0.1500
+    network_operator_name: str = 'Creos'
+    network_metering_fee_monthly: float = 5.90
+    network_power_reference_fee_monthly: float = 19.27
+    network_variable_rate_per_kwh: float = 0.0759
+    exceedance_rate_per_kwh: float = 0.1139
+    compensation_fund_rate_per_kwh: float = -0.0376
+    electricity_tax_per_kwh: float = 0.0010
+    vat_rate: float = 0.08
+    reference_power_kw: float = 12.0
+    currency: str = 'EUR'
+    tariff: str = ''
+
+
+@dataclass(frozen=True)
+class TariffConfig:
+    name: str
+    type: str = 'flat'
+    rate_per_kwh: float = 0.1500
+    windows: str = ''
+    prices_file: str = ''
+    markup_per_kwh: float = 0.0
+
+
+@dataclass(frozen=True)
+class DisplayConfig:
+    theme: str = 'dark'
+    language: str = 'en'
+    update_interval_seconds: int = 300
+    default_date_range: str = 'week'
+    show_gas_data: bool = False
+
+
+@dataclass(frozen=True)
+class PrefetchConfig:
+    enabled: bool = True
+    time: str = '07:00'
+    jitter_minutes: int = 30
+    retry_interval_minutes: int = 60
+    max_retries: int = 6
+
+
+@dataclass(frozen=True)
+class BackfillConfig:
+    enabled: bool = True
+    start_date: str = ''
+    months: int = 12
+    requests_per_minute: int = 6
+    workers: int = 2
+
+
+@dataclass(frozen=True)
+class AddonConfig:
+    api_key: str = ''
+    energy_id: str = ''
+    metering_points: tuple = ()
+    tariffs: tuple = ()
+    billing: BillingConfig = field(default_factory=BillingConfig)
+    display: DisplayConfig = field(default_factory=DisplayConfig)
+    prefetch: PrefetchConfig = field(default_factory=PrefetchConfig)
+    backfill: BackfillConfig = field(default_factory=BackfillConfig)
+    api_timeout_seconds: int = 15
+    api_max_retries: int = 3
+    api_requests_per_minute: int = 60
+    api_burst: int = 10
+    log_level: str = 'info'
+    log_format: str = 'text'
+    source: str = None
+    problems: tuple = ()
+
+    @property
+    def has_api_key(self):
+        """True if a real (non-placeholder) API key is configured"""
+        return bool(self.api_key.strip() and self.api_key != PLACEHOLDER_API_KEY)
+
+    @property
+    def has_energy_id(self):
+        """True if a real (non-placeholder) Energy ID is configured"""
+        return bool(self.energy_id.strip() and self.energy_id != PLACEHOLDER_ENERGY_ID)
+
+    def frontend_view(self):
+        """Configuration safe to hand to the browser (no secrets)"""
+        return {
+            'has_api_key': self.has_api_key,
+            'has_energy_id': self.has_energy_id,
+            'metering_points': [asdict(mp) for mp in self.metering_points],
+            'tariffs': [asdict(tariff) for tariff in self.tariffs],
+            'billing': asdict(self.billing),
+            'display': asdict(self.display),
+        }
+
+
+def parse_config(raw, source=None):
+    """Validate a raw options dict and build an AddonConfig"""
+    if not isinstance(raw, dict):
+        raise ConfigError('options must be a JSON object')
+
+    problems = []
+    top = validate_section(
+        {key: rule for key, rule in SCHEMA.items() if isinstance(rule, str)}, raw, '', problems
+    )
+
+    meters = []
+    for i, entry in enumerate(raw.get('metering_points') or []):
+        if not isinstance(entry, dict):
+            problems.append(f"metering_points[{i}]: expected an object")
+            continue
+        values = validate_section(SCHEMA['metering_points'][0], entry, f"metering_points[{i}].", problems)
+        if values.get('code'):
+            meters.append(MeteringPoint(**values))
+
+    tariffs = parse_tariffs(raw.get('tariffs'), problems)
+
+    sections = {}
+    for name, cls in (('billing', BillingConfig), ('display', DisplayConfig),
+                      ('prefetch', PrefetchConfig), ('backfill', BackfillConfig)):
+        section = raw.get(name) or {}
+        if not isinstance(section, dict):
+            problems.append(f"{name}: expected an object")
+            section = {}
+        sections[name] = cls(**validate_section(SCHEMA[name], section, f"{name}.", problems))
+
+    billing = sections['billing']
+    if billing.tariff and billing.tariff not in {tariff.name for tariff in tariffs}:
+        problems.append(f"billing.tariff: no tariff named '{billing.tariff}', using the flat rate")
+
+    return AddonConfig(
+        metering_points=tuple(meters),
+        tariffs=tariffs,
+        source=source,
+        problems=tuple(problems),
+        **sections,
+        **top,
+    )
+
+
+def parse_tariffs(raw, problems, path='tariffs'):
+    """Validate a list of tariff definitions, collecting problems"""
+    if raw is None:
+        return ()
+    if not isinstance(raw, list):
+        problems.append(f"{path}: expected a list")
+        return ()
+
+    tariffs = []
+    for i, entry in enumerate(raw):
+        if not isinstance(entry, dict):
+            problems.append(f"{path}[{i}]: expected an object")
+            continue
+        before = len(problems)
+        values = validate_section(SCHEMA['tariffs'][0], entry, f"{path}[{i}].", problems)
+        if len(problems) > before or not values.get('name'):
+            continue
+        try:
+            tariff = TariffConfig(**values)
+            if tariff.type == 'time_of_use':
+                parse_windows(tariff.windows)
+            if tariff.type == 'dynamic' and not tariff.prices_file:
+                raise ValueError('dynamic tariffs need a prices_file')
+        except ValueError as e:
+            problems.append(f"{path}[{i}]: {e}")
+            continue
+        tariffs.append(tariff)
+    return tuple(tariffs)
+
+
+class ConfigLoader:
+    """Serves the current AddonConfig, re-reading the file only when it changes"""
+
+    def __init__(self, paths=CONFIG_PATHS):
+        self.paths = paths
+        self._lock = threading.Lock()
+        self._signature = None
+        self._config = AddonConfig()
+
+    def _find(self):
+        """Return (path, stat signature) of the first existing config file"""
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            return path, (path, st.st_ino, st.st_mtime_ns, st.st_size)
+        return None, None
+
+    def get(self):
+        """Return the current configuration, reloading it if the file changed"""
+        path, signature = self._find()
+        if signature == self._signature:
+            return self._config
+
+        with self._lock:
+            if signature == self._signature:
+                return self._config
+            if path is None:
+                logger.error(f"❌ No config file found in paths: {list(self.paths)}")
+                logger.error("❌ This will cause the dashboard to show 'API credentials not configured'")
+                self._config = AddonConfig()
+            else:
+                try:
+                    with open(path, 'r') as f:
+                        self._config = parse_config(json.load(f), source=path)
+                    log_config(self._config)
+                except (OSError, ValueError) as e:
+                    # Keep serving the last good configuration
+                    logger.error(f"💥 Error loading config from {path}: {e}")
+            self._signature = signature
+            return self._config
+
+
+def log_config(config):
+    """Log a (secret-safe) summary of a freshly loaded configuration"""
+    logger.info(f"✅ Config loaded successfully from: {config.source}")
+    logger.info(f"🔑 API key present: {config.has_api_key}")
+    if config.has_api_key:
+        logger.info(f"🔑 API key format: ****{config.api_key[-4:]} (length: {len(config.api_key)})")
+    else:
+        logger.warning(f"🔑 API key value: '{config.api_key}' (placeholder or empty)")
+
+    logger.info(f"🆔 Energy ID present: {config.has_energy_id}")
+    if config.has_energy_id:
+        logger.info(f"🆔 Energy ID: {config.energy_id}")
+    else:
+        logger.warning(f"🆔 Energy ID value: '{config.energy_id}' (placeholder or empty)")
+
+    logger.info(f"📊 Metering points configured: {len(config.metering_points)}")
+    for i, mp in enumerate(config.metering_points):
+        logger.info(f"📊 Meter {i+1}: '{mp.name}' -> {mp.code}")
+        if mp.code == PLACEHOLDER_METER_CODE:
+            logger.warning(f"📊 Meter {i+1} uses placeholder code!")
+
+    for problem in config.problems:
+        logger.warning(f"⚠️ Config schema: {problem}")
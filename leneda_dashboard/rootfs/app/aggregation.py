@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Local aggregation engine (Pure Python stdlib)
+License: GPL-3.0
+
+Computes Hour/Day/Week/Month/Infinite rollups from the cached 15-minute
+readings instead of asking Leneda for each aggregation level.
+
+Each UTC day is held as an array('d') of interval energies plus its prefix
+sums, so the total of any slot range inside a day is a single subtraction.
+Day totals are accumulated once more across the requested range, making
+every Week/Month/Infinite bucket an O(1) lookup as well.
+
+Buckets follow UTC day boundaries, not Luxembourg local midnight, so Day,
+Week and Month totals can differ from Leneda's by the energy of the hour or
+two between the two midnights.
+"""
+
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import date, timedelta
+from itertools import accumulate
+
+from store import DAY_SECONDS, first_open_day, format_timestamp
+from series import interval_seconds, read_series
+
+logger = logging.getLogger(__name__)
+
+AGGREGATION_LEVELS = ('Hour', 'Day', 'Week', 'Month', 'Infinite')
+
+# Power units are averaged over the interval and must be integrated to energy
+POWER_UNITS = {'kW': 'kWh', 'kVAR': 'kVARh', 'W': 'Wh'}
+
+EPOCH = date(1970, 1, 1)
+
+
+def day_to_date(day):
+    """Convert a UTC day number to a date"""
+    return EPOCH + timedelta(days=day)
+
+
+def date_to_day(value):
+    """Convert a date to a UTC day number"""
+    return (value - EPOCH).days
+
+
+def month_spans(first_day, last_day):
+    """Split [first_day, last_day] into (first, last) day ranges per calendar month"""
+    spans = []
+    day = first_day
+    while day <= last_day:
+        current = day_to_date(day)
+        next_month = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        end = min(date_to_day(next_month), last_day + 1)
+        spans.append((day, end - 1))
+        day = end
+    return spans
+
+
+class DayProfile:
+    """Interval energies of one UTC day with prefix sums for O(1) slot ranges"""
+
+    __slots__ = ('energy', 'prefix', 'calculated_prefix')
+
+    def __init__(self, energy, calculated):
+        self.energy = energy
+        self.prefix = array('d', accumulate(energy, initial=0.0))
+        self.calculated_prefix = array('l', accumulate(calculated, initial=0))
+
+    @property
+    def total(self):
+        return self.prefix[-1]
+
+    def slot_sum(self, first_slot, end_slot):
+        """Sum of slots [first_slot, end_slot)"""
+        return self.prefix[end_slot] - self.prefix[first_slot]
+
+    def slot_calculated(self, first_slot, end_slot):
+        """Whether any slot in [first_slot, end_slot) was estimated by Leneda"""
+        return self.calculated_prefix[end_slot] > self.calculated_prefix[first_slot]
+
+
+class AggregationEngine:
+    """Builds Leneda-shaped aggregated responses from the local store"""
+
+    def __init__(self, store, max_cached_days=8192):
+        self.store = store
+        self.max_cached_days = max_cached_days
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, metering_point, obis_code, first_day, last_day):
+        """Drop cached day profiles after the store was updated"""
+        with self._lock:
+            for day in range(first_day, last_day + 1):
+                self._profiles.pop((metering_point, obis_code, day), None)
+
+    def day_profiles(self, metering_point, obis_code, first_day, last_day):
+        """Return (profiles, unit, step) for each day in [first_day, last_day]"""
+        unit, interval_length = self.store.series_info(metering_point, obis_code)
+        step = interval_seconds(interval_length)
+        slots = DAY_SECONDS // step
+        factor = step / 3600 if unit in POWER_UNITS else 1.0
+        open_day = first_open_day()
+
+        profiles = [None] * (last_day - first_day + 1)
+        with self._lock:
+            for day in range(first_day, last_day + 1):
+                key = (metering_point, obis_code, day)
+                if key in self._profiles:
+                    self._profiles.move_to_end(key)
+                    profiles[day - first_day] = self._profiles[key]
+
+        missing = [i for i, profile in enumerate(profiles) if profile is None]
+        if missing:
+            load_first = first_day + missing[0]
+            load_last = first_day + missing[-1]
+            series = read_series(self.store, metering_point, obis_code,
+                                 load_first * DAY_SECONDS, (load_last + 1) * DAY_SECONDS - 1)
+
+            with self._lock:
+                for i in missing:
+                    day = first_day + i
+                    profile = DayProfile(*series.window(day * DAY_SECONDS, slots, factor))
+                    profiles[i] = profile
+                    # Only finalized days are immutable and worth keeping around
+                    if day < open_day:
+                        self._profiles[(metering_point, obis_code, day)] = profile
+                while len(self._profiles) > self.max_cached_days:
+                    self._profiles.popitem(last=False)
+
+        return profiles, POWER_UNITS.get(unit, unit), step
+
+    def aggregate(self, metering_point, obis_code, first_day, last_day, level):
+        """Return a Leneda-shaped aggregated response for [first_day, last_day]"""
+        if level not in AGGREGATION_LEVELS:
+            raise ValueError(f"Unsupported aggregation level: {level}")
+
+        profiles, unit, step = self.day_profiles(metering_point, obis_code, first_day, last_day)
+        day_totals = array('d', accumulate((p.total for p in profiles), initial=0.0))
+        day_calculated = list(accumulate((p.slot_calculated(0, len(p.energy)) for p in profiles), initial=0))
+
+        def span(first, end):
+            """Total and calculated flag of days [first, end) relative to first_day"""
+            return (day_totals[end - first_day] - day_totals[first - first_day],
+                    day_calculated[end - first_day] > day_calculated[first - first_day])
+
+        buckets = []
+        if level == 'Hour':
+            per_hour = 3600 // step or 1
+            for i, profile in enumerate(profiles):
+                base = (first_day + i) * DAY_SECONDS
+                for first_slot in range(0, len(profile.energy), per_hour):
+                    end_slot = first_slot + per_hour
+                    start = base + first_slot * step
+                    buckets.append((start, start + per_hour * step,
+                                    profile.slot_sum(first_slot, end_slot),
+                                    profile.slot_calculated(first_slot, end_slot)))
+        elif level == 'Day':
+            for day in range(first_day, last_day + 1):
+                buckets.append((day * DAY_SECONDS, (day + 1) * DAY_SECONDS) + span(day, day + 1))
+        elif level == 'Week':
+            day = first_day
+            while day <= last_day:
+                # Day 0 (1970-01-01) was a Thursday; weeks start on Monday
+                end = min(day + 7 - (day + 3) % 7, last_day + 1)
+                buckets.append((day * DAY_SECONDS, end * DAY_SECONDS) + span(day, end))
+                day = end
+        elif level == 'Month':
+            for first, last in month_spans(first_day, last_day):
+                buckets.append((first * DAY_SECONDS, (last + 1) * DAY_SECONDS) + span(first, last + 1))
+        else:
+            buckets.append((first_day * DAY_SECONDS, (last_day + 1) * DAY_SECONDS)
+                           + span(first_day, last_day + 1))
+
+        return {
+            'meteringPointCode': metering_point,
+            'obisCode': obis_code,
+            'aggregationLevel': level,
+            'unit': unit,
+            'aggregatedTimeSeries': [
+                {
+                    'value': round(value, 6),
+                    'startedAt': format_timestamp(start),
+                    'endedAt': format_timestamp(end),
+                    'calculated': calculated,
+                }
+                for start, end, value, calculated in buckets
+            ],
+        }
+
+    def total(self, metering_point, obis_code, first_day, last_day):
+        """Return the energy total over [first_day, last_day]"""
+        profiles, _, _ = self.day_profiles(metering_point, obis_code, first_day, last_day)
+        return sum(p.total for p in profiles)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Energy flow analytics (Pure Python stdlib)
+License: GPL-3.0
+
+Combines the consumption, production and energy-sharing series of a meter
+on one 15-minute grid and derives, interval by interval, how much of the
+consumption the production could cover (self-consumed), what was imported
+from and exported to the grid, and how much was shared within an energy
+community. Each day is computed with whole-array operations over the cached
+day profiles and kept once it is closed, so month and year views are a few
+additions of per-day totals.
+
+Self-consumption is the overlap of the two series within each interval,
+so it only reflects what the meters report: a meter measuring grid import
+and export sees the netting inside an interval, while a separate production
+meter shows how much of the consumption the production could have covered.
+"""
+
+import threading
+from array import array
+from collections import OrderedDict
+from operator import add, sub
+
+from store import DAY_SECONDS, first_open_day, format_timestamp
+from aggregation import month_spans
+
+# Common interval grid all series are aligned to
+ANALYTICS_STEP = 900
+ANALYTICS_SLOTS = DAY_SECONDS // ANALYTICS_STEP
+
+# Energy-sharing series Leneda provides for members of a sharing group,
+# per sharing layer (1: AIR, 3: ACR/ACF/AC1, 2: CEL, 4: APS/CER/CEN)
+SHARED_CONSUMPTION_OBIS = ('1-65:1.29.1', '1-65:1.29.3', '1-65:1.29.2', '1-65:1.29.4')
+SHARED_PRODUCTION_OBIS = ('1-65:2.29.1', '1-65:2.29.3', '1-65:2.29.2', '1-65:2.29.4')
+
+RESOLUTIONS = ('Interval', 'Day', 'Month', 'Total')
+
+# Days an Interval response may span (96 values per day and series)
+MAX_INTERVAL_DAYS = 31
+
+# Order of the summed per-day figures in DayFlows.totals
+FLOW_FIELDS = ('consumption', 'production', 'self_consumed', 'grid_import', 'grid_export',
+               'shared_consumption', 'shared_production')
+
+
+def align(energy, slots=ANALYTICS_SLOTS):
+    """Resample one day of interval energies onto `slots` equal intervals"""
+    count = len(energy)
+    if count == slots:
+        return energy
+    if count > slots:
+        group = count // slots
+        return array('d', (sum(energy[i:i + group]) for i in range(0, group * slots, group)))
+    # Coarser series (e.g. hourly) are spread evenly over their sub-intervals
+    return array('d', (energy[i * count // slots] * count / slots for i in range(slots)))
+
+
+def check_resolution(resolution, first_day, last_day):
+    """Raise ValueError unless resolution can be used for [first_day, last_day]"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    if resolution == 'Interval' and last_day - first_day + 1 > MAX_INTERVAL_DAYS:
+        raise ValueError(f"Interval resolution is limited to {MAX_INTERVAL_DAYS} days")
+
+
+class FlowSources:
+    """The (metering_point, obis_code) series combined into one meter's energy flows"""
+
+    __slots__ = ('consumption', 'production', 'shared_consumption', 'shared_production')
+
+    def __init__(self, consumption=None, production=None, shared_consumption=(), shared_production=()):
+        self.consumption = consumption
+        self.production = production
+        self.shared_consumption = tuple(shared_consumption)
+        self.shared_production = tuple(shared_production)
+
+    def key(self):
+        return (self.consumption, self.production, self.shared_consumption, self.shared_production)
+
+    def series(self):
+        """Every series the flows are computed from"""
+        return [pair for pair in (self.consumption, self.production) if pair] + \
+            list(self.shared_consumption) + list(self.shared_production)
+
+    def uses(self, metering_point):
+        return any(pair[0] == metering_point for pair in self.series())
+
+
+class DayFlows:
+    """Energy flows of one UTC day on the common grid, in kWh per interval"""
+
+    __slots__ = ('consumption', 'production', 'self_consumed', 'shared_consumption',
+                 'totals', 'shared', 'peak_import', 'peak_export')
+
+    def __init__(self, consumption, production, shared_consumption, shared_totals, consumption_layers):
+        self.consumption = consumption
+        self.production = production
+        self.self_consumed = array('d', map(min, consumption, production))
+        self.shared_consumption = shared_consumption
+
+        consumed = sum(consumption)
+        produced = sum(production)
+        self_consumed = sum(self.self_consumed)
+        self.totals = array('d', (consumed, produced, self_consumed,
+                                  consumed - self_consumed, produced - self_consumed,
+                                  sum(shared_totals[:consumption_layers]),
+                                  sum(shared_totals[consumption_layers:])))
+        self.shared = shared_totals
+
+        net = self.net
+        self.peak_import = max(max(net), 0.0)
+        self.peak_export = max(-min(net), 0.0)
+
+    @property
+    def net(self):
+        return array('d', map(sub, self.consumption, self.production))
+
+
+class AnalyticsEngine:
+    """Self-consumption, autarky and energy-sharing figures from the day profiles"""
+
+    def __init__(self, aggregator, max_cached_days=2048):
+        self.aggregator = aggregator
+        self.max_cached_days = max_cached_days
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, metering_point, first_day, last_day):
+        """Drop cached days of every flow that uses metering_point"""
+        with self._lock:
+            stale = [key for key in self._days
+                     if first_day <= key[1] <= last_day and FlowSources(*key[0]).uses(metering_point)]
+            for key in stale:
+                del self._days[key]
+
+    def day_flows(self, sources, first_day, last_day):
+        """Return the DayFlows of each day in [first_day, last_day]"""
+        flows = [None] * (last_day - first_day + 1)
+        source_key = sources.key()
+        with self._lock:
+            for day in range(first_day, last_day + 1):
+                key = (source_key, day)
+                if key in self._days:
+                    self._days.move_to_end(key)
+                    flows[day - first_day] = self._days[key]
+
+        missing = [i for i, day_flows in enumerate(flows) if day_flows is None]
+        if not missing:
+            return flows
+
+        load_first = first_day + missing[0]
+        load_last = first_day + missing[-1]
+
+        def profiles(pair):
+            if pair is None:
+                return None
+            return self.aggregator.day_profiles(pair[0], pair[1], load_first, load_last)[0]
+
+        consumption = profiles(sources.consumption)
+        production = profiles(sources.production)
+        shared = [profiles(pair) for pair in sources.shared_consumption + sources.shared_production]
+        layers = len(sources.shared_consumption)
+        zeros = array('d', bytes(8 * ANALYTICS_SLOTS))
+
+        open_day = first_open_day()
+        with self._lock:
+            for i in missing:
+                day = first_day + i
+                j = day - load_first
+                shared_consumption = None
+                if layers:
+                    shared_consumption = array('d', zeros)
+                    for layer in shared[:layers]:
+                        shared_consumption = array('d', map(add, shared_consumption, align(layer[j].energy)))
+                day_flows = DayFlows(
+                    align(consumption[j].energy) if consumption else zeros,
+                    align(production[j].energy) if production else zeros,
+                    shared_consumption,
+                    array('d', (layer[j].total for layer in shared)),
+                    layers,
+                )
+                flows[i] = day_flows
+                # Closed days no longer change, so their flows are kept
+                if day < open_day:
+                    self._days[(source_key, day)] = day_flows
+            while len(self._days) > self.max_cached_days:
+                self._days.popitem(last=False)
+        return flows
+
+    def analyze(self, sources, first_day, last_day, resolution='Day'):
+        """Energy-flow report for [first_day, last_day] per Interval, Day, Month or as a Total"""
+        check_resolution(resolution, first_day, last_day)
+        flows = self.day_flows(sources, first_day, last_day)
+        shared_codes = [pair[1] for pair in sources.shared_consumption + sources.shared_production]
+
+        def bucket(first, last):
+            days = flows[first - first_day:last - first_day + 1]
+            totals = array('d', bytes(8 * len(FLOW_FIELDS)))
+            shared = array('d', bytes(8 * len(shared_codes)))
+            for day_flows in days:
+                totals = array('d', map(add, totals, day_flows.totals))
+                shared = array('d', map(add, shared, day_flows.shared))
+            figures = flow_figures(totals, max(d.peak_import for d in days), max(d.peak_export for d in days))
+            if shared_codes:
+                figures['shared_by_obis'] = {code: round(value, 3) for code, value in zip(shared_codes, shared)}
+            return {
+                'startedAt': format_timestamp(first * DAY_SECONDS),
+                'endedAt': format_timestamp((last + 1) * DAY_SECONDS),
+                **figures,
+            }
+
+        response = {
+            'meteringPointCode': sources.consumption[0] if sources.consumption else None,
+            'productionPointCode': sources.production[0] if sources.production else None,
+            'resolution': resolution,
+            'unit': 'kWh',
+            'obisCodes': {
+                'consumption': sources.consumption[1] if sources.consumption else None,
+                'production': sources.production[1] if sources.production else None,
+                'sharedConsumption': [pair[1] for pair in sources.shared_consumption],
+                'sharedProduction': [pair[1] for pair in sources.shared_production],
+            },
+            'totals': bucket(first_day, last_day),
+        }
+
+        if resolution == 'Day':
+            response['buckets'] = [bucket(day, day) for day in range(first_day, last_day + 1)]
+        elif resolution == 'Month':
+            response['buckets'] = [bucket(first, last) for first, last in month_spans(first_day, last_day)]
+        elif resolution == 'Interval':
+            response['intervals'] = interval_columns(flows, first_day)
+        return response
+
+
+def flow_figures(totals, peak_import, peak_export):
+    """Rounded kWh figures and ratios from summed FLOW_FIELDS totals"""
+    consumed, produced, self_consumed, grid_import, grid_export, shared_consumed, shared_produced = totals
+    hours = ANALYTICS_STEP / 3600
+    return {
+        'consumption_kwh': round(consumed, 3),
+        'production_kwh': round(produced, 3),
+        'self_consumed_kwh': round(self_consumed, 3),
+        'grid_import_kwh': round(grid_import, 3),
+        'grid_export_kwh': round(grid_export, 3),
+        'net_kwh': round(consumed - produced, 3),
+        'shared_consumption_kwh': round(shared_consumed, 3),
+        'shared_production_kwh': round(shared_produced, 3),
+        'remaining_consumption_kwh': round(consumed - shared_consumed, 3),
+        'remaining_production_kwh': round(produced - shared_produced, 3),
+        'peak_import_kw': round(peak_import / hours, 3),
+        'peak_export_kw': round(peak_export / hours, 3),
+        'self_consumption_ratio': round(self_consumed / produced, 4) if produced else None,
+        'autarky': round(self_consumed / consumed, 4) if consumed else None,
+        'sharing_coverage': round(shared_consumed / consumed, 4) if consumed else None,
+    }
+
+
+def interval_columns(flows, first_day):
+    """Per-interval arrays of a day range on the common grid"""
+    columns = {'consumption_kwh': [], 'production_kwh': [], 'self_consumed_kwh': [], 'net_kwh': []}
+    shared = any(day_flows.shared_consumption is not None for day_flows in flows)
+    if shared:
+        columns['shared_consumption_kwh'] = []
+    for day_flows in flows:
+        columns['consumption_kwh'].extend(round(value, 4) for value in day_flows.consumption)
+        columns['production_kwh'].extend(round(value, 4) for value in day_flows.production)
+        columns['self_consumed_kwh'].extend(round(value, 4) for value in day_flows.self_consumed)
+        columns['net_kwh'].extend(round(value, 4) for value in day_flows.net)
+        if shared:
+            columns['shared_consumption_kwh'].extend(round(value, 4) for value in day_flows.shared_consumption)
+    return {
+        'start': format_timestamp(first_day * DAY_SECONDS),
+        'step': ANALYTICS_STEP,
+        'count': len(flows) * ANALYTICS_SLOTS,
+        **columns,
+    }
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Historical backfill (Pure Python stdlib)
+License: GPL-3.0
+
+Loads the history of every configured series (back to backfill.start_date,
+e.g. the day the meter was commissioned) into the local store, one calendar
+month per upstream call. Calls go through a token bucket so a year of data
+never turns into a burst of 429s, and a small worker pool keeps a few
+windows in flight; the fetches themselves queue as bulk work in the
+upstream scheduler, behind anything a user is waiting for. Finished months
+are checkpointed to /data, so a restart resumes where the previous run
+stopped.
+"""
+
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from store import day_of, first_open_day, parse_timestamp
+from aggregation import day_to_date, date_to_day, month_spans
+from scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = os.environ.get('LENEDA_BACKFILL_FILE', '/data/leneda_backfill.json')
+
+# Delay before the first pass after the add-on starts, and between passes
+STARTUP_DELAY_SECONDS = 60
+RETRY_DELAY_SECONDS = 900
+IDLE_DELAY_SECONDS = 3600
+
+# Days per month used to turn backfill.months into a start day
+DAYS_PER_MONTH = 31
+
+
+class Checkpoint:
+    """Set of finished window keys, persisted as JSON (in memory if /data is missing)"""
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        directory = os.path.dirname(path)
+        self.path = path if directory and os.path.isdir(directory) else None
+        self._lock = threading.Lock()
+        self.done = set()
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.done = set(json.load(f).get('done', []))
+                logger.info(f"📚 Backfill checkpoint loaded: {len(self.done)} months done")
+            except (OSError, ValueError, AttributeError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable backfill checkpoint {self.path}: {e}")
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self.done
+
+    def add(self, key):
+        with self._lock:
+            self.done.add(key)
+            snapshot = sorted(self.done)
+        if not self.path:
+            return
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump({'done': snapshot, 'updated_at': datetime.now().isoformat()}, f)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save backfill checkpoint: {e}")
+
+
+def window_key(metering_point, obis_code, first_day, last_day):
+    return f"{metering_point}/{obis_code}/{day_to_date(first_day)}/{day_to_date(last_day)}"
+
+
+def backfill_first_day(settings, last_day):
+    """First day to backfill: backfill.start_date, else backfill.months before last_day"""
+    if settings.start_date:
+        return day_of(parse_timestamp(settings.start_date))
+    return last_day - settings.months * DAYS_PER_MONTH + 1
+
+
+class BackfillJob(threading.Thread):
+    """Daemon thread that fetches missing history month by month
+
+    fetch(config, metering_point, obis_code, first_day, last_day) must make
+    the days available in the store and return False on failure. series(config)
+    returns the (metering_point, obis_code) pairs to backfill.
+    """
+
+    def __init__(self, config_getter, series, fetch, checkpoint=None):
+        super().__init__(name='backfill', daemon=True)
+        self.config_getter = config_getter
+        self.series = series
+        self.fetch = fetch
+        self.checkpoint = checkpoint or Checkpoint()
+        self.bucket = TokenBucket(1.0)
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.state = 'waiting'
+        self.progress = {}
+        self.failed = 0
+        self.started_at = None
+        self.finished_at = None
+        self.last_error = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def plan(self, config):
+        """Finalized calendar-month windows per series, newest first, interleaved across series"""
+        # The current month is left to the prefetch window, so every window here is final
+        last_day = date_to_day(day_to_date(first_open_day()).replace(day=1)) - 1
+        first_day = backfill_first_day(config.backfill, last_day)
+        windows = []
+        for first, last in reversed(month_spans(first_day, last_day)):
+            for metering_point, obis_code in self.series(config):
+                windows.append((metering_point, obis_code, first, last))
+        return windows
+
+    def run(self):
+        delay = STARTUP_DELAY_SECONDS
+        while not self._stop_event.wait(delay):
+            config = self.config_getter()
+            settings = config.backfill
+            if not settings.enabled or not (config.has_api_key and config.has_energy_id):
+                self.state = 'disabled' if not settings.enabled else 'waiting'
+                delay = IDLE_DELAY_SECONDS
+                continue
+            try:
+                complete = self.run_pass(config)
+            except Exception as e:
+                logger.error(f"💥 Backfill failed: {type(e).__name__}: {e}")
+                self.last_error = str(e)
+                complete = False
+            delay = IDLE_DELAY_SECONDS if complete else RETRY_DELAY_SECONDS
+
+    def run_pass(self, config):
+        """Fetch every window not yet checkpointed; True if nothing is left to do"""
+        settings = config.backfill
+        windows = self.plan(config)
+        with self._lock:
+            self.progress = {}
+            for metering_point, obis_code, first, last in windows:
+                entry = self.progress.setdefault(f"{metering_point}/{obis_code}", {'months': 0, 'done': 0})
+                entry['months'] += 1
+                if window_key(metering_point, obis_code, first, last) in self.checkpoint:
+                    entry['done'] += 1
+            self.failed = 0
+        pending = [w for w in windows if window_key(*w) not in self.checkpoint]
+        if not pending:
+            self.state = 'complete'
+            return True
+
+        self.bucket.configure(settings.requests_per_minute / 60, settings.workers)
+        self.state = 'running'
+        self.started_at = datetime.now()
+        self.finished_at = None
+        logger.info(f"📚 Backfill: {len(pending)} of {len(windows)} months to fetch "
+                    f"({settings.workers} workers, {settings.requests_per_minute}/min)")
+        with ThreadPoolExecutor(max_workers=settings.workers, thread_name_prefix='backfill') as pool:
+            list(pool.map(lambda window: self.fetch_window(config, *window), pending))
+
+        self.finished_at = datetime.now()
+        self.state = 'stopped' if self._stop_event.is_set() else ('retrying' if self.failed else 'complete')
+        logger.info(f"📚 Backfill pass finished: {len(pending) - self.failed} months fetched, "
+                    f"{self.failed} failed")
+        return not self.failed and not self._stop_event.is_set()
+
+    def fetch_window(self, config, metering_point, obis_code, first_day, last_day):
+        if not self.bucket.acquire(self._stop_event):
+            return
+        try:
+            ok = self.fetch(config, metering_point, obis_code, first_day, last_day)
+        except Exception as e:
+            logger.error(f"💥 Backfill of {metering_point}/{obis_code} failed: {type(e).__name__}: {e}")
+            ok = False
+        with self._lock:
+            if not ok:
+                self.failed += 1
+                self.last_error = f"{metering_point}/{obis_code} {day_to_date(first_day):%Y-%m}"
+                return
+            self.progress[f"{metering_point}/{obis_code}"]['done'] += 1
+        self.checkpoint.add(window_key(metering_point, obis_code, first_day, last_day))
+
+    def status(self):
+        """Progress summary for /api/backfill"""
+        with self._lock:
+            series = {key: dict(entry) for key, entry in self.progress.items()}
+            total = sum(entry['months'] for entry in series.values())
+            done = sum(entry['done'] for entry in series.values())
+            return {
+                'state': self.state,
+                'months_total': total,
+                'months_done': done,
+                'percent': round(100 * done / total, 1) if total else None,
+                'failed': self.failed,
+                'last_error': self.last_error,
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+                'series': series,
+            }
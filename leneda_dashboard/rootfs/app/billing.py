@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Invoice engine (Pure Python stdlib)
+License: GPL-3.0
+
+Prices a billing period from the cached 15-minute consumption series.
+Energy drawn above the reference power in an interval (the kW above
+reference_power_kw times the interval length) is billed at the exceedance
+rate instead of the network variable rate, and monthly fees are charged per
+calendar month the period covers.
+
+The per-month quantities (energy, exceedance, peak) only depend on the
+readings and the reference power, so they are memoized for closed months
+and re-pricing a year of invoices does not touch the store again.
+
+With a time-of-use or dynamic tariff the energy component is priced per
+interval by the TariffEngine instead of with the flat per-kWh rate.
+"""
+
+import threading
+from calendar import monthrange
+from collections import OrderedDict
+
+from aggregation import day_to_date, month_spans
+
+
+class MonthUsage:
+    """Billable quantities of one calendar month (or part of it)"""
+
+    __slots__ = ('first_day', 'last_day', 'energy_kwh', 'exceedance_kwh', 'peak_kw', 'month_share')
+
+    def __init__(self, first_day, last_day, energy_kwh, exceedance_kwh, peak_kw):
+        self.first_day = first_day
+        self.last_day = last_day
+        self.energy_kwh = energy_kwh
+        self.exceedance_kwh = exceedance_kwh
+        self.peak_kw = peak_kw
+        # Monthly fees are charged pro rata for partial months
+        first = day_to_date(first_day)
+        self.month_share = (last_day - first_day + 1) / monthrange(first.year, first.month)[1]
+
+
+class BillingEngine:
+    """Computes invoices from the aggregation engine's day profiles"""
+
+    def __init__(self, aggregator, tariff_engine, max_cached_months=512):
+        self.aggregator = aggregator
+        self.tariff_engine = tariff_engine
+        self.max_cached_months = max_cached_months
+        self._months = OrderedDict()
+        self._lock = threading.Lock()
+
+    def month_usage(self, metering_point, obis_code, first_day, last_day, reference_power_kw):
+        """Return the MonthUsage of [first_day, last_day], which must lie in one month"""
+        key = (metering_point, obis_code, first_day, last_day, reference_power_kw)
+        with self._lock:
+            usage = self._months.get(key)
+            if usage is not None:
+                self._months.move_to_end(key)
+                return usage
+
+        profiles, _, step = self.aggregator.day_profiles(metering_point, obis_code, first_day, last_day)
+        hours = step / 3600
+        limit = reference_power_kw * hours
+        energy = 0.0
+        exceedance = 0.0
+        peak = 0.0
+        for profile in profiles:
+            values = profile.energy
+            energy += profile.total
+            peak = max(peak, max(values, default=0.0))
+            above = [value for value in values if value > limit]
+            exceedance += sum(above) - limit * len(above)
+        usage = MonthUsage(first_day, last_day, energy, exceedance, peak / hours)
+
+        # Only months whose days all have final copies can no longer change
+        if self.aggregator.store.is_final(metering_point, obis_code, first_day, last_day):
+            with self._lock:
+                self._months[key] = usage
+                while len(self._months) > self.max_cached_months:
+                    self._months.popitem(last=False)
+        return usage
+
+    def invoice(self, metering_point, obis_code, first_day, last_day, billing, tariff=None):
+        """Price [first_day, last_day] with the given BillingConfig and optional TariffConfig"""
+        spans = month_spans(first_day, last_day)
+        months = [
+            self.month_usage(metering_point, obis_code, first, last, billing.reference_power_kw)
+            for first, last in spans
+        ]
+        total_kwh = sum(month.energy_kwh for month in months)
+        exceedance_kwh = sum(month.exceedance_kwh for month in months)
+        month_count = sum(month.month_share for month in months)
+
+        energy_fixed = billing.energy_fixed_fee_monthly * month_count
+        if tariff is None:
+            energy_variable = total_kwh * billing.energy_variable_rate_per_kwh
+        else:
+            # Priced per calendar month so closed months hit the tariff cache
+            energy_variable = sum(
+                self.tariff_engine.costs(metering_point, obis_code, first, last, [tariff],
+                                         billing.energy_variable_rate_per_kwh)[0]['cost']
+                for first, last in spans
+            )
+        network_metering = billing.network_metering_fee_monthly * month_count
+        network_power_ref = billing.network_power_reference_fee_monthly * month_count
+        # Energy above the reference power replaces the normal network rate
+        network_variable = (total_kwh - exceedance_kwh) * billing.network_variable_rate_per_kwh
+        exceedance = exceedance_kwh * billing.exceedance_rate_per_kwh
+        compensation = total_kwh * billing.compensation_fund_rate_per_kwh
+        electricity_tax = total_kwh * billing.electricity_tax_per_kwh
+
+        subtotal = (energy_fixed + energy_variable + network_metering +
+                    network_power_ref + network_variable + exceedance +
+                    compensation + electricity_tax)
+        vat_amount = subtotal * billing.vat_rate
+
+        return {
+            'consumption_kwh': round(total_kwh, 2),
+            'exceedance_kwh': round(exceedance_kwh, 2),
+            'peak_power_kw': round(max((month.peak_kw for month in months), default=0.0), 2),
+            'reference_power_kw': billing.reference_power_kw,
+            'tariff': tariff.name if tariff else None,
+            'months': [
+                {
+                    'month': day_to_date(month.first_day).strftime('%Y-%m'),
+                    'start': day_to_date(month.first_day).isoformat(),
+                    'end': day_to_date(month.last_day).isoformat(),
+                    'share': round(month.month_share, 4),
+                    'consumption_kwh': round(month.energy_kwh, 2),
+                    'exceedance_kwh': round(month.exceedance_kwh, 2),
+                    'peak_power_kw': round(month.peak_kw, 2),
+                }
+                for month in months
+            ],
+            'breakdown': {
+                'energy_fixed_fee': round(energy_fixed, 2),
+                'energy_variable': round(energy_variable, 2),
+                'network_metering_fee': round(network_metering, 2),
+                'network_power_reference': round(network_power_ref, 2),
+                'network_variable': round(network_variable, 2),
+                'exceedance': round(exceedance, 2),
+                'compensation_fund': round(compensation, 2),
+                'electricity_tax': round(electricity_tax, 2)
+            },
+            'subtotal': round(subtotal, 2),
+            'vat': {
+                'rate': billing.vat_rate,
+                'amount': round(vat_amount, 2)
+            },
+            'total': round(subtotal + vat_amount, 2),
+            'currency': billing.currency
+        }
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Columnar time-series formats (Pure Python stdlib)
+License: GPL-3.0
+
+Leneda's row format repeats every key and an ISO timestamp for each
+15-minute value. Because the readings sit on a fixed grid, a series can be
+sent as its first timestamp, the step and a flat array of values instead:
+
+- columnar JSON: {"start", "step", "values": [...], "calculated": [...]},
+  where missing slots are null and "calculated" lists the indices of
+  values Leneda marked as calculated
+- binary: the values as packed little-endian float32, missing slots NaN,
+  with start, step, count and unit in X-Series-* response headers
+
+Both are written straight from the in-memory Series, block by block.
+"""
+
+import sys
+import json
+from array import array
+
+from series import PRESENT, CALCULATED
+from store import format_timestamp
+
+COLUMNAR_CONTENT_TYPE = 'application/vnd.leneda.columnar+json'
+BINARY_CONTENT_TYPE = 'application/octet-stream'
+
+FORMATS = ('json', 'columnar', 'binary')
+
+_ACCEPT_FORMATS = {
+    COLUMNAR_CONTENT_TYPE: 'columnar',
+    BINARY_CONTENT_TYPE: 'binary',
+}
+
+# Values serialized per fragment
+BLOCK_VALUES = 4096
+
+_encoder = json.JSONEncoder()
+
+
+def negotiate_format(requested=None, accept=None):
+    """Pick the response format from a format= parameter, else the Accept header"""
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return requested
+    for media_range in (accept or '').split(','):
+        media_type = media_range.split(';')[0].strip().lower()
+        if media_type in _ACCEPT_FORMATS:
+            return _ACCEPT_FORMATS[media_type]
+    return 'json'
+
+
+def binary_headers(series):
+    """X-Series-* headers describing a binary body"""
+    return [
+        ('X-Series-Start', '' if series.start is None else format_timestamp(series.start)),
+        ('X-Series-Step', str(series.step)),
+        ('X-Series-Count', str(len(series))),
+        ('X-Series-Unit', series.unit or ''),
+    ]
+
+
+def _calculated(series):
+    return [index for index, flags in enumerate(series.flags) if flags & CALCULATED]
+
+
+def _value_list(series, first, end):
+    """Values of slots [first, end) as a list, None where there is no reading"""
+    return [value if flags & PRESENT else None
+            for value, flags in zip(series.values[first:end], series.flags[first:end])]
+
+
+def columnar_fragments(series, extra=None, block_values=BLOCK_VALUES):
+    """Serialize a series as columnar JSON, block by block"""
+    yield _encoder.encode({**series.grid_header(), **(extra or {})})[:-1]
+    yield ', "values": ['
+    for first in range(0, len(series), block_values):
+        if first:
+            yield ', '
+        yield _encoder.encode(_value_list(series, first, first + block_values))[1:-1]
+    yield '], "calculated": '
+    yield _encoder.encode(_calculated(series))
+    yield '}'
+
+
+def columnar_series(series):
+    """Columnar JSON response for a series, as a dict"""
+    response = series.grid_header()
+    response['values'] = _value_list(series, 0, len(series))
+    response['calculated'] = _calculated(series)
+    return response
+
+
+def binary_blocks(series, block_values=BLOCK_VALUES):
+    """Yield the series' values as little-endian float32 bytes, NaN for missing slots"""
+    for first in range(0, len(series), block_values):
+        block = array('f', series.values[first:first + block_values])
+        if sys.byteorder == 'big':
+            block.byteswap()
+        yield block.tobytes()
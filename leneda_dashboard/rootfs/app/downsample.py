@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Chart downsampling (Pure Python stdlib)
+License: GPL-3.0
+
+Largest-Triangle-Three-Buckets (LTTB) reduces a series to max_points points
+that keep its visual shape: the first and last points are kept, and from
+every bucket in between the point forming the largest triangle with its
+neighbours is chosen. The bucket holding the series maximum always keeps
+that maximum, so consumption peaks never disappear from the chart.
+
+Results for finalized ranges are cached per range and resolution.
+"""
+
+import threading
+from array import array
+from collections import OrderedDict
+
+from store import parse_timestamp
+from series import PRESENT
+
+MIN_POINTS = 3
+MAX_POINTS = 10000
+
+
+def parse_max_points(value):
+    """Validate a max_points query value; None means no downsampling"""
+    if value in (None, ''):
+        return None
+    try:
+        points = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"max_points must be an integer, got {value!r}")
+    if not MIN_POINTS <= points <= MAX_POINTS:
+        raise ValueError(f"max_points must be between {MIN_POINTS} and {MAX_POINTS}")
+    return points
+
+
+def lttb_indices(xs, ys, threshold):
+    """Indices of the points LTTB keeps when reducing (xs, ys) to threshold points"""
+    n = len(xs)
+    if threshold >= n or threshold < MIN_POINTS:
+        return list(range(n))
+
+    peak = max(range(n), key=ys.__getitem__)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        if start <= peak < end:
+            a = peak
+            selected.append(a)
+            continue
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        ax, ay = xs[a], ys[a]
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        a = best
+        selected.append(a)
+
+    selected.append(n - 1)
+    return selected
+
+
+def downsample_items(items, max_points, value_key='value', time_key='startedAt'):
+    """Reduce a list of Leneda items to at most max_points, keeping shape and peaks"""
+    if len(items) <= max_points:
+        return items
+    xs = array('d', (parse_timestamp(item[time_key]) for item in items))
+    ys = array('d', (float(item.get(value_key) or 0.0) for item in items))
+    return [items[i] for i in lttb_indices(xs, ys, max_points)]
+
+
+def downsample_time_series(series, max_points):
+    """Leneda-shaped time-series response for a Series, reduced to max_points items"""
+    slots = [index for index, flags in enumerate(series.flags) if flags & PRESENT]
+    xs = array('d', (series.timestamp(index) for index in slots))
+    ys = array('d', (series.values[index] for index in slots))
+
+    # Only the kept slots are turned into items
+    response = series.header()
+    response['items'] = [series.item(slots[i]) for i in lttb_indices(xs, ys, max_points)]
+    response['downsampled'] = {'originalCount': len(slots), 'maxPoints': max_points}
+    return response
+
+
+class DownsampleCache:
+    """LRU cache of downsampled responses for ranges that can no longer change"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build, cacheable):
+        """Return the cached value for key, or build() it (and cache it if cacheable)"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = build()
+        if cacheable:
+            with self._lock:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
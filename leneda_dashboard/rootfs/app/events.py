@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Server-Sent Events (Pure Python stdlib)
+License: GPL-3.0
+
+Leneda data changes a few times a day at most, so instead of every open tab
+polling all panels, the server pushes a small notification on /api/events
+whenever new or corrected readings actually land in the store. Each stream
+gets its own bounded queue; recent events are kept so a reconnecting
+browser can replay what it missed via Last-Event-ID.
+
+Each open stream is written by its own small thread rather than an HTTP
+worker; their number is still capped, and clients that are turned away
+fall back to polling.
+"""
+
+import os
+import json
+import queue
+import select
+import socket
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Streams held open at once (each one is written by its own thread)
+MAX_STREAMS = int(os.environ.get('LENEDA_MAX_EVENT_STREAMS', '4'))
+
+# Events buffered per stream before it is dropped as too slow
+STREAM_QUEUE_SIZE = 100
+
+# Events kept for Last-Event-ID replay after a reconnect
+REPLAY_EVENTS = 100
+
+# Comment line sent on idle streams so proxies keep them open
+KEEPALIVE_SECONDS = 15
+
+# Reconnect delay suggested to EventSource clients
+RETRY_MILLISECONDS = 10000
+
+
+def format_event(event_id, event, data):
+    """Encode one event in text/event-stream framing"""
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n".encode('utf-8')
+
+
+def client_disconnected(connection):
+    """True if the client closed its end of the connection (an EventSource never sends data)"""
+    readable, _, _ = select.select([connection], [], [], 0)
+    return bool(readable) and not connection.recv(1, socket.MSG_PEEK)
+
+
+def stream_events(bus, subscription, connection):
+    """Write a subscription's events to a client socket until either side ends, then close it"""
+    try:
+        while not bus.closed and not subscription.overflowed and not client_disconnected(connection):
+            message = subscription.next()
+            if message is None:
+                break
+            connection.sendall(message or b": keep-alive\n\n")
+    except OSError:
+        pass
+    finally:
+        bus.unsubscribe(subscription)
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.close()
+        logger.info(f"📣 Event stream closed ({bus.stream_count()} open)")
+
+
+class Subscription:
+    """One open event stream"""
+
+    def __init__(self):
+        self.queue = queue.Queue(STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def next(self, timeout=KEEPALIVE_SECONDS):
+        """Next encoded event, b'' after timeout seconds without one, None once the bus closed"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return b''
+
+
+class EventBus:
+    """Fans published events out to all open streams"""
+
+    def __init__(self, max_streams=MAX_STREAMS, replay=REPLAY_EVENTS):
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._history = deque(maxlen=replay)
+        self._next_id = 1
+        self.closed = False
+
+    def publish(self, event, data):
+        """Send an event to every stream; return its id"""
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            message = format_event(event_id, event, json.dumps(data))
+            self._history.append((event_id, message))
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.overflowed = True
+        return event_id
+
+    def subscribe(self, last_event_id=None):
+        """Open a stream, replaying events after last_event_id; None if all slots are taken"""
+        subscription = Subscription()
+        with self._lock:
+            if self.closed or len(self._subscriptions) >= self.max_streams:
+                return None
+            self._subscriptions.add(subscription)
+            try:
+                after = int(last_event_id)
+            except (TypeError, ValueError):
+                after = None
+            if after is not None:
+                for event_id, message in list(self._history)[-STREAM_QUEUE_SIZE:]:
+                    if event_id > after:
+                        subscription.queue.put_nowait(message)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def close(self):
+        """End all streams, e.g. on shutdown"""
+        with self._lock:
+            self.closed = True
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(None)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def stream_count(self):
+        with self._lock:
+            return len(self._subscriptions)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Bulk export (Pure Python stdlib)
+License: GPL-3.0
+
+Streams every stored 15-minute reading of a set of series over a long
+range as CSV or NDJSON. The range is walked one calendar month per series
+at a time: missing days of the month are fetched from Leneda in one call,
+the month is written, and the next month is already being loaded while the
+current one goes out. Memory stays at two months of one series plus one
+output block, however many years are exported; the output can be gzipped
+on the fly. A day Leneda returned no readings for gets one row of type
+"missing" with no value, so gaps show up in the file.
+"""
+
+import json
+import zlib
+
+from store import DAY_SECONDS
+from aggregation import day_to_date, month_spans
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+CSV_HEADER = 'metering_point,obis_code,started_at,value,unit,type,version,calculated\n'
+
+# Longest range one export may cover
+MAX_EXPORT_DAYS = 3660
+
+# Type of the row written for a day without readings
+MISSING_TYPE = 'missing'
+
+# Time of day of every minute, so timestamps are not formatted one by one
+_MINUTE_TIMES = [f"T{minute // 60:02d}:{minute % 60:02d}:00Z" for minute in range(DAY_SECONDS // 60)]
+
+
+class ExportError(Exception):
+    """A window could not be loaded; the stream is cut short"""
+
+
+def export_windows(series, first_day, last_day):
+    """(metering_point, obis_code, first, last) per series and calendar month, in output order"""
+    return [
+        (metering_point, obis_code, first, last)
+        for metering_point, obis_code in series
+        for first, last in month_spans(first_day, last_day)
+    ]
+
+
+def prefetched(load, windows, pool):
+    """Yield (window, Series) in order, loading the next window while the current one is written"""
+    upcoming = pool.submit(load, *windows[0]) if windows else None
+    for i, window in enumerate(windows):
+        current = upcoming
+        upcoming = pool.submit(load, *windows[i + 1]) if i + 1 < len(windows) else None
+        series = current.result()
+        if series is None:
+            raise ExportError(f"{window[0]}/{window[1]} {day_to_date(window[2]):%Y-%m} could not be loaded")
+        yield window, series
+
+
+def _rows(series, first_day, last_day):
+    """(started_at, value, type, version, calculated) of the readings of a series, in order
+
+    Every day of [first_day, last_day] without readings yields one row of
+    MISSING_TYPE at its midnight, with no value.
+    """
+    current_day = first_day - 1
+    for ts, value, item_type, version, calculated in series.rows():
+        day, seconds = divmod(ts, DAY_SECONDS)
+        if day != current_day:
+            for missing in range(current_day + 1, day):
+                yield f"{day_to_date(missing).isoformat()}{_MINUTE_TIMES[0]}", None, MISSING_TYPE, None, 0
+            current_day = day
+            day_label = day_to_date(day).isoformat()
+        if seconds % 60:
+            started_at = f"{day_label}T{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}Z"
+        else:
+            started_at = day_label + _MINUTE_TIMES[seconds // 60]
+        yield started_at, value, item_type, version, calculated
+    for missing in range(current_day + 1, last_day + 1):
+        yield f"{day_to_date(missing).isoformat()}{_MINUTE_TIMES[0]}", None, MISSING_TYPE, None, 0
+
+
+def csv_fragments(loaded):
+    """CSV text for (window, Series) pairs, one month per fragment"""
+    yield CSV_HEADER
+    for (metering_point, obis_code, first_day, last_day), series in loaded:
+        prefix = f"{_csv_field(metering_point)},{_csv_field(obis_code)},"
+        unit = _csv_field(series.unit or '')
+        yield ''.join(
+            f"{prefix}{started_at},{'' if value is None else repr(value)},{unit},{_csv_field(item_type or '')},"
+            f"{'' if version is None else version},{calculated}\n"
+            for started_at, value, item_type, version, calculated in _rows(series, first_day, last_day)
+        )
+
+
+def ndjson_fragments(loaded):
+    """NDJSON lines for (window, Series) pairs, one month per fragment"""
+    encode = json.JSONEncoder().encode
+    for (metering_point, obis_code, first_day, last_day), series in loaded:
+        yield ''.join(
+            encode({
+                'meteringPoint': metering_point,
+                'obisCode': obis_code,
+                'startedAt': started_at,
+                'value': value,
+                'unit': series.unit,
+                'type': item_type,
+                'version': version,
+                'calculated': bool(calculated),
+            }) + '\n'
+            for started_at, value, item_type, version, calculated in _rows(series, first_day, last_day)
+        )
+
+
+def gzip_blocks(blocks, level=6):
+    """Compress a stream of byte blocks into one gzip member, block by block"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _csv_field(value):
+    value = str(value)
+    if any(char in value for char in ',"\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
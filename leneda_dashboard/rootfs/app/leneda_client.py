@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Pooled HTTP client (Pure Python stdlib)
+License: GPL-3.0
+
+Keeps persistent http.client connections to api.leneda.eu so repeated calls
+skip the TCP and TLS handshake, which dominates latency on armhf/armv7 boards.
+Responses are requested gzip-compressed, and transient failures (network
+errors, 429 and 5xx) are retried with exponential backoff, honouring
+Retry-After when Leneda sends it. With an upstream scheduler attached,
+every attempt waits for its own turn there, and waiting out a 429 is left
+to the scheduler's global pause.
+
+Identical concurrent queries are coalesced by SingleFlight so that several
+tabs asking for the same series share one upstream fetch.
+"""
+
+import gzip
+import ssl
+import time
+import random
+import logging
+import threading
+import http.client
+from contextlib import nullcontext
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 15
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+DEFAULT_MAX_CONNECTIONS = 4
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+UPSTREAM_RETRIES = Counter('leneda_upstream_retries_total',
+                           'Upstream attempts that were retried, by reason', ('reason',))
+UPSTREAM_RATE_LIMITED = Counter('leneda_upstream_rate_limited_total',
+                                'Upstream responses with status 429 Too Many Requests')
+UPSTREAM_CONNECTIONS = Counter('leneda_upstream_connections_total',
+                               'Upstream exchanges by whether a pooled connection was reused', ('reused',))
+UPSTREAM_COALESCED = Counter('leneda_upstream_coalesced_total',
+                             'Requests served by sharing another in-flight upstream call')
+
+# Raised when a kept-alive connection was closed by the server between calls
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class UpstreamHTTPError(Exception):
+    """Non-success HTTP status returned by the Leneda API"""
+
+    def __init__(self, status, reason, body, headers):
+        super().__init__(f"{status} {reason}")
+        self.status = status
+        self.reason = reason
+        self.body = body
+        self.headers = headers
+
+
+class UpstreamResponse:
+    """Decoded response of a successful upstream call"""
+
+    __slots__ = ('status', 'headers', 'body', 'attempts')
+
+    def __init__(self, status, headers, body, attempts):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.attempts = attempts
+
+
+def parse_retry_after(value):
+    """Return the Retry-After delay in seconds, or None if absent/invalid"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LenedaClient:
+    """Thread-safe client with a keep-alive connection pool per host"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, max_connections=DEFAULT_MAX_CONNECTIONS, scheduler=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        # UpstreamScheduler handing out turns, told about every 429
+        self.scheduler = scheduler
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+
+    def _connect(self, scheme, host, port):
+        """Open a new (lazily connected) connection to the given origin"""
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout,
+                                               context=self._ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, scheme, host, port):
+        """Return (connection, reused) for the given origin"""
+        with self._lock:
+            idle = self._idle.get((scheme, host, port))
+            if idle:
+                return idle.pop(), True
+        return self._connect(scheme, host, port), False
+
+    def _release(self, scheme, host, port, conn):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host, port), [])
+            if len(idle) < self.max_connections:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+    def _send(self, method, url, headers, body):
+        """Perform one HTTP exchange over a pooled connection"""
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'https'
+        host = parts.hostname
+        port = parts.port or (443 if scheme == 'https' else 80)
+        target = parts.path + (f"?{parts.query}" if parts.query else '')
+
+        request_headers = dict(headers or {})
+        request_headers.setdefault('Accept-Encoding', 'gzip')
+        request_headers.setdefault('Connection', 'keep-alive')
+
+        conn, reused = self._acquire(scheme, host, port)
+        UPSTREAM_CONNECTIONS.inc('true' if reused else 'false')
+        try:
+            conn.request(method, target, body=body, headers=request_headers)
+            response = conn.getresponse()
+            payload = response.read()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # The server dropped an idle connection; retry once on a fresh one
+            conn = self._connect(scheme, host, port)
+            try:
+                conn.request(method, target, body=body, headers=request_headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(scheme, host, port, conn)
+
+        if response.getheader('Content-Encoding', '').lower() == 'gzip':
+            payload = gzip.decompress(payload)
+        return response.status, response.reason, response.headers, payload
+
+    def request(self, method, url, headers=None, body=None, key=None):
+        """Send a request with retries; return an UpstreamResponse or raise
+
+        key identifies a coalesced call to the scheduler (see UpstreamScheduler.promote).
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                # The turn is held for one attempt only, never while backing off
+                with self.scheduler.turn(key=key) if self.scheduler else nullcontext(), self._slots:
+                    status, reason, response_headers, payload = self._send(method, url, headers, body)
+            except (OSError, http.client.HTTPException) as e:
+                if attempt > self.retries:
+                    raise
+                UPSTREAM_RETRIES.inc('network')
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"🌐 Upstream network error ({type(e).__name__}: {e}), "
+                               f"retry {attempt}/{self.retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if 200 <= status < 300:
+                return UpstreamResponse(status, response_headers, payload, attempt)
+
+            retry_after = parse_retry_after(response_headers.get('Retry-After'))
+            if status == 429:
+                UPSTREAM_RATE_LIMITED.inc()
+                if self.scheduler:
+                    self.scheduler.rate_limited(retry_after)
+            if status in RETRY_STATUSES and attempt <= self.retries:
+                UPSTREAM_RETRIES.inc(str(status))
+                if status == 429 and self.scheduler:
+                    # The next turn starts once the scheduler's pause is over
+                    logger.warning(f"⏱️ Upstream returned 429, retry {attempt}/{self.retries} after the pause")
+                    continue
+                delay = min(MAX_BACKOFF, retry_after) if retry_after is not None else self._backoff_delay(attempt)
+                logger.warning(f"⏱️ Upstream returned {status}, retry {attempt}/{self.retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            raise UpstreamHTTPError(status, reason, payload, response_headers)
+
+    def _backoff_delay(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * (2 ** (attempt - 1))))
+
+
+def normalize_url(url):
+    """Canonical form of a URL with its query parameters sorted"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into a single execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn, on_join=None):
+        """Run fn() once per key at a time; return (result, shared)
+
+        on_join() is called by every caller that joins a running execution.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+
+        if not leader:
+            UPSTREAM_COALESCED.inc()
+            if on_join:
+                on_join()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        if flight.waiters:
+            logger.info(f"🔗 Shared one upstream response with {flight.waiters} waiting request(s)")
+        return flight.result, False
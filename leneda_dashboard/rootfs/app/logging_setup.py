@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Non-blocking logging (Pure Python stdlib)
+License: GPL-3.0
+
+Request threads only put log records on a bounded queue; a background
+listener thread redacts secrets, formats the records (plain text or one JSON
+object per line) and writes them out. Slow SD-card or console I/O therefore
+never adds to request latency, and if the writer falls behind, records are
+dropped and counted instead of blocking requests.
+"""
+
+import re
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+LOG_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+# Records waiting for the writer thread before new ones are dropped
+QUEUE_SIZE = 10000
+
+REDACTED = '***'
+
+# Header and option values that must never reach the log
+_SECRET_RE = re.compile(
+    r"""((?:x-api-key|api[_-]?key|authorization)['"]?\s*[:=]\s*['"]?)([^'"\s,}]+)""",
+    re.IGNORECASE
+)
+
+_listener = None
+
+
+def redact(text):
+    """Mask API keys and authorization values in a log message"""
+    return _SECRET_RE.sub(lambda match: match.group(1) + REDACTED, text)
+
+
+class RedactingFilter(logging.Filter):
+    """Replace secrets in the (already merged) record message"""
+
+    def filter(self, record):
+        message = record.getMessage()
+        redacted = redact(message)
+        if redacted != message:
+            record.msg, record.args = redacted, None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level='info', log_format='text'):
+    """Route all logging through the background writer at the given level"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RedactingFilter())
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(LOG_LEVELS.get(level, logging.INFO))
+
+    _listener = QueueListener(log_queue, handler)
+    _listener.start()
+
+
+def dropped_records():
+    """Number of records dropped because the writer could not keep up"""
+    return sum(getattr(handler, 'dropped', 0) for handler in logging.getLogger().handlers)
+
+
+@atexit.register
+def _flush():
+    if _listener is not None:
+        _listener.stop()
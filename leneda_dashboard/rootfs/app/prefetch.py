@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Background prefetch scheduler (Pure Python stdlib)
+License: GPL-3.0
+
+Leneda publishes the previous day's readings once a day. Instead of letting
+the first viewer of the morning wait for cold upstream calls, this thread
+warms the local store shortly after publication (plus random jitter so many
+installs don't hit Leneda at the same second) and keeps retrying while
+yesterday's data is still incomplete.
+"""
+
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Delay before the warm-up run after the add-on starts
+STARTUP_DELAY_SECONDS = 30
+
+
+class PrefetchScheduler(threading.Thread):
+    """Daemon thread that calls warm(config) on the configured schedule
+
+    warm(config) must return the list of series that are still incomplete;
+    a non-empty list schedules a retry after retry_interval_minutes.
+    """
+
+    def __init__(self, config_getter, warm):
+        super().__init__(name='prefetch', daemon=True)
+        self.config_getter = config_getter
+        self.warm = warm
+        self._stop_event = threading.Event()
+        self.last_run = None
+        self.next_run = None
+        self.incomplete = []
+
+    def stop(self):
+        self._stop_event.set()
+
+    def next_daily_run(self, settings, now=None):
+        """Next scheduled time of day (local time) plus jitter"""
+        now = now or datetime.now()
+        hour, minute = (int(part) for part in settings.time.split(':'))
+        run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run_at <= now:
+            run_at += timedelta(days=1)
+        return run_at + timedelta(seconds=random.uniform(0, settings.jitter_minutes * 60))
+
+    def run(self):
+        delay = STARTUP_DELAY_SECONDS
+        attempts = 0
+        while not self._stop_event.wait(delay):
+            config = self.config_getter()
+            settings = config.prefetch
+            if not settings.enabled:
+                delay = 3600
+                continue
+
+            if config.has_api_key and config.has_energy_id and config.metering_points:
+                self.last_run = datetime.now()
+                try:
+                    self.incomplete = self.warm(config)
+                except Exception as e:
+                    logger.error(f"💥 Prefetch failed: {type(e).__name__}: {e}")
+                    self.incomplete = ['error']
+            else:
+                self.incomplete = []
+
+            attempts += 1
+            if self.incomplete and attempts <= settings.max_retries:
+                # Late data: Leneda hasn't published (all of) yesterday yet
+                self.next_run = datetime.now() + timedelta(minutes=settings.retry_interval_minutes)
+                logger.info(f"🔁 Prefetch incomplete for {len(self.incomplete)} series, "
+                            f"retry {attempts}/{settings.max_retries} at {self.next_run:%H:%M}")
+            else:
+                attempts = 0
+                self.next_run = self.next_daily_run(settings)
+                logger.info(f"⏰ Next prefetch scheduled for {self.next_run:%Y-%m-%d %H:%M}")
+            delay = max(1.0, (self.next_run - datetime.now()).total_seconds())
+
+    def status(self):
+        """Summary for the debug endpoint"""
+        return {
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'next_run': self.next_run.isoformat() if self.next_run else None,
+            'incomplete_series': list(self.incomplete),
+        }
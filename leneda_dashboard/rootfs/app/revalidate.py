@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Background revalidation (Pure Python stdlib)
+License: GPL-3.0
+
+Stale-while-revalidate for the local store: requests are answered from the
+stored copy at once, and ranges whose copy is past its freshness TTL are
+re-fetched here, on a small pool, without holding up the response. Each
+range is refreshed at most once at a time, and after a failed refresh
+(e.g. a Leneda outage) it is not retried for a short back-off period, so
+clients keep getting the last good numbers instead of errors.
+
+PeriodicRefresh re-checks the open days on a timer while browsers are
+subscribed to /api/events, so pushed updates don't depend on polling.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+REVALIDATE_WORKERS = 2
+
+# Wait before refreshing a range again after its refresh failed
+FAILURE_BACKOFF_SECONDS = 60
+
+REVALIDATIONS = Counter('leneda_revalidations_total',
+                        'Background refreshes of stale data, by outcome', ('outcome',))
+
+
+class Revalidator:
+    """Runs refresh() callables in the background, at most one per key"""
+
+    def __init__(self, workers=REVALIDATE_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='revalidate')
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed_at = {}
+
+    def submit(self, key, refresh):
+        """Schedule refresh() for key unless it is already pending or backing off; True if scheduled"""
+        now = time.monotonic()
+        with self._lock:
+            backing_off = now - self._failed_at.get(key, float('-inf')) < FAILURE_BACKOFF_SECONDS
+            if key in self._pending or backing_off:
+                return False
+            self._pending.add(key)
+        self._pool.submit(self._run, key, refresh)
+        return True
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def _run(self, key, refresh):
+        try:
+            ok = refresh()
+        except Exception as e:
+            logger.error(f"💥 Background refresh of {key} failed: {type(e).__name__}: {e}")
+            ok = False
+        with self._lock:
+            self._pending.discard(key)
+            if ok:
+                self._failed_at.pop(key, None)
+            else:
+                self._failed_at[key] = time.monotonic()
+        REVALIDATIONS.inc('refreshed' if ok else 'failed')
+        if not ok:
+            logger.warning(f"⚠️ Could not refresh {key}; serving the stored copy until the next attempt")
+
+
+class PeriodicRefresh(threading.Thread):
+    """Daemon thread calling tick() every interval seconds while active() is true"""
+
+    def __init__(self, interval, active, tick):
+        super().__init__(name='periodic-refresh', daemon=True)
+        self.interval = interval
+        self.active = active
+        self.tick = tick
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if not self.active():
+                continue
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"💥 Periodic refresh failed: {type(e).__name__}: {e}")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Upstream request scheduler (Pure Python stdlib)
+License: GPL-3.0
+
+Every call to api.leneda.eu waits here for its turn. Calls queue by
+priority - interactive requests first, then background refreshes, then bulk
+work such as backfill and exports - and start only when the shared token
+bucket has a token, so all components stay within one request budget
+instead of racing each other into Leneda's rate limit. Background calls
+always leave one connection free, so a click is never stuck behind a year
+of backfill.
+
+Each attempt of a call, retries included, waits for its own turn. A 429
+pauses all starts for the Retry-After delay and halves the rate; the rate
+then climbs back to the configured budget as calls go through. When a
+request joins a coalesced call another component already queued, that call
+is promoted to the more urgent priority of the two.
+"""
+
+import time
+import logging
+import threading
+from bisect import insort
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Priorities, most urgent first
+INTERACTIVE = 'interactive'
+REFRESH = 'refresh'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, REFRESH, BULK)
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_BURST = 10
+
+# A 429 never cuts the rate below this share of the configured budget
+MIN_RATE_FRACTION = 0.125
+# Share of the configured rate regained per call started after a 429
+RECOVERY_FRACTION = 0.1
+
+# Pause after a 429 without Retry-After, and the longest pause honoured
+DEFAULT_PAUSE_SECONDS = 5.0
+MAX_PAUSE_SECONDS = 300.0
+
+UPSTREAM_QUEUED = Gauge('leneda_upstream_queued', 'Upstream calls waiting for their turn, by priority',
+                        ('priority',))
+UPSTREAM_QUEUE_WAIT = Histogram('leneda_upstream_queue_wait_seconds',
+                                'Time upstream calls waited for their turn, by priority', ('priority',))
+UPSTREAM_PAUSES = Counter('leneda_upstream_pauses_total',
+                          'Times all upstream calls were paused after a 429')
+
+# Priority of the upstream calls made by the current thread or task
+_priority = ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+def current_priority():
+    """Priority of the upstream calls made by the current thread or task"""
+    return _priority.get()
+
+
+@contextmanager
+def upstream_priority(priority):
+    """Run the block's upstream calls at the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Allow rate calls per second on average, with bursts of up to capacity"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, rate, capacity):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Take one token if there is one and return 0; else the seconds until there is"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, stop_event=None):
+        """Take one token, waiting as long as needed; False if stop_event was set meanwhile"""
+        while True:
+            wait = self.take()
+            if not wait:
+                return True
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+
+class _Ticket:
+    __slots__ = ('priority', 'rank', 'key', 'entry', 'enqueued')
+
+    def __init__(self, priority, key=None):
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.key = key
+        self.entry = None
+        self.enqueued = time.monotonic()
+
+
+class UpstreamScheduler:
+    """Priority queue in front of the Leneda client, sharing one adaptive token bucket"""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST, max_in_flight=4):
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = 0
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self._in_flight = {priority: 0 for priority in PRIORITIES}
+        self._paused_until = 0.0
+        self.pauses = 0
+        # Calls under way per flight key, and the most urgent rank joined to each
+        self._flights = {}
+        self._boosts = {}
+        self._started = {priority: 0 for priority in PRIORITIES}
+        self._waited = {priority: 0.0 for priority in PRIORITIES}
+        self._max_wait = {priority: 0.0 for priority in PRIORITIES}
+        for priority in PRIORITIES:
+            UPSTREAM_QUEUED.set(0, priority)
+
+    def configure(self, requests_per_minute, burst, max_in_flight=None):
+        """Apply a new budget (e.g. from the add-on options)"""
+        with self._cond:
+            self.requests_per_minute = requests_per_minute
+            self.burst = burst
+            if max_in_flight is not None:
+                self.max_in_flight = max_in_flight
+            self.bucket.configure(requests_per_minute / 60, burst)
+            self._cond.notify_all()
+
+    def _may_start(self, ticket):
+        """True if ticket's priority has a free connection"""
+        running = sum(self._in_flight.values())
+        if running >= self.max_in_flight:
+            return False
+        if ticket.priority == INTERACTIVE:
+            return True
+        # Background calls leave one connection to interactive ones
+        return running - self._in_flight[INTERACTIVE] < max(1, self.max_in_flight - 1)
+
+    def _next(self):
+        """The most urgent queued ticket that could start now"""
+        for _, _, ticket in self._queue:
+            if self._may_start(ticket):
+                return ticket
+        return None
+
+    def _enqueue(self, ticket, sequence):
+        ticket.entry = (ticket.rank, sequence, ticket)
+        insort(self._queue, ticket.entry, key=lambda queued: queued[:2])
+
+    def acquire(self, priority=None, key=None):
+        """Wait for a turn to call upstream; return the ticket to release()
+
+        key identifies a coalesced call that promote() may make more urgent.
+        """
+        ticket = _Ticket(priority or _priority.get(), key)
+        with self._cond:
+            boost = self._boosts.get(key)
+            if boost is not None and boost < ticket.rank:
+                ticket.rank = boost
+                ticket.priority = PRIORITIES[boost]
+            self._sequence += 1
+            self._enqueue(ticket, self._sequence)
+            self._update_queued(ticket.priority)
+            while True:
+                wait = None
+                if self._next() is ticket:
+                    wait = self._paused_until - time.monotonic()
+                    if wait <= 0:
+                        wait = self.bucket.take()
+                        if not wait:
+                            break
+                self._cond.wait(wait)
+            self._queue.remove(ticket.entry)
+            self._in_flight[ticket.priority] += 1
+            waited = time.monotonic() - ticket.enqueued
+            self._started[ticket.priority] += 1
+            self._waited[ticket.priority] += waited
+            self._max_wait[ticket.priority] = max(self._max_wait[ticket.priority], waited)
+            self._update_queued(ticket.priority)
+            self._recover()
+            self._cond.notify_all()
+        UPSTREAM_QUEUE_WAIT.observe(waited, ticket.priority)
+        if waited >= 1:
+            logger.debug(f"🚦 {ticket.priority} upstream call waited {waited:.1f}s for its turn")
+        return ticket
+
+    def release(self, ticket):
+        with self._cond:
+            self._in_flight[ticket.priority] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def turn(self, priority=None, key=None):
+        """Hold a turn to call upstream for the duration of the block"""
+        ticket = self.acquire(priority, key)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    @contextmanager
+    def flight(self, key):
+        """Let promote() reach the turns taken for key while the block runs"""
+        with self._cond:
+            self._flights[key] = self._flights.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._flights[key] -= 1
+                if not self._flights[key]:
+                    del self._flights[key]
+                    self._boosts.pop(key, None)
+
+    def promote(self, key, priority):
+        """Raise the queued and later turns of key's flight to at least priority"""
+        rank = PRIORITIES.index(priority)
+        with self._cond:
+            if key not in self._flights or self._boosts.get(key, len(PRIORITIES)) <= rank:
+                return
+            self._boosts[key] = rank
+            promoted = [ticket for _, _, ticket in self._queue if ticket.key == key and ticket.rank > rank]
+            for ticket in promoted:
+                self._queue.remove(ticket.entry)
+                previous = ticket.priority
+                ticket.rank = rank
+                ticket.priority = priority
+                self._enqueue(ticket, ticket.entry[1])
+                self._update_queued(previous)
+                self._update_queued(priority)
+            if promoted:
+                logger.debug(f"🚦 Promoted a queued upstream call to {priority}")
+                self._cond.notify_all()
+
+    def rate_limited(self, retry_after=None):
+        """Leneda answered 429: pause all starts and halve the rate"""
+        pause = min(MAX_PAUSE_SECONDS, DEFAULT_PAUSE_SECONDS if retry_after is None else retry_after)
+        target = self.requests_per_minute / 60
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            rate = max(target * MIN_RATE_FRACTION, self.bucket.rate / 2)
+            self.bucket.configure(rate, self.burst)
+            self.pauses += 1
+        UPSTREAM_PAUSES.inc()
+        logger.warning(f"🚦 Leneda rate limit hit: pausing upstream calls for {pause:.1f}s, "
+                       f"then {rate * 60:.1f}/min")
+
+    def _recover(self):
+        """Move the rate back towards the configured budget after a 429"""
+        target = self.requests_per_minute / 60
+        if self.bucket.rate < target and time.monotonic() >= self._paused_until:
+            self.bucket.configure(min(target, self.bucket.rate + target * RECOVERY_FRACTION), self.burst)
+
+    def _update_queued(self, priority):
+        UPSTREAM_QUEUED.set(sum(1 for _, _, ticket in self._queue if ticket.priority == priority), priority)
+
+    def status(self):
+        """Budget, queue depth and wait times for /api/debug"""
+        with self._cond:
+            queued = {priority: 0 for priority in PRIORITIES}
+            for _, _, ticket in self._queue:
+                queued[ticket.priority] += 1
+            return {
+                'requests_per_minute': self.requests_per_minute,
+                'current_requests_per_minute': round(self.bucket.rate * 60, 1),
+                'burst': self.burst,
+                'paused_seconds': round(max(0.0, self._paused_until - time.monotonic()), 1),
+                'pauses': self.pauses,
+                'in_flight': dict(self._in_flight),
+                'max_in_flight': self.max_in_flight,
+                'queued': queued,
+                'started': dict(self._started),
+                'average_wait_seconds': {
+                    priority: round(self._waited[priority] / self._started[priority], 3)
+                    if self._started[priority] else None
+                    for priority in PRIORITIES
+                },
+                'max_wait_seconds': {priority: round(self._max_wait[priority], 3) for priority in PRIORITIES},
+            }
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Compact time series (Pure Python stdlib)
+License: GPL-3.0
+
+Leneda sends a series as one dict per 15-minute reading, which costs a few
+hundred bytes per value once parsed. Internally a series is kept as its
+first timestamp, its step and flat arrays instead: an array('d') of values
+(NaN where there is no reading), one flag byte per slot (present,
+calculated and the reading type) and an array('H') of versions, about
+11 bytes per interval. Leneda items are only built at the edges, when a
+response is written.
+"""
+
+import re
+import threading
+from array import array
+
+from store import format_timestamp, parse_timestamp
+
+DEFAULT_INTERVAL_SECONDS = 900
+
+_DURATION_RE = re.compile(r'^PT(?:(\d+)H)?(?:(\d+)M)?$')
+
+# Flag bits per slot; the upper six bits hold the reading type
+PRESENT = 1
+CALCULATED = 2
+TYPE_SHIFT = 2
+MAX_TYPES = 64
+
+# Version stored for readings without one
+NO_VERSION = 0xFFFF
+
+NAN = float('nan')
+
+# Reading types ('Actual', ...) seen so far, numbered in order of appearance
+_types = [None]
+_type_codes = {None: 0}
+_types_lock = threading.Lock()
+
+
+def interval_seconds(interval_length):
+    """Convert an ISO-8601 duration like 'PT15M' or 'PT1H' to seconds"""
+    match = _DURATION_RE.match(interval_length or '')
+    if not match or not any(match.groups()):
+        return DEFAULT_INTERVAL_SECONDS
+    hours, minutes = (int(g) if g else 0 for g in match.groups())
+    return hours * 3600 + minutes * 60
+
+
+def type_code(item_type):
+    """Small number standing for a reading type in the flag byte"""
+    code = _type_codes.get(item_type)
+    if code is not None:
+        return code
+    with _types_lock:
+        if item_type not in _type_codes:
+            if len(_types) >= MAX_TYPES:
+                return 0
+            _type_codes[item_type] = len(_types)
+            _types.append(item_type)
+        return _type_codes[item_type]
+
+
+class Series:
+    """One metering point / OBIS code series on its fixed interval grid"""
+
+    __slots__ = ('metering_point', 'obis_code', 'unit', 'interval_length',
+                 'start', 'step', 'values', 'flags', 'versions')
+
+    def __init__(self, metering_point, obis_code, unit=None, interval_length=None, start=None):
+        self.metering_point = metering_point
+        self.obis_code = obis_code
+        self.unit = unit
+        self.interval_length = interval_length
+        self.start = start
+        self.step = interval_seconds(interval_length)
+        self.values = array('d')
+        self.flags = bytearray()
+        self.versions = array('H')
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def from_response(cls, data, metering_point=None, obis_code=None):
+        """Build a series from a Leneda time-series response (readings off the grid are dropped)"""
+        series = cls(metering_point or data.get('meteringPointCode'), obis_code or data.get('obisCode'),
+                     data.get('unit'), data.get('intervalLength'))
+        for item in sorted(data.get('items', []), key=lambda item: item['startedAt']):
+            series.append(parse_timestamp(item['startedAt']), float(item.get('value', 0)),
+                          item.get('type'), item.get('version'), item.get('calculated'))
+        return series
+
+    @classmethod
+    def from_rows(cls, metering_point, obis_code, unit, interval_length, rows):
+        """Build a series from (ts, value, type, version, calculated) rows in ts order"""
+        series = cls(metering_point, obis_code, unit, interval_length)
+        for row in rows:
+            series.append(*row)
+        return series
+
+    def append(self, ts, value, item_type=None, version=None, calculated=False):
+        """Add a reading after the last one, leaving gaps empty; False if it is off the grid"""
+        if self.start is None:
+            self.start = ts
+        offset = ts - self.start
+        index, remainder = divmod(offset, self.step)
+        if remainder or index < len(self.values):
+            return False
+        gap = index - len(self.values)
+        if gap:
+            self.values.extend([NAN] * gap)
+            self.flags.extend(bytes(gap))
+            self.versions.extend([NO_VERSION] * gap)
+        self.values.append(value)
+        self.flags.append(PRESENT | (CALCULATED if calculated else 0) | type_code(item_type) << TYPE_SHIFT)
+        self.versions.append(NO_VERSION if version is None else min(int(version), NO_VERSION - 1))
+        return True
+
+    def timestamp(self, index):
+        return self.start + index * self.step
+
+    def present(self, index):
+        return bool(self.flags[index] & PRESENT)
+
+    def calculated(self, index):
+        return bool(self.flags[index] & CALCULATED)
+
+    def count(self):
+        """Number of slots holding a reading"""
+        return len(self.flags) - self.flags.count(0)
+
+    def nbytes(self):
+        return (self.values.itemsize * len(self.values) + len(self.flags)
+                + self.versions.itemsize * len(self.versions))
+
+    def window(self, start_ts, slots, factor=1.0):
+        """(values, calculated) of `slots` slots from start_ts, 0.0 where there is no reading"""
+        values = array('d', bytes(8 * slots))
+        calculated = bytearray(slots)
+        if self.start is None:
+            return values, calculated
+        offset, remainder = divmod(start_ts - self.start, self.step)
+        if remainder:
+            return values, calculated
+        first = max(offset, 0)
+        end = min(offset + slots, len(self.values))
+        for index in range(first, end):
+            flags = self.flags[index]
+            if flags & PRESENT:
+                values[index - offset] = self.values[index] * factor
+                calculated[index - offset] = 1 if flags & CALCULATED else 0
+        return values, calculated
+
+    def rows(self):
+        """Yield (ts, value, type, version, calculated) for every slot holding a reading"""
+        for index, flags in enumerate(self.flags):
+            if flags & PRESENT:
+                version = self.versions[index]
+                yield (self.start + index * self.step, self.values[index], _types[flags >> TYPE_SHIFT],
+                       None if version == NO_VERSION else version, 1 if flags & CALCULATED else 0)
+
+    def header(self):
+        """The fields of a Leneda time-series response other than its items"""
+        return {
+            'meteringPointCode': self.metering_point,
+            'obisCode': self.obis_code,
+            'intervalLength': self.interval_length,
+            'unit': self.unit,
+        }
+
+    def item(self, index):
+        """Leneda time-series item of one slot holding a reading"""
+        flags = self.flags[index]
+        version = self.versions[index]
+        return {
+            'value': self.values[index],
+            'startedAt': format_timestamp(self.start + index * self.step),
+            'type': _types[flags >> TYPE_SHIFT],
+            'version': None if version == NO_VERSION else version,
+            'calculated': bool(flags & CALCULATED),
+        }
+
+    def items(self):
+        """Yield the Leneda items of every slot holding a reading"""
+        for index, flags in enumerate(self.flags):
+            if flags & PRESENT:
+                yield self.item(index)
+
+    def to_response(self):
+        """Leneda-shaped time-series response"""
+        response = self.header()
+        response['items'] = list(self.items())
+        return response
+
+    def grid_header(self):
+        """Header of the columnar representation: first timestamp, step and slot count"""
+        return {
+            **self.header(),
+            'start': None if self.start is None else format_timestamp(self.start),
+            'step': self.step,
+            'count': len(self.values),
+        }
+
+
+def read_series(store, metering_point, obis_code, start_ts, end_ts):
+    """Load the stored readings with start_ts <= ts <= end_ts as a Series"""
+    unit, interval_length = store.series_info(metering_point, obis_code)
+    return Series.from_rows(metering_point, obis_code, unit, interval_length,
+                            store.iter_readings(metering_point, obis_code, start_ts, end_ts))
@@ -25,296 +25,1021 @@ Changelog v1.0.2:
 
 import os
 import json
+import time
+import hashlib
+import socket
 import logging
+import selectors
+import threading
+from collections import deque
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from datetime import datetime, timedelta
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http.client import HTTPException
 from urllib.parse import urlparse, parse_qs, quote, urlencode
-import mimetypes
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from store import (TimeSeriesStore, parse_timestamp, format_timestamp, day_of, day_runs,
+                   first_open_day, DAY_SECONDS, OPEN_DAY_TTL_SECONDS)
+from aggregation import AggregationEngine, AGGREGATION_LEVELS
+from billing import BillingEngine
+from tariffs import TariffEngine, PRICES_DIR, prices_file_allowed
+from analytics import (AnalyticsEngine, FlowSources, SHARED_CONSUMPTION_OBIS, SHARED_PRODUCTION_OBIS,
+                       check_resolution)
+from columnar import (COLUMNAR_CONTENT_TYPE, BINARY_CONTENT_TYPE, negotiate_format, binary_headers,
+                      columnar_fragments, columnar_series, binary_blocks)
+from downsample import (DownsampleCache, parse_max_points, downsample_items,
+                        downsample_time_series)
+from series import Series, read_series
+from static_assets import StaticAssets, etag_matches, accepted_encodings
+from addon_config import ConfigLoader, CONFIG_FILE, TariffConfig, parse_tariffs
+from leneda_client import LenedaClient, SingleFlight, UpstreamHTTPError, normalize_url
+from prefetch import PrefetchScheduler
+from backfill import BackfillJob
+from revalidate import Revalidator, PeriodicRefresh
+from scheduler import UpstreamScheduler, upstream_priority, current_priority, REFRESH, BULK
+from events import EventBus, RETRY_MILLISECONDS, stream_events
+from export import (EXPORT_FORMATS, MAX_EXPORT_DAYS, ExportError, export_windows, prefetched,
+                    csv_fragments, ndjson_fragments, gzip_blocks)
+from streaming import json_fragments, time_series_fragments, chunks
+from logging_setup import configure_logging, dropped_records
+from metrics import (Counter, Gauge, Histogram, CountingWriter, REGISTRY, SIZE_BUCKETS,
+                     CONTENT_TYPE as METRICS_CONTENT_TYPE)
+
+# Configure logging (level and format are applied from the options in main())
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Configuration
-CONFIG_FILE = '/data/options.json'
-LENEDA_API_BASE = 'https://api.leneda.eu/api'
-STATIC_DIR = '/app/static'
+# The environment overrides exist for the offline benchmark (benchmarks/)
+LENEDA_API_BASE = os.environ.get('LENEDA_API_BASE', 'https://api.leneda.eu/api')
+STATIC_DIR = os.environ.get('LENEDA_STATIC_DIR', '/app/static')
+SERVER_PORT = int(os.environ.get('LENEDA_PORT', '8099'))
 
+# Concurrency limits: request worker threads, how long an idle keep-alive
+# connection is kept open (parked off the workers), how long a request may
+# stall while it is being read or written, and simultaneous calls to
+# api.leneda.eu
+MAX_WORKERS = int(os.environ.get('LENEDA_MAX_WORKERS', '16'))
+KEEP_ALIVE_TIMEOUT = 15
+REQUEST_TIMEOUT = 10
+MAX_UPSTREAM_CALLS = int(os.environ.get('LENEDA_MAX_UPSTREAM_CALLS', '4'))
 
-def load_config():
-    """Load addon configuration"""
-    try:
-        # Try production path first, then test path
-        config_paths = [CONFIG_FILE, 'test_options.json', './test_options.json']
-        
-        logger.info("🔧 Loading configuration...")
-        
-        for config_path in config_paths:
-            if os.path.exists(config_path):
-                logger.info(f"📁 Found config file: {config_path}")
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
-                    
-                # Log configuration details (safely)
-                api_key = config.get('api_key', '')
-                energy_id = config.get('energy_id', '')
-                metering_points = config.get('metering_points', [])
-                
-                logger.info(f"✅ Config loaded successfully from: {config_path}")
-                logger.info(f"🔑 API key present: {bool(api_key and api_key != 'your-test-api-key')}")
-                if api_key and api_key != 'your-test-api-key':
-                    logger.info(f"🔑 API key format: {api_key[:8]}...{api_key[-4:]} (length: {len(api_key)})")
-                else:
-                    logger.warning(f"🔑 API key value: '{api_key}' (placeholder or empty)")
-                    
-                logger.info(f"🆔 Energy ID present: {bool(energy_id and energy_id != 'your-test-energy-id')}")
-                if energy_id and energy_id != 'your-test-energy-id':
-                    logger.info(f"🆔 Energy ID: {energy_id}")
-                else:
-                    logger.warning(f"🆔 Energy ID value: '{energy_id}' (placeholder or empty)")
-                    
-                logger.info(f"📊 Metering points configured: {len(metering_points)}")
-                for i, mp in enumerate(metering_points):
-                    code = mp.get('code', '')
-                    name = mp.get('name', 'Unnamed')
-                    logger.info(f"📊 Meter {i+1}: '{name}' -> {code}")
-                    if code == 'LU000000000000000000000000000000':
-                        logger.warning(f"📊 Meter {i+1} uses placeholder code!")
-                
-                return config
-        
-        logger.error(f"❌ No config file found in paths: {config_paths}")
-        logger.error("❌ This will cause the dashboard to show 'API credentials not configured'")
-        return {
-            'api_key': '',
-            'energy_id': '',
-            'metering_points': [],
-            'billing': {},
-            'display': {'theme': 'dark'}
-        }
-    except Exception as e:
-        logger.error(f"💥 Error loading config: {e}")
-        return {}
+# Add-on options, re-read only when options.json changes
+config_loader = ConfigLoader()
+
+# Every upstream call queues here by priority for the shared request budget
+upstream_scheduler = UpstreamScheduler(max_in_flight=MAX_UPSTREAM_CALLS)
+
+# Pooled keep-alive client for api.leneda.eu, reconfigured from options in main()
+api_client = LenedaClient(max_connections=MAX_UPSTREAM_CALLS, scheduler=upstream_scheduler)
+
+# Identical concurrent upstream GETs share one in-flight fetch
+upstream_flights = SingleFlight()
+
+# Days before the first open day that aggregated requests warm in one call
+PREFETCH_WINDOW_DAYS = 31
+
+# Batched /api/dashboard requests: series fetched in parallel and batch size
+DASHBOARD_WORKERS = 4
+MAX_DASHBOARD_QUERIES = 64
+MAX_REQUEST_BODY = 65536
+
+dashboard_pool = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+
+CONSUMPTION_OBIS = '1-1:1.29.0'
+PRODUCTION_OBIS = '1-1:2.29.0'
+
+# Local time-series store, aggregation/billing/analytics engines and static files, opened in main()
+store = None
+aggregator = None
+tariff_engine = None
+billing_engine = None
+analytics_engine = None
+static_assets = None
+
+# Background refreshes of stale (open-day) data, one per series at a time
+revalidator = Revalidator()
+
+# Pushes "new data" notifications to browsers on /api/events
+event_bus = EventBus()
+
+# While event streams are open, open days are re-checked this often
+# (upstream is only called once their copy is past OPEN_DAY_TTL_SECONDS)
+EVENTS_REFRESH_SECONDS = 300
+
+# Downsampled chart responses (max_points) for finalized ranges
+downsample_cache = DownsampleCache()
+
+# Data responses carry an ETag; those built only from finalized days can
+# never change and are cached by the browser, everything else is revalidated
+FINAL_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+# Background threads warming yesterday's data, loading history and
+# refreshing open days for event streams, started in main()
+prefetcher = None
+backfiller = None
+refresher = None
+
+# Metrics exposed on /api/metrics
+HTTP_REQUESTS = Counter('leneda_http_requests_total',
+                        'Requests handled, by route, method and status', ('route', 'method', 'status'))
+HTTP_DURATION = Histogram('leneda_http_request_duration_seconds',
+                          'Time to handle a request, by route', ('route',))
+HTTP_RESPONSE_BYTES = Histogram('leneda_http_response_bytes',
+                                'Bytes written per response including headers, by route', ('route',),
+                                buckets=SIZE_BUCKETS)
+UPSTREAM_REQUESTS = Counter('leneda_upstream_requests_total',
+                            'Calls to the Leneda API, by endpoint and outcome', ('endpoint', 'outcome'))
+UPSTREAM_DURATION = Histogram('leneda_upstream_request_duration_seconds',
+                              'Leneda API call time including retries, by endpoint', ('endpoint',))
+LOG_RECORDS_DROPPED = Gauge('leneda_log_records_dropped',
+                            'Log records dropped because the log writer fell behind',
+                            function=dropped_records)
+EVENT_STREAMS = Gauge('leneda_event_streams', 'Open /api/events streams',
+                      function=event_bus.stream_count)
+UPSTREAM_RESPONSE_BYTES = Histogram('leneda_upstream_response_bytes',
+                                    'Decoded Leneda API response size, by endpoint', ('endpoint',),
+                                    buckets=SIZE_BUCKETS)
 
 
 def make_api_request(url, headers=None, method='GET', data=None):
-    """Make HTTP request using urllib with robust error handling"""
+    """Make HTTP request to Leneda, coalescing identical concurrent GETs"""
+    if method != 'GET' or data:
+        return _make_api_request(url, headers, method, data)
+    
+    # Credentials are part of the key so different accounts never share data
+    headers = headers or {}
+    key = (normalize_url(url), headers.get('X-ENERGY-ID'), headers.get('X-API-KEY'))
+    priority = current_priority()
+    # A caller joining a call queued at a lower priority promotes it to its own
+    with upstream_scheduler.flight(key):
+        result, shared = upstream_flights.do(key, lambda: _make_api_request(url, headers, method, data, key),
+                                             on_join=lambda: upstream_scheduler.promote(key, priority))
+    if shared:
+        logger.info(f"🔗 Reused in-flight upstream response for {url}")
+    return result
+
+
+def upstream_endpoint(url):
+    """Metrics label for a Leneda API URL, e.g. 'time-series'"""
+    return urlparse(url).path.rstrip('/').rsplit('/', 1)[-1] or 'root'
+
+
+def _make_api_request(url, headers=None, method='GET', data=None, key=None):
+    """Make HTTP request over the pooled Leneda client with robust error handling"""
+    endpoint = upstream_endpoint(url)
+    started = time.perf_counter()
+    # The request and response dumps below are only built when debug logging is on
+    debug = logger.isEnabledFor(logging.DEBUG)
     try:
-        logger.info(f"🌐 Making {method} request to Leneda API")
-        logger.info(f"🌐 URL: {url}")
-        logger.info(f"🌐 Headers: {dict(headers) if headers else 'None'}")
+        body = json.dumps(data).encode('utf-8') if data else None
+        if debug:
+            logger.debug(f"🌐 Making {method} request to Leneda API")
+            logger.debug(f"🌐 URL: {url}")
+            logger.debug(f"🌐 Headers: {dict(headers) if headers else 'None'}")
+            if data:
+                logger.debug(f"🌐 Request body: {json.dumps(data, indent=2)}")
+            logger.debug(f"🌐 Sending request with {api_client.timeout}s timeout, {api_client.retries} retries...")
         
-        req = Request(url, headers=headers or {}, method=method)
-        if data:
-            req.data = json.dumps(data).encode('utf-8')
-            logger.info(f"🌐 Request body: {json.dumps(data, indent=2)}")
-        
-        logger.info(f"🌐 Sending request with {15}s timeout...")
-        # Use shorter timeout to avoid hanging
-        with urlopen(req, timeout=15) as response:
-            response_data = response.read().decode('utf-8')
-            logger.info(f"✅ API response status: {response.status}")
-            logger.info(f"✅ Response headers: {dict(response.headers)}")
-            logger.info(f"✅ Response size: {len(response_data)} characters")
+        response = api_client.request(method, url, headers, body, key)
+        UPSTREAM_RESPONSE_BYTES.observe(len(response.body), endpoint)
+        logger.info(f"✅ API response status: {response.status} (attempt {response.attempts})")
+        if debug:
+            logger.debug(f"✅ Response headers: {dict(response.headers)}")
+            logger.debug(f"✅ Response size: {len(response.body)} bytes")
+        
+        try:
+            # Parse the raw bytes directly instead of keeping a decoded copy around
+            parsed_data = json.loads(response.body)
             
-            try:
-                parsed_data = json.loads(response_data)
-                
-                # Log response structure
-                if isinstance(parsed_data, dict):
-                    if 'items' in parsed_data:
-                        logger.info(f"📊 Response contains {len(parsed_data['items'])} data items")
-                        if parsed_data['items']:
-                            first_item = parsed_data['items'][0]
-                            logger.info(f"📊 First item sample: {json.dumps(first_item, indent=2)[:200]}...")
-                    elif 'aggregatedTimeSeries' in parsed_data:
-                        logger.info(f"📊 Response contains {len(parsed_data['aggregatedTimeSeries'])} aggregated items")
-                        if parsed_data['aggregatedTimeSeries']:
-                            first_item = parsed_data['aggregatedTimeSeries'][0]
-                            logger.info(f"📊 First aggregated item: {json.dumps(first_item, indent=2)}")
-                    else:
-                        logger.info(f"📊 Response structure: {list(parsed_data.keys()) if isinstance(parsed_data, dict) else type(parsed_data)}")
-                
-                logger.debug(f"📊 Full response: {response_data[:1000]}...")  # Log first 1000 chars
-                return parsed_data
-                
-            except json.JSONDecodeError as je:
-                logger.error(f"💥 JSON decode error: {je}")
-                logger.error(f"💥 Raw response: {response_data[:500]}...")
-                return None
-                
-    except URLError as e:
-        logger.error(f"🌐 Network error for {url}: {e}")
-        logger.error(f"🌐 This could be:")
-        logger.error(f"🌐   - DNS resolution issue (can't reach api.leneda.eu)")
-        logger.error(f"🌐   - Network connectivity problem")
-        logger.error(f"🌐   - Firewall blocking HTTPS requests")
-        return None
-    except HTTPError as e:
-        logger.error(f"🌐 HTTP error for {url}: {e.code} - {e.reason}")
+            # Log response structure
+            if debug and isinstance(parsed_data, dict):
+                if 'items' in parsed_data:
+                    logger.debug(f"📊 Response contains {len(parsed_data['items'])} data items")
+                    if parsed_data['items']:
+                        first_item = parsed_data['items'][0]
+                        logger.debug(f"📊 First item sample: {json.dumps(first_item, indent=2)[:200]}...")
+                elif 'aggregatedTimeSeries' in parsed_data:
+                    logger.debug(f"📊 Response contains {len(parsed_data['aggregatedTimeSeries'])} aggregated items")
+                    if parsed_data['aggregatedTimeSeries']:
+                        first_item = parsed_data['aggregatedTimeSeries'][0]
+                        logger.debug(f"📊 First aggregated item: {json.dumps(first_item, indent=2)}")
+                else:
+                    logger.debug(f"📊 Response structure: {list(parsed_data.keys()) if isinstance(parsed_data, dict) else type(parsed_data)}")
+            
+            if debug:
+                logger.debug(f"📊 Full response: {response.body[:1000]!r}...")  # Log first 1000 bytes
+            UPSTREAM_REQUESTS.inc(endpoint, 'success')
+            return parsed_data
+            
+        except (json.JSONDecodeError, UnicodeDecodeError) as je:
+            UPSTREAM_REQUESTS.inc(endpoint, 'invalid_json')
+            logger.error(f"💥 JSON decode error: {je}")
+            logger.error(f"💥 Raw response: {response.body[:500]!r}...")
+            return None
+    
+    except UpstreamHTTPError as e:
+        UPSTREAM_REQUESTS.inc(endpoint, str(e.status))
+        logger.error(f"🌐 HTTP error for {url}: {e.status} - {e.reason}")
         try:
-            error_body = e.read().decode('utf-8')
+            error_body = e.body.decode('utf-8')
             logger.error(f"🌐 Error response body: {error_body}")
             
-            if e.code == 401:
+            if e.status == 401:
                 logger.error(f"🔑 401 Unauthorized - Check your credentials:")
                 logger.error(f"🔑   - API key might be invalid or expired")
                 logger.error(f"🔑   - Energy ID might be wrong")
                 logger.error(f"🔑   - Account might not have API access")
-            elif e.code == 404:
+            elif e.status == 404:
                 logger.error(f"📊 404 Not Found - Check your metering point code")
-            elif e.code == 429:
+            elif e.status == 429:
                 logger.error(f"⏱️ 429 Rate Limited - Too many requests, slow down")
                 
         except Exception as ee:
             logger.error(f"🌐 Could not read error body: {ee}")
         return None
+    except (OSError, HTTPException) as e:
+        UPSTREAM_REQUESTS.inc(endpoint, 'network_error')
+        logger.error(f"🌐 Network error for {url}: {e}")
+        logger.error(f"🌐 This could be:")
+        logger.error(f"🌐   - DNS resolution issue (can't reach api.leneda.eu)")
+        logger.error(f"🌐   - Network connectivity problem")
+        logger.error(f"🌐   - Firewall blocking HTTPS requests")
+        return None
     except json.JSONDecodeError as e:
+        UPSTREAM_REQUESTS.inc(endpoint, 'invalid_json')
         logger.error(f"💥 JSON decode error: {e}")
         return None
     except Exception as e:
+        UPSTREAM_REQUESTS.inc(endpoint, 'error')
         logger.error(f"💥 Unexpected error for {url}: {type(e).__name__}: {e}")
         import traceback
         logger.error(f"💥 Traceback: {traceback.format_exc()}")
         return None
+    finally:
+        UPSTREAM_DURATION.observe(time.perf_counter() - started, endpoint)
+
+
+def configure_api_client(config):
+    """Apply the upstream timeout/retry and request budget options to the shared Leneda client"""
+    global api_client
+    
+    api_client.close()
+    api_client = LenedaClient(
+        timeout=config.api_timeout_seconds,
+        retries=config.api_max_retries,
+        max_connections=MAX_UPSTREAM_CALLS,
+        scheduler=upstream_scheduler
+    )
+    upstream_scheduler.configure(config.api_requests_per_minute, config.api_burst, MAX_UPSTREAM_CALLS)
+    logger.info(f"🌐 Leneda client: timeout {api_client.timeout}s, {api_client.retries} retries, "
+                f"{api_client.max_connections} pooled connections, "
+                f"{config.api_requests_per_minute}/min (bursts of {config.api_burst})")
+
+
+def leneda_headers(api_key, energy_id):
+    """Build the authentication headers for Leneda API calls"""
+    return {
+        'X-API-KEY': api_key,
+        'X-ENERGY-ID': energy_id,
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+
+
+def ensure_time_series(api_key, energy_id, metering_point, obis_code, first_day, last_day,
+                       fetch_first_day=None, revalidate=True):
+    """Make the days in [first_day, last_day] available in the store; False if they can't be served
+    
+    Missing days from fetch_first_day (default first_day) on are fetched, so
+    one call can warm a wider window. With revalidate (used by requests),
+    open days whose copy is past its TTL are served as they are and refreshed
+    in the background, and if Leneda can't be reached, missing open days are
+    left out rather than failing the request. Background jobs pass
+    revalidate=False to fetch anything that is not fresh before returning.
+    """
+    fetch_first = first_day if fetch_first_day is None else fetch_first_day
+    missing = store.missing_days(metering_point, obis_code, fetch_first, last_day, include_stale=not revalidate)
+    if not missing:
+        logger.info(f"💾 Serving {obis_code} days {first_day}-{last_day} from local store")
+    elif not fetch_days(api_key, energy_id, metering_point, obis_code, missing):
+        # Only the requested days matter; incomplete finalized days would be
+        # memoized by the engines, so those still fail the request
+        missing = store.missing_days(metering_point, obis_code, first_day, last_day,
+                                     include_stale=not revalidate)
+        if missing and (not revalidate or missing[0] < first_open_day()):
+            return False
+        if missing:
+            logger.warning(f"⚠️ Serving {obis_code} days {first_day}-{last_day} without "
+                           f"{len(missing)} open day(s) Leneda did not deliver")
+    
+    if revalidate:
+        stale = store.stale_days(metering_point, obis_code, first_day, last_day)
+        
+        def refresh():
+            with upstream_priority(REFRESH):
+                return fetch_days(api_key, energy_id, metering_point, obis_code, stale)
+        
+        if stale and revalidator.submit((metering_point, obis_code), refresh):
+            logger.info(f"🔄 Refreshing {len(stale)} stale {obis_code} day(s) in the background")
+    return True
+
+
+def fetch_days(api_key, energy_id, metering_point, obis_code, days):
+    """Fetch the given days from Leneda into the store, one call per contiguous run; False on failure"""
+    base_url = f"{LENEDA_API_BASE}/metering-points/{quote(metering_point)}/time-series"
+    for run_first, run_last in day_runs(days):
+        params = {
+            'startDateTime': format_timestamp(run_first * DAY_SECONDS),
+            'endDateTime': format_timestamp((run_last + 1) * DAY_SECONDS - 1),
+            'obisCode': obis_code
+        }
+        url = f"{base_url}?{urlencode(params)}"
+        logger.info(f"📊 Fetching missing days {params['startDateTime']} to {params['endDateTime']}")
+        data = make_api_request(url, leneda_headers(api_key, energy_id))
+        if data is None:
+            return False
+        series = Series.from_response(data, metering_point, obis_code)
+        changed = store.save_time_series(metering_point, obis_code, run_first, run_last, series)
+        aggregator.invalidate(metering_point, obis_code, run_first, run_last)
+        analytics_engine.invalidate(metering_point, run_first, run_last)
+        if changed:
+            event_bus.publish('data', {
+                'meteringPoint': metering_point,
+                'obisCode': obis_code,
+                'firstDay': format_timestamp(run_first * DAY_SECONDS)[:10],
+                'lastDay': format_timestamp(run_last * DAY_SECONDS)[:10],
+                'changedIntervals': changed
+            })
+    return True
+
+
+def cache_marker(metering_point, obis_code, first_day, last_day):
+    """Age of the stored copy of a day range, added to data responses as their "cache" field"""
+    covered, oldest_open = store.coverage_state(metering_point, obis_code, first_day, last_day)
+    age = int(time.time() - oldest_open) if oldest_open is not None else 0
+    missing = last_day - first_day + 1 - covered
+    return {
+        'ageSeconds': age,
+        'stale': age > OPEN_DAY_TTL_SECONDS,
+        'refreshing': oldest_open is not None and revalidator.is_pending((metering_point, obis_code)),
+        'missingDays': missing,
+        # Only a range whose every day was fetched after it finalized can't change
+        'final': covered > 0 and missing == 0 and oldest_open is None,
+    }
+
+
+def series_version(metering_point, obis_code, first_day, last_day, cache):
+    """What a response built from a stored day range depends on, for its ETag"""
+    return [metering_point, obis_code, first_day, last_day,
+            store.range_version(metering_point, obis_code, first_day, last_day),
+            cache['stale'], cache['refreshing'], cache['missingDays']]
+
+
+def data_etag(parts, final):
+    """ETag for a data response: strong if it is built from finalized days only
+    
+    Other responses differ in the age reported in their "cache" field, so
+    they get a weak ETag and are revalidated.
+    """
+    digest = hashlib.sha256(json.dumps(parts, default=str).encode('utf-8')).hexdigest()[:32]
+    return f'"{digest}"' if final else f'W/"{digest}"'
+
+
+def tariff_versions(tariffs):
+    """Tariff settings plus the version of dynamic price files, for ETags"""
+    return [
+        [asdict(tariff), tariff_engine.price_table(tariff.prices_file).get()[1] if tariff.type == 'dynamic' else None]
+        for tariff in tariffs
+    ]
+
+
+def fetch_time_series(api_key, energy_id, metering_point, obis_code, start_date, end_date):
+    """Make a 15-minute range available in the store; return (start_ts, end_ts) or None
+    
+    Raises ValueError if the range is invalid or reversed.
+    """
+    first_day, last_day = date_range_days(start_date, end_date)
+    start_ts = parse_timestamp(start_date)
+    end_ts = parse_timestamp(end_date)
+    if end_ts < start_ts:
+        raise ValueError(f"end date {end_date} is before start date {start_date}")
+    
+    if not ensure_time_series(api_key, energy_id, metering_point, obis_code, first_day, last_day):
+        return None
+    return start_ts, end_ts
+
+
+def date_range_days(start_date, end_date):
+    """Convert an inclusive start/end date pair into UTC day numbers"""
+    first_day = day_of(parse_timestamp(start_date))
+    last_day = day_of(parse_timestamp(end_date))
+    if last_day < first_day:
+        raise ValueError(f"end date {end_date} is before start date {start_date}")
+    return first_day, last_day
+
+
+def parse_meter_range(config, params, meter_required=True):
+    """Check the credentials, metering_point and date range of an analysis request
+
+    Return (meter, first_day, last_day, start_date, end_date), where meter is
+    the configured metering point (None if none was asked for and none is
+    required) and the dates default to the last 30 complete days. Raise
+    ValueError with the message for a 400 response.
+    """
+    if not config.api_key or not config.energy_id:
+        logger.error("❌ API credentials not configured")
+        raise ValueError('API credentials not configured')
+    
+    meter = None
+    code = params.get('metering_point')
+    if code or meter_required:
+        meter = next((mp for mp in config.metering_points if mp.code == code), None)
+        if meter is None:
+            raise ValueError('metering_point must be a configured metering point')
+    
+    # Default to the last 30 complete days
+    yesterday = day_of(int(time.time())) - 1
+    start_date = params.get('start_date') or format_timestamp((yesterday - 29) * DAY_SECONDS)[:10]
+    end_date = params.get('end_date') or format_timestamp(yesterday * DAY_SECONDS)[:10]
+    try:
+        first_day, last_day = date_range_days(start_date, end_date)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid date range: {e}') from e
+    return meter, first_day, last_day, start_date, end_date
+
+
+def fetch_aggregated(api_key, energy_id, metering_point, obis_code, start_date, end_date, aggregation_level):
+    """Aggregate a date range locally from the cached 15-minute series"""
+    if aggregation_level not in AGGREGATION_LEVELS:
+        raise ValueError(f"unsupported aggregation level {aggregation_level}")
+    first_day, last_day = date_range_days(start_date, end_date)
+    
+    if not ensure_time_series(api_key, energy_id, metering_point, obis_code, first_day, last_day,
+                              prefetch_first_day(first_day, last_day)):
+        return None
+    return aggregator.aggregate(metering_point, obis_code, first_day, last_day, aggregation_level)
+
+
+def prefetch_first_day(first_day, last_day):
+    """Widen ranges touching the recent window so one call warms the whole window"""
+    # Dashboard ranges overlap heavily, so one upstream call warms the whole
+    # recent window instead of one call per card
+    window_first = first_open_day() - PREFETCH_WINDOW_DAYS
+    return min(first_day, window_first) if last_day >= window_first else first_day
+
+
+def meter_obis_codes(mp):
+    """OBIS codes shown for a metering point, based on its configured type"""
+    obis_codes = []
+    if mp.type in ('consumption', 'both'):
+        obis_codes.append(CONSUMPTION_OBIS)
+    if mp.type in ('production', 'both'):
+        obis_codes.append(PRODUCTION_OBIS)
+    return obis_codes
+
+
+def sharing_obis_codes(mp):
+    """Energy-sharing OBIS codes of a metering point in a sharing group"""
+    if not mp.sharing:
+        return []
+    obis_codes = []
+    if mp.type in ('consumption', 'both'):
+        obis_codes.extend(SHARED_CONSUMPTION_OBIS)
+    if mp.type in ('production', 'both'):
+        obis_codes.extend(SHARED_PRODUCTION_OBIS)
+    return obis_codes
+
+
+def configured_series(config):
+    """(metering_point, obis_code) pairs of every configured meter, including its sharing series"""
+    return [(mp.code, obis_code) for mp in config.metering_points
+            for obis_code in meter_obis_codes(mp) + sharing_obis_codes(mp)]
+
+
+def flow_sources(mp, producer=None):
+    """Series of a meter's energy flows; producer is a separate production meter, if any"""
+    if producer is None and mp.type in ('production', 'both'):
+        producer = mp
+    return FlowSources(
+        consumption=(mp.code, CONSUMPTION_OBIS) if mp.type in ('consumption', 'both') else None,
+        production=(producer.code, PRODUCTION_OBIS) if producer else None,
+        shared_consumption=[(mp.code, obis_code) for obis_code in sharing_obis_codes(mp)
+                            if obis_code in SHARED_CONSUMPTION_OBIS],
+        shared_production=[(producer.code, obis_code) for obis_code in sharing_obis_codes(producer)
+                           if obis_code in SHARED_PRODUCTION_OBIS] if producer else (),
+    )
+
+
+def refresh_open_days(config):
+    """Re-check yesterday for every configured series, refreshing stale copies in the background"""
+    if not (config.has_api_key and config.has_energy_id):
+        return
+    yesterday = day_of(int(time.time())) - 1
+    with upstream_priority(REFRESH):
+        for metering_point, obis_code in configured_series(config):
+            ensure_time_series(config.api_key, config.energy_id, metering_point, obis_code, yesterday, yesterday)
+
+
+def backfill_window(config, metering_point, obis_code, first_day, last_day):
+    """Load one backfill window into the store; False on failure"""
+    with upstream_priority(BULK):
+        return ensure_time_series(config.api_key, config.energy_id, metering_point, obis_code,
+                                  first_day, last_day, revalidate=False)
+
+
+def load_export_window(config, metering_point, obis_code, first_day, last_day):
+    """Make one export window available and read it as a Series; None on failure"""
+    with upstream_priority(BULK):
+        if not ensure_time_series(config.api_key, config.energy_id, metering_point, obis_code,
+                                  first_day, last_day):
+            return None
+    return read_series(store, metering_point, obis_code, first_day * DAY_SECONDS, (last_day + 1) * DAY_SECONDS - 1)
+
+
+def default_dashboard_queries(config):
+    """Build the dashboard's standard panels for every configured metering point"""
+    yesterday = day_of(int(time.time())) - 1
+    panels = {
+        'yesterday': (yesterday, yesterday, 'Infinite'),
+        'week': (yesterday - 7, yesterday, 'Infinite'),
+        'month': (yesterday - 30, yesterday, 'Infinite'),
+        'daily': (yesterday - 7, yesterday, 'Day'),
+        'intervals': (yesterday, yesterday, None),
+    }
+    queries = []
+    for mp in config.metering_points:
+        for obis_code in meter_obis_codes(mp):
+            for panel, (first_day, last_day, level) in panels.items():
+                queries.append({
+                    'id': f"{mp.code}/{obis_code}/{panel}",
+                    'metering_point': mp.code,
+                    'obis_code': obis_code,
+                    'start_date': format_timestamp(first_day * DAY_SECONDS)[:10],
+                    'end_date': format_timestamp(last_day * DAY_SECONDS)[:10],
+                    'aggregation_level': level,
+                    'format': 'json' if level else 'columnar'
+                })
+    return queries
+
+
+def warm_metering_points(config):
+    """Prefetch yesterday's window for every configured meter; return incomplete series"""
+    yesterday = day_of(int(time.time())) - 1
+    first_day = prefetch_first_day(yesterday, yesterday)
+    incomplete = []
+    for mp in config.metering_points:
+        for obis_code in meter_obis_codes(mp):
+            with upstream_priority(REFRESH):
+                warmed = ensure_time_series(config.api_key, config.energy_id, mp.code, obis_code,
+                                            first_day, yesterday, revalidate=False)
+            if not warmed:
+                incomplete.append(f"{mp.code}/{obis_code}")
+                continue
+            # Build the day profiles now so the first aggregated request is served warm
+            _, _, step = aggregator.day_profiles(mp.code, obis_code, first_day, yesterday)
+            if store.count_readings(mp.code, obis_code, yesterday * DAY_SECONDS,
+                                    (yesterday + 1) * DAY_SECONDS - 1) < DAY_SECONDS // step:
+                incomplete.append(f"{mp.code}/{obis_code}")
+    logger.info(f"🌅 Prefetched {yesterday - first_day + 1} days for {len(config.metering_points)} "
+                f"metering point(s), {len(incomplete)} series incomplete")
+    return incomplete
+
+
+def active_tariff(config):
+    """The tariff selected by billing.tariff, or None for the flat energy rate"""
+    for tariff in config.tariffs:
+        if tariff.name == config.billing.tariff:
+            return tariff
+    return None
+
+
+def run_dashboard_queries(config, queries):
+    """Answer a batch of series queries, fetching missing data concurrently; return (results, etag)"""
+    configured = {mp.code for mp in config.metering_points}
+    results = {}
+    planned = []
+    spans = {}
+    
+    for index, query in enumerate(queries):
+        query_id = str(query.get('id', index))
+        metering_point = query.get('metering_point')
+        obis_code = query.get('obis_code') or CONSUMPTION_OBIS
+        level = query.get('aggregation_level') or None
+        columnar = query.get('format') == 'columnar'
+        try:
+            if metering_point not in configured:
+                raise ValueError(f"metering point {metering_point} is not configured")
+            if level is not None and level not in AGGREGATION_LEVELS:
+                raise ValueError(f"unsupported aggregation level {level}")
+            if query.get('format', 'json') not in ('json', 'columnar') or (columnar and level is not None):
+                raise ValueError("format must be json, or columnar for interval series")
+            first_day, last_day = date_range_days(query['start_date'], query['end_date'])
+        except (KeyError, TypeError, ValueError) as e:
+            results[query_id] = {'error': f"Invalid query: {e}"}
+            continue
+        
+        planned.append((query_id, metering_point, obis_code, first_day, last_day, level, columnar))
+        key = (metering_point, obis_code)
+        fetch_first = prefetch_first_day(first_day, last_day)
+        if key in spans:
+            fetch_first = min(fetch_first, spans[key][0])
+            last_day = max(last_day, spans[key][1])
+        spans[key] = (fetch_first, last_day)
+    
+    # One fetch per series covering the union of its requested ranges
+    futures = {
+        key: dashboard_pool.submit(ensure_time_series, config.api_key, config.energy_id,
+                                   key[0], key[1], first_day, last_day)
+        for key, (first_day, last_day) in spans.items()
+    }
+    available = {key: future.result() for key, future in futures.items()}
+    
+    validators = sorted(results)
+    for query_id, metering_point, obis_code, first_day, last_day, level, columnar in planned:
+        if not available[(metering_point, obis_code)]:
+            validators.append([query_id, 'unavailable'])
+            results[query_id] = {'error': 'Failed to fetch data from Leneda API. Check logs for details.'}
+        elif level is None:
+            series = read_series(store, metering_point, obis_code,
+                                 first_day * DAY_SECONDS, (last_day + 1) * DAY_SECONDS - 1)
+            results[query_id] = columnar_series(series) if columnar else series.to_response()
+        else:
+            results[query_id] = dict(aggregator.aggregate(metering_point, obis_code, first_day, last_day, level))
+        if 'error' not in results[query_id]:
+            cache = results[query_id]['cache'] = cache_marker(metering_point, obis_code, first_day, last_day)
+            validators.append([query_id, level, columnar,
+                               *series_version(metering_point, obis_code, first_day, last_day, cache)])
+    
+    logger.info(f"📦 Dashboard batch: {len(queries)} queries over {len(spans)} series")
+    # Always weak: the batch also reports when it was generated
+    return results, data_etag(['dashboard', validators], final=False)
+
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server that runs requests on a bounded worker pool
+    
+    Workers only hold a connection while they serve a request. In between,
+    an idle keep-alive connection is parked with one selector thread, which
+    hands it back to the pool when the next request arrives and closes it
+    after KEEP_ALIVE_TIMEOUT, so idle browser connections never hold up
+    requests on other connections. Event streams are detached from the pool
+    altogether.
+    """
+    
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS):
+        # Set up before binding: if the bind fails, the base class calls server_close()
+        self.workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http-worker')
+        self._handoff_lock = threading.Lock()
+        self._parking = {}
+        self._detached = set()
+        self._arriving = deque()
+        self._idle = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._idle.register(self._wakeup_read, selectors.EVENT_READ)
+        threading.Thread(target=self._watch_idle, name='http-idle', daemon=True).start()
+        super().__init__(server_address, handler_class)
+    
+    def process_request(self, request, client_address):
+        """Hand the connection to a worker instead of spawning a thread per request"""
+        self.workers.submit(self.process_request_thread, request, client_address)
+    
+    def park(self, request, client_address):
+        """Keep the connection open once its handler returns, waiting for the next request off the pool"""
+        with self._handoff_lock:
+            self._parking[request] = client_address
+    
+    def detach(self, request):
+        """Leave the connection open once its handler returns; whoever took it over closes it"""
+        with self._handoff_lock:
+            self._detached.add(request)
+    
+    def shutdown_request(self, request):
+        with self._handoff_lock:
+            client_address = self._parking.pop(request, None)
+            if client_address is not None:
+                self._arriving.append((request, client_address))
+            elif request in self._detached:
+                self._detached.discard(request)
+                return
+        if client_address is None:
+            super().shutdown_request(request)
+            return
+        try:
+            self._wakeup_write.send(b'\0')
+        except OSError:
+            # The server is closing
+            super().shutdown_request(request)
+    
+    def _watch_idle(self):
+        """Selector loop over parked connections"""
+        while True:
+            for key, _ in self._idle.select(timeout=1):
+                if key.fileobj is self._wakeup_read:
+                    try:
+                        if self._wakeup_read.recv(4096):
+                            continue
+                    except OSError:
+                        pass
+                    self._close_idle()
+                    return
+                self._idle.unregister(key.fileobj)
+                try:
+                    self.workers.submit(self.process_request_thread, key.fileobj, key.data[0])
+                except RuntimeError:
+                    super().shutdown_request(key.fileobj)
+            
+            now = time.monotonic()
+            with self._handoff_lock:
+                arriving = list(self._arriving)
+                self._arriving.clear()
+            for request, client_address in arriving:
+                self._idle.register(request, selectors.EVENT_READ, (client_address, now))
+            for key in list(self._idle.get_map().values()):
+                if key.data and now - key.data[1] > KEEP_ALIVE_TIMEOUT:
+                    self._idle.unregister(key.fileobj)
+                    super().shutdown_request(key.fileobj)
+    
+    def _close_idle(self):
+        for key in list(self._idle.get_map().values()):
+            self._idle.unregister(key.fileobj)
+            if key.data:
+                super().shutdown_request(key.fileobj)
+        self._idle.close()
+        self._wakeup_read.close()
+    
+    def server_close(self):
+        super().server_close()
+        self._wakeup_write.close()
+        self.workers.shutdown(wait=False, cancel_futures=True)
 
 
 class LenedaHandler(BaseHTTPRequestHandler):
     """HTTP request handler for Leneda dashboard"""
     
+    # HTTP/1.1 keeps connections alive between the panel's API calls; the
+    # server parks them while idle, and a client stalling mid-request is dropped
+    protocol_version = 'HTTP/1.1'
+    timeout = REQUEST_TIMEOUT
+    # Headers and body go out as separate writes; without TCP_NODELAY the body
+    # waits for the client's delayed ACK (~40 ms per keep-alive request)
+    disable_nagle_algorithm = True
+    
     def log_message(self, format, *args):
         """Override to use proper logging"""
         logger.info("🌐 %s - %s" % (self.address_string(), format % args))
     
-    def send_json(self, data, status=200):
-        """Send JSON response with cache busting"""
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+        self._started = None
+    
+    def parse_request(self):
+        # Timing starts once the request line arrived, not while idling on keep-alive
+        self._started = time.perf_counter()
+        self._status = None
+        self.wfile.written = 0
+        return super().parse_request()
+    
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+    
+    def handle(self):
+        """Serve the requests already sent on the connection, then park it until the next one"""
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if not self.request_waiting():
+                self.server.park(self.request, self.client_address)
+                return
+            self.handle_one_request()
+    
+    def request_waiting(self):
+        """True if (part of) another request is already buffered or readable, without blocking"""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self._started is not None:
+            self.record_request()
+            self._started = None
+    
+    def record_request(self):
+        """Update the request metrics for the request that just finished"""
+        path = urlparse(self.path).path if self.command else ''
+        if path.startswith('/api/') and self._status != 404:
+            route = path
+        elif static_assets is not None and static_assets.get(path):
+            route = 'static'
+        else:
+            route = 'other'
+        HTTP_REQUESTS.inc(route, self.command or '', self._status or 0)
+        HTTP_DURATION.observe(time.perf_counter() - self._started, route)
+        HTTP_RESPONSE_BYTES.observe(self.wfile.written, route)
+    
+    def send_json_headers(self, status, content_type='application/json', cache=None, etag=None, immutable=False):
+        """Send the status line and common headers of a JSON response"""
         self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Type', content_type)
+        if cache:
+            # Age of the stored data the response was computed from
+            self.send_header('Age', str(cache['ageSeconds']))
         self.send_header('Access-Control-Allow-Origin', '*')
-        # NUCLEAR CACHE BUSTING for API responses too
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate, max-age=0')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        if etag:
+            self.send_validator_headers(etag, cache, immutable)
+        else:
+            # NUCLEAR CACHE BUSTING for API responses too
+            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate, max-age=0')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Expires', '0')
+    
+    def send_validator_headers(self, etag, cache, immutable):
+        """ETag and Cache-Control of a data response; only immutable final ranges skip revalidation"""
+        self.send_header('ETag', etag)
+        final = immutable and cache is not None and cache['final']
+        self.send_header('Cache-Control', FINAL_CACHE_CONTROL if final else REVALIDATE_CACHE_CONTROL)
+        self.send_header('Vary', 'Accept')
+    
+    def not_modified(self, etag, cache=None, immutable=False):
+        """Answer 304 if the request's If-None-Match matches etag; True if it did"""
+        if not etag_matches(self.headers.get('If-None-Match'), etag):
+            return False
+        self.send_response(304)
+        self.send_validator_headers(etag, cache, immutable)
+        self.send_header('Content-Length', '0')
         self.end_headers()
+        logger.debug(f"📡 Not modified (304): {self.path}")
+        return True
+    
+    def send_json(self, data, status=200, cache=None, etag=None, immutable=False):
+        """Send JSON response with cache busting"""
+        self.send_json_headers(status, cache=cache, etag=etag, immutable=immutable)
         response_json = json.dumps(data)
-        self.wfile.write(response_json.encode('utf-8'))
-        logger.info(f"📡 Sent JSON response ({len(response_json)} chars) with cache busting")
+        body = response_json.encode('utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        logger.debug(f"📡 Sent JSON response ({len(response_json)} chars) with cache busting")
+    
+    def send_json_stream(self, fragments, status=200, content_type='application/json', cache=None,
+                         etag=None, immutable=False):
+        """Send JSON produced incrementally, using chunked transfer encoding"""
+        self.send_json_headers(status, content_type, cache, etag, immutable)
+        total, count = self.write_chunked(chunks(fragments))
+        if total is not None:
+            logger.debug(f"📡 Streamed JSON response ({total} bytes in {count} chunks)")
     
-    def send_file(self, filepath):
-        """Send file response with aggressive cache busting"""
+    def write_chunked(self, blocks):
+        """End the headers and write byte blocks as a chunked body; return (bytes, chunks), (None, None) if aborted"""
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            # HTTP/1.0 clients read until the connection closes
+            self.close_connection = True
+        self.end_headers()
+        
+        total = 0
+        count = 0
         try:
-            with open(filepath, 'rb') as f:
-                content = f.read()
-            
-            mime_type, _ = mimetypes.guess_type(filepath)
-            self.send_response(200)
-            self.send_header('Content-Type', mime_type or 'application/octet-stream')
-            
-            # NUCLEAR CACHE BUSTING - Force browsers to reload everything
-            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate, max-age=0')
-            self.send_header('Pragma', 'no-cache')
-            self.send_header('Expires', '0')
-            self.send_header('Last-Modified', 'Thu, 01 Jan 1970 00:00:00 GMT')
-            self.send_header('ETag', f'"{hash(content)}-1.0.7"')
-            
-            self.end_headers()
-            self.wfile.write(content)
-            logger.info(f"🗂️ Served file {filepath} with NUCLEAR cache busting")
-        except FileNotFoundError:
-            self.send_error(404, 'File not found')
+            for block in blocks:
+                if not block:
+                    continue
+                if chunked:
+                    self.wfile.write(f"{len(block):X}\r\n".encode('ascii') + block + b"\r\n")
+                else:
+                    self.wfile.write(block)
+                total += len(block)
+                count += 1
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
         except Exception as e:
-            logger.error(f"Error serving file {filepath}: {e}")
-            self.send_error(500, 'Internal server error')
+            # Headers are already out; dropping the connection tells the client the body is incomplete
+            self.close_connection = True
+            logger.error(f"💥 Streaming aborted after {total} bytes: {type(e).__name__}: {e}")
+            return None, None
+        return total, count
+    
+    def send_binary_series(self, series, cache=None, etag=None, immutable=False):
+        """Send a series as packed little-endian float32 values with X-Series-* headers"""
+        self.send_json_headers(200, BINARY_CONTENT_TYPE, cache, etag, immutable)
+        for name, value in binary_headers(series):
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(series) * 4))
+        self.end_headers()
+        try:
+            for block in binary_blocks(series):
+                self.wfile.write(block)
+        except Exception as e:
+            self.close_connection = True
+            logger.error(f"💥 Binary response aborted: {type(e).__name__}: {e}")
+            return
+        logger.debug(f"📡 Sent {len(series)} binary values")
+    
+    def send_asset(self, asset):
+        """Send a cached static asset with ETag revalidation and compression"""
+        not_modified = asset.matches(self.headers.get('If-None-Match'))
+        self.send_response(304 if not_modified else 200)
+        self.send_header('ETag', asset.etag)
+        self.send_header('Cache-Control', asset.cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        
+        if not_modified:
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            logger.debug(f"🗂️ {asset.name} not modified (304)")
+            return
+        
+        encoding, body = asset.negotiate(self.headers.get('Accept-Encoding'))
+        self.send_header('Content-Type', asset.content_type)
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        logger.debug(f"🗂️ Served {asset.name} ({encoding}, {len(body)} bytes)")
     
     def do_GET(self):
         """Handle GET requests"""
         parsed = urlparse(self.path)
         path = parsed.path
         
-        logger.info(f"🌐 === INCOMING REQUEST ===")
-        logger.info(f"🌐 GET request: {self.path}")
-        logger.info(f"🌐 Client address: {self.client_address}")
-        logger.info(f"🌐 User-Agent: {self.headers.get('User-Agent', 'Unknown')}")
-        logger.info(f"🌐 Referer: {self.headers.get('Referer', 'None')}")
-        logger.info(f"🌐 Host: {self.headers.get('Host', 'Unknown')}")
-        logger.info(f"🌐 Accept: {self.headers.get('Accept', 'Unknown')}")
-        logger.info(f"🌐 Parsed path: '{path}'")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"🌐 === INCOMING REQUEST ===")
+            logger.debug(f"🌐 GET request: {self.path}")
+            logger.debug(f"🌐 Client address: {self.client_address}")
+            logger.debug(f"🌐 User-Agent: {self.headers.get('User-Agent', 'Unknown')}")
+            logger.debug(f"🌐 Referer: {self.headers.get('Referer', 'None')}")
+            logger.debug(f"🌐 Host: {self.headers.get('Host', 'Unknown')}")
+            logger.debug(f"🌐 Accept: {self.headers.get('Accept', 'Unknown')}")
+            logger.debug(f"🌐 Parsed path: '{path}'")
         
         # API endpoints
         if path == '/api/health':
-            logger.info("🔧 === HEALTH CHECK REQUEST ===")
+            logger.debug("🔧 === HEALTH CHECK REQUEST ===")
             # Simple health check - no external dependencies
             self.send_json({
                 'status': 'healthy',
                 'version': '1.0.9',
                 'timestamp': datetime.now().isoformat()
             })
-            logger.info("🔧 Health check response sent")
+            logger.debug("🔧 Health check response sent")
         
         elif path == '/api/debug':
-            logger.info("🔧 === DEBUG API REQUEST ===")
-            config = load_config()
+            logger.debug("🔧 === DEBUG API REQUEST ===")
+            config = config_loader.get()
             
             debug_info = {
                 'server_version': '1.0.9',
                 'timestamp': datetime.now().isoformat(),
                 'config_file_exists': os.path.exists(CONFIG_FILE),
                 'config_file_path': CONFIG_FILE,
-                'raw_config_keys': list(config.keys()) if config else [],
-                'api_key_length': len(config.get('api_key', '')),
-                'energy_id_value': config.get('energy_id', ''),
-                'metering_points_count': len(config.get('metering_points', [])),
+                'config_source': config.source,
+                'config_problems': list(config.problems),
+                'api_key_length': len(config.api_key),
+                'energy_id_value': config.energy_id,
+                'metering_points_count': len(config.metering_points),
+                'prefetch': prefetcher.status() if prefetcher else None,
+                'backfill': backfiller.status() if backfiller else None,
+                'upstream': upstream_scheduler.status(),
                 'request_headers': dict(self.headers),
                 'client_address': str(self.client_address)
             }
             
-            logger.info(f"🔧 Debug info: {json.dumps(debug_info, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"🔧 Debug info: {json.dumps(debug_info, indent=2)}")
             self.send_json(debug_info)
         
         elif path == '/api/config':
-            logger.info(f"🔧 Request from: {self.client_address}")
-            logger.info(f"🔧 User-Agent: {self.headers.get('User-Agent', 'Unknown')}")
+            logger.debug(f"🔧 Request from: {self.client_address}")
+            logger.debug(f"🔧 User-Agent: {self.headers.get('User-Agent', 'Unknown')}")
             
-            config = load_config()
+            config = config_loader.get()
             
             # Prepare safe config for frontend (without sensitive data)
-            api_key = config.get('api_key', '')
-            energy_id = config.get('energy_id', '')
-            metering_points = config.get('metering_points', [])
-            
-            # Check if credentials are real (not placeholders)
-            has_real_api_key = bool(api_key and api_key.strip() and api_key != 'your-test-api-key')
-            has_real_energy_id = bool(energy_id and energy_id.strip() and energy_id != 'your-test-energy-id')
-            
-            logger.info(f"🔧 Raw config values:")
-            logger.info(f"🔧   - API key length: {len(api_key)} chars")
-            logger.info(f"🔧   - API key starts with: '{api_key[:10]}...' (showing first 10 chars)")
-            logger.info(f"🔧   - Energy ID: '{energy_id}'")
-            logger.info(f"🔧   - Metering points count: {len(metering_points)}")
-            if metering_points:
-                for i, mp in enumerate(metering_points):
-                    logger.info(f"🔧   - Meter {i+1}: '{mp.get('name', 'Unknown')}' -> '{mp.get('code', 'Unknown')}'")
+            safe_config = config.frontend_view()
             
-            logger.info(f"🔧 Processed config for frontend:")
-            logger.info(f"🔧   - has_api_key result: {has_real_api_key}")
-            logger.info(f"🔧   - has_energy_id result: {has_real_energy_id}")
-            
-            safe_config = {
-                'has_api_key': has_real_api_key,
-                'has_energy_id': has_real_energy_id,
-                'metering_points': metering_points,
-                'billing': config.get('billing', {}),
-                'display': config.get('display', {})
-            }
+            logger.debug(f"🔧 Processed config for frontend:")
+            logger.debug(f"🔧   - has_api_key result: {config.has_api_key}")
+            logger.debug(f"🔧   - has_energy_id result: {config.has_energy_id}")
+            logger.debug(f"🔧   - Metering points count: {len(config.metering_points)}")
             
-            logger.info(f"🔧 Sending to frontend: {json.dumps(safe_config, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"🔧 Sending to frontend: {json.dumps(safe_config, indent=2)}")
             self.send_json(safe_config)
-            logger.info("🔧 === CONFIG API REQUEST COMPLETE ===")
+            logger.debug("🔧 === CONFIG API REQUEST COMPLETE ===")
         
         elif path == '/api/metering-data':
             self.handle_metering_data()
@@ -325,32 +1050,135 @@ class LenedaHandler(BaseHTTPRequestHandler):
         elif path == '/api/calculate-invoice':
             self.handle_calculate_invoice()
         
-        # Static files
-        elif path == '/' or path == '/index.html':
-            self.send_file(os.path.join(STATIC_DIR, 'index.html'))
+        elif path == '/api/dashboard':
+            self.handle_dashboard()
         
-        elif path.startswith('/'):
-            # Serve static files
-            filepath = os.path.join(STATIC_DIR, path.lstrip('/'))
-            if os.path.isfile(filepath):
-                self.send_file(filepath)
-            else:
-                self.send_error(404, 'File not found')
+        elif path == '/api/tariff-comparison':
+            self.handle_tariff_comparison()
+        
+        elif path == '/api/analytics':
+            self.handle_analytics()
+        
+        elif path == '/api/export':
+            self.handle_export()
+        
+        elif path == '/api/events':
+            self.handle_events()
+        
+        elif path == '/api/backfill':
+            self.send_json(backfiller.status() if backfiller else {'state': 'not started'})
+        
+        elif path == '/api/metrics':
+            body = REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        # Static files, served from the in-memory cache
+        elif static_assets.get(path):
+            self.send_asset(static_assets.get(path))
         
+        else:
+            self.send_error(404, 'File not found')
+    
+    def do_POST(self):
+        """Handle POST requests"""
+        path = urlparse(self.path).path
+        logger.debug(f"🌐 POST request: {self.path}")
+        
+        if path == '/api/dashboard':
+            self.handle_dashboard()
+        elif path == '/api/tariff-comparison':
+            self.handle_tariff_comparison()
         else:
             self.send_error(404, 'Not found')
     
+    def read_json_body(self):
+        """Read and parse a JSON request body, or None if missing/invalid"""
+        chunked = bool(self.headers.get('Transfer-Encoding'))
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = None
+        if chunked or not length or length < 0 or length > MAX_REQUEST_BODY:
+            # An unread body would be parsed as the next request on this connection
+            if chunked or length != 0:
+                self.close_connection = True
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+    
+    def handle_events(self):
+        """Stream "new data" notifications as Server-Sent Events until the client leaves"""
+        subscription = event_bus.subscribe(self.headers.get('Last-Event-ID'))
+        if subscription is None:
+            # The frontend falls back to polling
+            self.send_json({'error': 'Too many event streams open'}, 503)
+            return
+        
+        logger.info(f"📣 Event stream opened ({event_bus.stream_count()} open)")
+        # The stream has no length and ends with the connection
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('X-Accel-Buffering', 'no')
+            self.end_headers()
+            self.wfile.write(f"retry: {RETRY_MILLISECONDS}\n\n".encode('ascii'))
+        except OSError:
+            event_bus.unsubscribe(subscription)
+            return
+        # The stream is written by its own thread, so it doesn't hold a request worker
+        self.server.detach(self.request)
+        threading.Thread(target=stream_events, args=(event_bus, subscription, self.request),
+                         name='event-stream', daemon=True).start()
+    
+    def handle_dashboard(self):
+        """Handle a batched dashboard request (GET: default panels, POST: custom queries)"""
+        config = config_loader.get()
+        # Read the body before any early answer, so the connection stays in sync
+        body = self.read_json_body() if self.command == 'POST' else None
+        
+        if not config.api_key or not config.energy_id:
+            logger.error("❌ API credentials not configured")
+            self.send_json({'error': 'API credentials not configured'}, 400)
+            return
+        
+        if self.command == 'POST':
+            queries = body.get('queries') if isinstance(body, dict) else None
+            if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+                self.send_json({'error': 'Expected a JSON body with a "queries" list'}, 400)
+                return
+            if len(queries) > MAX_DASHBOARD_QUERIES:
+                self.send_json({'error': f'At most {MAX_DASHBOARD_QUERIES} queries per batch'}, 400)
+                return
+        else:
+            queries = default_dashboard_queries(config)
+        
+        results, etag = run_dashboard_queries(config, queries)
+        if self.command == 'GET' and self.not_modified(etag):
+            return
+        self.send_json({
+            'generated_at': datetime.now().isoformat(),
+            'results': results
+        }, etag=etag if self.command == 'GET' else None)
+    
     def handle_metering_data(self):
         """Handle metering data request"""
-        logger.info("📊 === METERING DATA REQUEST ===")
+        logger.debug("📊 === METERING DATA REQUEST ===")
         
-        config = load_config()
-        api_key = config.get('api_key', '')
-        energy_id = config.get('energy_id', '')
+        config = config_loader.get()
+        api_key = config.api_key
+        energy_id = config.energy_id
         
-        logger.info(f"📊 Handling metering data request")
-        logger.info(f"📊 API key present: {bool(api_key and api_key != 'your-test-api-key')}")
-        logger.info(f"📊 Energy ID present: {bool(energy_id and energy_id != 'your-test-energy-id')}")
+        logger.debug(f"📊 Handling metering data request")
+        logger.debug(f"📊 API key present: {config.has_api_key}")
+        logger.debug(f"📊 Energy ID present: {config.has_energy_id}")
         
         if not api_key or not energy_id:
             logger.error("❌ API credentials not configured")
@@ -364,12 +1192,20 @@ class LenedaHandler(BaseHTTPRequestHandler):
         obis_code = query.get('obis_code', ['1-1:1.29.0'])[0]
         start_date = query.get('start_date', [None])[0]
         end_date = query.get('end_date', [None])[0]
+        try:
+            max_points = parse_max_points(query.get('max_points', [None])[0])
+            response_format = negotiate_format(query.get('format', [None])[0], self.headers.get('Accept'))
+            if max_points and response_format != 'json':
+                raise ValueError("max_points is only supported for format=json")
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
         
-        logger.info(f"📊 Request parameters:")
-        logger.info(f"📊   - Metering point: {metering_point}")
-        logger.info(f"📊   - OBIS code: {obis_code}")
-        logger.info(f"📊   - Start date: {start_date}")
-        logger.info(f"📊   - End date: {end_date}")
+        logger.debug(f"📊 Request parameters:")
+        logger.debug(f"📊   - Metering point: {metering_point}")
+        logger.debug(f"📊   - OBIS code: {obis_code}")
+        logger.debug(f"📊   - Start date: {start_date}")
+        logger.debug(f"📊   - End date: {end_date}")
         
         if not metering_point:
             logger.error("❌ Missing metering_point parameter")
@@ -385,49 +1221,56 @@ class LenedaHandler(BaseHTTPRequestHandler):
             start_date = start_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
             end_date = end_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
             
-            logger.info(f"📊 Using default date range (yesterday):")
-            logger.info(f"📊   - Start: {start_date}")
-            logger.info(f"📊   - End: {end_date}")
-            logger.info(f"📊 NOTE: Leneda has 1-day delay, requesting yesterday's data")
+            logger.debug(f"📊 Using default date range (yesterday):")
+            logger.debug(f"📊   - Start: {start_date}")
+            logger.debug(f"📊   - End: {end_date}")
+            logger.debug(f"📊 NOTE: Leneda has 1-day delay, requesting yesterday's data")
             
-        logger.info(f"📊 Final request details:")
-        logger.info(f"📊   - Period: {start_date} to {end_date}")
-        logger.info(f"📊   - Metering point: {metering_point}")
-        logger.info(f"📊   - OBIS code: {obis_code}")
-        
-        # Build URL with proper encoding
-        base_url = f"{LENEDA_API_BASE}/metering-points/{quote(metering_point)}/time-series"
+        logger.debug(f"📊 Final request details:")
+        logger.debug(f"📊   - Period: {start_date} to {end_date}")
+        logger.debug(f"📊   - Metering point: {metering_point}")
+        logger.debug(f"📊   - OBIS code: {obis_code}")
         
-        # Properly encode query parameters
-        params = {
-            'startDateTime': start_date,
-            'endDateTime': end_date,
-            'obisCode': obis_code
-        }
-        
-        url = f"{base_url}?{urlencode(params)}"
-        logger.info(f"📊 Encoded URL: {url}")
-        
-        headers = {
-            'X-API-KEY': api_key,
-            'X-ENERGY-ID': energy_id,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        
-        data = make_api_request(url, headers)
+        try:
+            time_range = fetch_time_series(api_key, energy_id, metering_point, obis_code, start_date, end_date)
+        except ValueError as e:
+            logger.error(f"❌ Invalid date range: {e}")
+            self.send_json({'error': f'Invalid date range: {e}'}, 400)
+            return
         
-        if data:
-            items_count = len(data.get('items', []))
+        if time_range:
+            start_ts, end_ts = time_range
+            cache = cache_marker(metering_point, obis_code, day_of(start_ts), day_of(end_ts))
+            etag = data_etag(['metering-data', start_ts, end_ts, response_format, max_points,
+                              *series_version(metering_point, obis_code, day_of(start_ts), day_of(end_ts), cache)],
+                             cache['final'])
+            if self.not_modified(etag, cache, immutable=True):
+                return
+            series = read_series(store, metering_point, obis_code, start_ts, end_ts)
+            items_count = series.count()
+            logger.debug(f"📦 Series of {len(series)} intervals held in {series.nbytes()} bytes")
             logger.info(f"✅ Successfully fetched {items_count} data points")
             if items_count == 0:
                 logger.warning(f"⚠️ No data points returned - this might be normal if:")
                 logger.warning(f"⚠️   - No consumption during this period")
                 logger.warning(f"⚠️   - Data not yet available (1-day delay)")
                 logger.warning(f"⚠️   - Weekend/holiday when meter doesn't report")
+            if response_format == 'columnar':
+                self.send_json_stream(columnar_fragments(series, {'cache': cache}),
+                                      content_type=COLUMNAR_CONTENT_TYPE, cache=cache, etag=etag, immutable=True)
+            elif response_format == 'binary':
+                self.send_binary_series(series, cache, etag, immutable=True)
+            elif max_points and items_count > max_points:
+                data = downsample_cache.get(
+                    ('time-series', metering_point, obis_code, start_ts, end_ts, max_points),
+                    lambda: downsample_time_series(series, max_points),
+                    cache['final']
+                )
+                logger.info(f"📉 Downsampled {items_count} points to {len(data['items'])}")
+                self.send_json({**data, 'cache': cache}, cache=cache, etag=etag, immutable=True)
             else:
-                logger.info(f"📊 Data sample: {json.dumps(data.get('items', [])[:2], indent=2)}")
-            self.send_json(data)
+                self.send_json_stream(time_series_fragments(series, {'cache': cache}), cache=cache,
+                                      etag=etag, immutable=True)
         else:
             logger.error("❌ Failed to fetch data from Leneda API")
             logger.error("❌ Dashboard will show 'Failed to fetch data from Leneda API'")
@@ -435,11 +1278,11 @@ class LenedaHandler(BaseHTTPRequestHandler):
     
     def handle_aggregated_data(self):
         """Handle aggregated data request"""
-        config = load_config()
-        api_key = config.get('api_key', '')
-        energy_id = config.get('energy_id', '')
+        config = config_loader.get()
+        api_key = config.api_key
+        energy_id = config.energy_id
         
-        logger.info(f"Handling aggregated data request. API key present: {bool(api_key)}")
+        logger.debug(f"Handling aggregated data request. API key present: {bool(api_key)}")
         
         if not api_key or not energy_id:
             logger.error("API credentials not configured")
@@ -453,6 +1296,11 @@ class LenedaHandler(BaseHTTPRequestHandler):
         start_date = query.get('start_date', [None])[0]
         end_date = query.get('end_date', [None])[0]
         aggregation_level = query.get('aggregation_level', ['Day'])[0]
+        try:
+            max_points = parse_max_points(query.get('max_points', [None])[0])
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
         
         if not metering_point:
             logger.error("Missing metering_point parameter")
@@ -467,47 +1315,50 @@ class LenedaHandler(BaseHTTPRequestHandler):
             start_date = start_dt.strftime('%Y-%m-%d')
             end_date = end_dt.strftime('%Y-%m-%d')
         
-        logger.info(f"Requesting aggregated data for period: {start_date} to {end_date}")
-        logger.info(f"Metering point: {metering_point}, OBIS: {obis_code}, Level: {aggregation_level}")
-        
-        # Build URL with proper encoding
-        base_url = f"{LENEDA_API_BASE}/metering-points/{quote(metering_point)}/time-series/aggregated"
-        
-        params = {
-            'startDate': start_date,
-            'endDate': end_date,
-            'obisCode': obis_code,
-            'aggregationLevel': aggregation_level,
-            'transformationMode': 'Accumulation'
-        }
+        logger.debug(f"Requesting aggregated data for period: {start_date} to {end_date}")
+        logger.debug(f"Metering point: {metering_point}, OBIS: {obis_code}, Level: {aggregation_level}")
         
-        url = f"{base_url}?{urlencode(params)}"
-        
-        headers = {
-            'X-API-KEY': api_key,
-            'X-ENERGY-ID': energy_id,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        
-        data = make_api_request(url, headers)
+        try:
+            data = fetch_aggregated(api_key, energy_id, metering_point, obis_code,
+                                    start_date, end_date, aggregation_level)
+        except ValueError as e:
+            logger.error(f"Invalid aggregated data request: {e}")
+            self.send_json({'error': f'Invalid request: {e}'}, 400)
+            return
         
         if data:
             items_count = len(data.get('aggregatedTimeSeries', []))
             logger.info(f"Successfully fetched {items_count} aggregated data points")
-            self.send_json(data)
+            first_day, last_day = date_range_days(start_date, end_date)
+            cache = cache_marker(metering_point, obis_code, first_day, last_day)
+            if max_points and items_count > max_points:
+                data = downsample_cache.get(
+                    ('aggregated', metering_point, obis_code, start_date, end_date, aggregation_level, max_points),
+                    lambda: {
+                        **data,
+                        'aggregatedTimeSeries': downsample_items(data['aggregatedTimeSeries'], max_points),
+                        'downsampled': {'originalCount': items_count, 'maxPoints': max_points}
+                    },
+                    cache['final']
+                )
+            etag = data_etag(['aggregated-data', aggregation_level, max_points,
+                              *series_version(metering_point, obis_code, first_day, last_day, cache)],
+                             cache['final'])
+            if self.not_modified(etag, cache, immutable=True):
+                return
+            self.send_json_stream(json_fragments({**data, 'cache': cache}), cache=cache, etag=etag, immutable=True)
         else:
             logger.error("Failed to fetch aggregated data from Leneda API")
             self.send_json({'error': 'Failed to fetch aggregated data. Check logs for details.'}, 500)
     
     def handle_calculate_invoice(self):
         """Handle invoice calculation"""
-        config = load_config()
-        billing = config.get('billing', {})
-        api_key = config.get('api_key', '')
-        energy_id = config.get('energy_id', '')
+        config = config_loader.get()
+        billing = config.billing
+        api_key = config.api_key
+        energy_id = config.energy_id
         
-        logger.info(f"Handling invoice calculation. API key present: {bool(api_key)}")
+        logger.debug(f"Handling invoice calculation. API key present: {bool(api_key)}")
         
         # Parse query parameters
         query = parse_qs(urlparse(self.path).query)
@@ -522,100 +1373,265 @@ class LenedaHandler(BaseHTTPRequestHandler):
             }, 400)
             return
         
-        logger.info(f"Calculating invoice for period: {start_date} to {end_date}")
+        logger.debug(f"Calculating invoice for period: {start_date} to {end_date}")
         
-        # Fetch consumption data with proper URL encoding
-        base_url = f"{LENEDA_API_BASE}/metering-points/{quote(metering_point)}/time-series/aggregated"
+        try:
+            first_day, last_day = date_range_days(start_date, end_date)
+        except ValueError as e:
+            logger.error(f"Invalid date range: {e}")
+            self.send_json({'error': f'Invalid date range: {e}'}, 400)
+            return
         
-        params = {
-            'startDate': start_date,
-            'endDate': end_date,
-            'obisCode': '1-1:1.29.0',
-            'aggregationLevel': 'Infinite',
-            'transformationMode': 'Accumulation'
-        }
+        if not ensure_time_series(api_key, energy_id, metering_point, CONSUMPTION_OBIS, first_day, last_day,
+                                  prefetch_first_day(first_day, last_day)):
+            logger.error("Failed to fetch consumption data for invoice")
+            self.send_json({'error': 'Failed to fetch consumption data'}, 500)
+            return
         
-        url = f"{base_url}?{urlencode(params)}"
+        cache = cache_marker(metering_point, CONSUMPTION_OBIS, first_day, last_day)
+        tariff = active_tariff(config)
+        # Invoices also depend on the billing options, so they are always revalidated
+        etag = data_etag(['invoice', start_date, end_date, asdict(billing), tariff_versions([tariff] if tariff else []),
+                          *series_version(metering_point, CONSUMPTION_OBIS, first_day, last_day, cache)],
+                         cache['final'])
+        if self.not_modified(etag, cache):
+            return
         
-        headers = {
-            'X-API-KEY': api_key,
-            'X-ENERGY-ID': energy_id,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
+        invoice = {
+            'period': {
+                'start': start_date,
+                'end': end_date
+            },
+            **billing_engine.invoice(metering_point, CONSUMPTION_OBIS, first_day, last_day, billing, tariff),
+            'cache': cache
         }
+        logger.info(f"Invoice: {invoice['consumption_kwh']} kWh, {invoice['exceedance_kwh']} kWh above "
+                    f"{billing.reference_power_kw} kW reference, total {invoice['total']} {billing.currency}")
         
-        data = make_api_request(url, headers)
+        self.send_json(invoice, cache=cache, etag=etag)
+
+    
+    def handle_tariff_comparison(self):
+        """Price one consumption history against several tariffs (GET: configured, POST: candidates)"""
+        config = config_loader.get()
+        billing = config.billing
         
-        if not data:
-            logger.error("Failed to fetch consumption data for invoice")
-            self.send_json({'error': 'Failed to fetch consumption data'}, 500)
+        if self.command == 'POST':
+            params = self.read_json_body()
+            if not isinstance(params, dict):
+                self.send_json({'error': 'Expected a JSON object body'}, 400)
+                return
+        else:
+            params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        
+        try:
+            mp, first_day, last_day, start_date, end_date = parse_meter_range(config, params)
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        metering_point = mp.code
+        obis_code = params.get('obis_code') or CONSUMPTION_OBIS
+        if not isinstance(obis_code, str):
+            self.send_json({'error': 'obis_code must be a string'}, 400)
             return
         
-        # Extract total consumption
-        total_kwh = 0
-        if data.get('aggregatedTimeSeries'):
-            total_kwh = data['aggregatedTimeSeries'][0].get('value', 0)
+        problems = []
+        if 'tariffs' in params:
+            candidates = parse_tariffs(params['tariffs'], problems)
+            for tariff in candidates:
+                if tariff.type == 'dynamic' and not prices_file_allowed(tariff.prices_file, config.tariffs):
+                    problems.append(f"tariff '{tariff.name}': prices_file must be a configured price file "
+                                    f"or a file under {PRICES_DIR}")
+        else:
+            candidates = config.tariffs
+        if problems:
+            self.send_json({'error': 'Invalid tariffs', 'problems': problems}, 400)
+            return
         
-        # Calculate invoice components
-        energy_fixed = billing.get('energy_fixed_fee_monthly', 1.50)
-        energy_variable = total_kwh * billing.get('energy_variable_rate_per_kwh', 0.1500)
-        network_metering = billing.get('network_metering_fee_monthly', 5.90)
-        network_power_ref = billing.get('network_power_reference_fee_monthly', 19.27)
-        network_variable = total_kwh * billing.get('network_variable_rate_per_kwh', 0.0759)
-        exceedance = 0  # TODO: Calculate based on reference power
-        compensation = total_kwh * billing.get('compensation_fund_rate_per_kwh', -0.0376)
-        electricity_tax = total_kwh * billing.get('electricity_tax_per_kwh', 0.0010)
+        if not ensure_time_series(config.api_key, config.energy_id, metering_point, obis_code,
+                                  first_day, last_day, prefetch_first_day(first_day, last_day)):
+            self.send_json({'error': 'Failed to fetch consumption data'}, 500)
+            return
         
-        subtotal = (energy_fixed + energy_variable + network_metering + 
-                   network_power_ref + network_variable + exceedance + 
-                   compensation + electricity_tax)
+        # The configured flat rate is always included as the baseline
+        baseline = TariffConfig(name='Current flat rate', rate_per_kwh=billing.energy_variable_rate_per_kwh)
+        tariffs = [baseline, *candidates]
         
-        vat_rate = billing.get('vat_rate', 0.08)
-        vat_amount = subtotal * vat_rate
-        total = subtotal + vat_amount
+        cache = cache_marker(metering_point, obis_code, first_day, last_day)
+        etag = None
+        if self.command == 'GET':
+            etag = data_etag(['tariff-comparison', start_date, end_date, billing.currency, tariff_versions(tariffs),
+                              *series_version(metering_point, obis_code, first_day, last_day, cache)],
+                             cache['final'])
+            if self.not_modified(etag, cache):
+                return
+        results = tariff_engine.costs(metering_point, obis_code, first_day, last_day, tariffs,
+                                      billing.energy_variable_rate_per_kwh)
+        baseline_cost = results[0]['cost']
+        energy_kwh = results[0]['energy_kwh']
         
-        invoice = {
+        comparison = sorted((
+            {
+                'name': tariff.name,
+                'type': tariff.type,
+                'energy_cost': round(result['cost'], 2),
+                'average_price_per_kwh': round(result['cost'] / energy_kwh, 4) if energy_kwh else None,
+                'difference': round(result['cost'] - baseline_cost, 2),
+                'unpriced_intervals': result['unpriced_intervals'],
+            }
+            for tariff, result in zip(tariffs, results)
+        ), key=lambda entry: entry['energy_cost'])
+        
+        logger.info(f"💶 Compared {len(tariffs)} tariffs over {last_day - first_day + 1} days "
+                    f"({energy_kwh:.1f} kWh), cheapest: {comparison[0]['name']}")
+        self.send_json({
+            'metering_point': metering_point,
+            'obis_code': obis_code,
             'period': {
                 'start': start_date,
                 'end': end_date
             },
-            'consumption_kwh': round(total_kwh, 2),
-            'breakdown': {
-                'energy_fixed_fee': round(energy_fixed, 2),
-                'energy_variable': round(energy_variable, 2),
-                'network_metering_fee': round(network_metering, 2),
-                'network_power_reference': round(network_power_ref, 2),
-                'network_variable': round(network_variable, 2),
-                'exceedance': round(exceedance, 2),
-                'compensation_fund': round(compensation, 2),
-                'electricity_tax': round(electricity_tax, 2)
-            },
-            'subtotal': round(subtotal, 2),
-            'vat': {
-                'rate': vat_rate,
-                'amount': round(vat_amount, 2)
-            },
-            'total': round(total, 2),
-            'currency': billing.get('currency', 'EUR')
-        }
+            'consumption_kwh': round(energy_kwh, 2),
+            'currency': billing.currency,
+            'tariffs': comparison,
+            'cache': cache
+        }, cache=cache, etag=etag)
+    
+    def handle_export(self):
+        """Stream the stored readings of one or all meters as CSV or NDJSON, filling gaps month by month"""
+        config = config_loader.get()
+        
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        try:
+            mp, first_day, last_day, _, _ = parse_meter_range(config, params, meter_required=False)
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        export_format = params.get('format') or 'csv'
+        if export_format not in EXPORT_FORMATS:
+            self.send_json({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}, 400)
+            return
+        
+        meters = [mp.code] if mp else [meter.code for meter in config.metering_points]
+        if params.get('obis_code'):
+            series = [(code, obis_code) for code in meters for obis_code in params['obis_code'].split(',')]
+        else:
+            series = [pair for pair in configured_series(config) if pair[0] in meters]
+        
+        # Days from today on have no complete data yet
+        last_day = min(last_day, day_of(int(time.time())) - 1)
+        if first_day > last_day:
+            self.send_json({'error': 'Invalid date range: no complete day to export'}, 400)
+            return
+        if last_day - first_day + 1 > MAX_EXPORT_DAYS:
+            self.send_json({'error': f'An export can cover at most {MAX_EXPORT_DAYS} days'}, 400)
+            return
+        
+        windows = export_windows(series, first_day, last_day)
+        loaded = prefetched(lambda *window: load_export_window(config, *window), windows, dashboard_pool)
+        # The first window decides between an error response and a stream
+        try:
+            first = next(loaded, None)
+        except ExportError as e:
+            self.send_json({'error': f'Failed to fetch data from Leneda API: {e}'}, 500)
+            return
+        fragments = (csv_fragments if export_format == 'csv' else ndjson_fragments)(
+            chain([first] if first else [], loaded)
+        )
+        blocks = chunks(fragments)
+        compress = 'gzip' in accepted_encodings(self.headers.get('Accept-Encoding'))
+        if compress:
+            blocks = gzip_blocks(blocks)
+        
+        started = time.perf_counter()
+        filename = f"leneda_{format_timestamp(first_day * DAY_SECONDS)[:10]}_{format_timestamp(last_day * DAY_SECONDS)[:10]}"
+        self.send_response(200)
+        self.send_header('Content-Type', EXPORT_FORMATS[export_format])
+        self.send_header('Content-Disposition', f'attachment; filename="{filename}.{export_format}"')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Vary', 'Accept-Encoding')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        total, _ = self.write_chunked(blocks)
+        if total is not None:
+            logger.info(f"📤 Exported {len(series)} series over {last_day - first_day + 1} days as {export_format} "
+                        f"({total} bytes{', gzip' if compress else ''}) in {time.perf_counter() - started:.1f}s")
+    
+    def handle_analytics(self):
+        """Self-consumption, autarky and energy-sharing figures of one meter"""
+        config = config_loader.get()
         
-        self.send_json(invoice)
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        try:
+            mp, first_day, last_day, _, _ = parse_meter_range(config, params)
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        meters = {meter.code: meter for meter in config.metering_points}
+        producer = None
+        if params.get('production_point'):
+            producer = meters.get(params['production_point'])
+            if producer is None or producer.type not in ('production', 'both'):
+                self.send_json({'error': 'production_point must be a configured production meter'}, 400)
+                return
+        
+        resolution = params.get('resolution') or 'Day'
+        try:
+            check_resolution(resolution, first_day, last_day)
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        
+        sources = flow_sources(mp, producer)
+        series = sources.series()
+        futures = [
+            dashboard_pool.submit(ensure_time_series, config.api_key, config.energy_id, metering_point,
+                                  obis_code, first_day, last_day, prefetch_first_day(first_day, last_day))
+            for metering_point, obis_code in series
+        ]
+        if not all(future.result() for future in futures):
+            self.send_json({'error': 'Failed to fetch data from Leneda API. Check logs for details.'}, 500)
+            return
+        
+        markers = [cache_marker(metering_point, obis_code, first_day, last_day)
+                   for metering_point, obis_code in series]
+        etag = data_etag(['analytics', resolution, [
+            series_version(metering_point, obis_code, first_day, last_day, cache)
+            for (metering_point, obis_code), cache in zip(series, markers)
+        ]], all(cache['final'] for cache in markers))
+        if self.not_modified(etag, markers[0]):
+            return
+        
+        analysis = analytics_engine.analyze(sources, first_day, last_day, resolution)
+        analysis['cache'] = markers[0]
+        self.send_json(analysis, cache=analysis['cache'], etag=etag)
 
 
 def main():
     """Start the HTTP server"""
-    server_address = ('', 8099)
-    httpd = HTTPServer(server_address, LenedaHandler)
+    global store, aggregator, tariff_engine, billing_engine, analytics_engine, static_assets
+    global prefetcher, backfiller, refresher
+    
+    server_address = ('', SERVER_PORT)
+    httpd = PooledHTTPServer(server_address, LenedaHandler)
+    store = TimeSeriesStore()
+    aggregator = AggregationEngine(store)
+    tariff_engine = TariffEngine(aggregator)
+    billing_engine = BillingEngine(aggregator, tariff_engine)
+    analytics_engine = AnalyticsEngine(aggregator)
+    static_assets = StaticAssets(STATIC_DIR)
     
     logger.info("=" * 60)
     logger.info("  Leneda Energy Dashboard - Starting Server")
     logger.info("=" * 60)
     logger.info("Version: 1.1.1")
     logger.info("License: GPL-3.0")
-    logger.info(f"Server listening on: http://0.0.0.0:8099")
+    logger.info(f"Server listening on: http://0.0.0.0:{SERVER_PORT}")
+    logger.info(f"Worker threads: {MAX_WORKERS}, concurrent upstream calls: {MAX_UPSTREAM_CALLS}")
     logger.info(f"Static files: {STATIC_DIR}")
     logger.info(f"Config file: {CONFIG_FILE}")
     logger.info(f"Leneda API base: {LENEDA_API_BASE}")
+    logger.info(f"Local store: {store.path}")
     logger.info("=" * 60)
     logger.info("🔧 TROUBLESHOOTING TIPS:")
     logger.info("🔧 - Check logs for '✅ Config loaded successfully'")
@@ -628,12 +1644,26 @@ def main():
     
     # Load and log initial configuration
     logger.info("🔧 Loading initial configuration for validation...")
-    config = load_config()
+    config = config_loader.get()
+    configure_logging(config.log_level, config.log_format)
+    configure_api_client(config)
+    
+    prefetcher = PrefetchScheduler(config_loader.get, warm_metering_points)
+    prefetcher.start()
+    backfiller = BackfillJob(config_loader.get, configured_series, backfill_window)
+    backfiller.start()
+    refresher = PeriodicRefresh(EVENTS_REFRESH_SECONDS, lambda: event_bus.stream_count() > 0,
+                                lambda: refresh_open_days(config_loader.get()))
+    refresher.start()
     
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         logger.info("Server shutting down...")
+        prefetcher.stop()
+        backfiller.stop()
+        refresher.stop()
+        event_bus.close()
         httpd.shutdown()
 
 
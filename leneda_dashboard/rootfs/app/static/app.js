@@ -45,6 +45,9 @@ function getApiBaseUrl() {
 const API_BASE_URL = getApiBaseUrl();
 console.log('🔧 Final API base URL:', API_BASE_URL);
 
+// Upper bound on points per chart series; the server downsamples longer series (LTTB)
+const MAX_CHART_POINTS = 500;
+
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
     console.log('🚀 === APPLICATION INITIALIZATION START ===');
@@ -411,10 +414,7 @@ async function refreshData() {
     showStatus('Refreshing data...', 'success');
     
     try {
-        await Promise.all([
-            updateDashboardStats(),
-            updateLiveChart()
-        ]);
+        await updateDashboard();
         
         updateDataStatus('✅ Data loaded', 'connected');
         showStatus('Data refreshed successfully', 'success');
@@ -427,8 +427,8 @@ async function refreshData() {
     }
 }
 
-// Update Dashboard Statistics
-async function updateDashboardStats() {
+// Update Dashboard (all panels from one batched /api/dashboard request)
+async function updateDashboard() {
     if (!config.metering_points || config.metering_points.length === 0) {
         showStatus('No metering points configured', 'warning');
         return;
@@ -436,72 +436,47 @@ async function updateDashboardStats() {
     
     const meteringPoint = config.metering_points[0].code;
     
-    try {
-        // IMPORTANT: Leneda data is only available for PREVIOUS days (not today)
-        // Get yesterday's date range
-        const yesterday = new Date();
-        yesterday.setDate(yesterday.getDate() - 1);
-        const yesterdayStart = new Date(yesterday.getFullYear(), yesterday.getMonth(), yesterday.getDate());
-        const yesterdayEnd = new Date(yesterday.getFullYear(), yesterday.getMonth(), yesterday.getDate(), 23, 59, 59);
-        
-        // Get yesterday's consumption
-        const response = await fetch(`${API_BASE_URL}/api/aggregated-data?metering_point=${meteringPoint}&obis_code=1-1:1.29.0&start_date=${formatDate(yesterdayStart)}&end_date=${formatDate(yesterdayEnd)}&aggregation_level=Infinite`);
-        
-        if (response.ok) {
-            const data = await response.json();
-            console.log('🔧 Yesterday consumption response:', data);
-            const yesterdayUsage = data.aggregatedTimeSeries?.[0]?.value || 0;
-            console.log('🔧 Yesterday usage value:', yesterdayUsage);
-            document.getElementById('todayUsage').textContent = `${yesterdayUsage.toFixed(2)} kWh`;
-        }
-        
-        // Get last 7 days data
-        const weekAgo = new Date(yesterdayStart);
-        weekAgo.setDate(weekAgo.getDate() - 7);
-        const weekResponse = await fetch(`${API_BASE_URL}/api/aggregated-data?metering_point=${meteringPoint}&obis_code=1-1:1.29.0&start_date=${formatDate(weekAgo)}&end_date=${formatDate(yesterdayEnd)}&aggregation_level=Infinite`);
-        
-        if (weekResponse.ok) {
-            const weekData = await weekResponse.json();
-            console.log('🔧 Week consumption response:', weekData);
-            const weekUsage = weekData.aggregatedTimeSeries?.[0]?.value || 0;
-            console.log('🔧 Week usage value:', weekUsage);
-            document.getElementById('weekConsumption').textContent = `${weekUsage.toFixed(2)} kWh`;
-        }
-        
-        // Get last 30 days data
-        const monthAgo = new Date(yesterdayStart);
-        monthAgo.setDate(monthAgo.getDate() - 30);
-        const monthResponse = await fetch(`${API_BASE_URL}/api/aggregated-data?metering_point=${meteringPoint}&obis_code=1-1:1.29.0&start_date=${formatDate(monthAgo)}&end_date=${formatDate(yesterdayEnd)}&aggregation_level=Infinite`);
-        
-        if (monthResponse.ok) {
-            const monthData = await monthResponse.json();
-            console.log('🔧 Month consumption response:', monthData);
-            const monthUsage = monthData.aggregatedTimeSeries?.[0]?.value || 0;
-            console.log('🔧 Month usage value:', monthUsage);
-            document.getElementById('monthConsumption').textContent = `${monthUsage.toFixed(2)} kWh`;
-            
-            // Estimate cost
-            const billing = config.billing || {};
-            const estimatedCost = monthUsage * (billing.energy_variable_rate_per_kwh || 0.15);
-            document.getElementById('monthCost').textContent = `€${estimatedCost.toFixed(2)}`;
-        }
-        
-        // Try to get production data if available (solar)
-        const productionResponse = await fetch(`${API_BASE_URL}/api/aggregated-data?metering_point=${meteringPoint}&obis_code=1-1:2.29.0&start_date=${formatDate(yesterdayStart)}&end_date=${formatDate(yesterdayEnd)}&aggregation_level=Infinite`);
-        
-        if (productionResponse.ok) {
-            const prodData = await productionResponse.json();
-            const yesterdayProduction = prodData.aggregatedTimeSeries?.[0]?.value || 0;
-            document.getElementById('solarProduction').textContent = `${yesterdayProduction.toFixed(2)} kWh`;
-        } else {
-            // No solar production available
-            document.getElementById('solarProduction').textContent = 'N/A';
-        }
-        
-    } catch (error) {
-        console.error('Error updating dashboard stats:', error);
-        showStatus('Error fetching data. Check configuration.', 'error');
+    // The server picks yesterday's ranges itself (Leneda data is 1 day delayed)
+    const response = await fetch(`${API_BASE_URL}/api/dashboard`);
+    if (!response.ok) {
+        throw new Error(`Dashboard request failed with status ${response.status}`);
     }
+    
+    const payload = await response.json();
+    const results = payload.results || {};
+    console.log('🔧 Dashboard batch results:', Object.keys(results));
+    
+    updateDashboardStats(results, meteringPoint);
+    updateLiveChart(results[`${meteringPoint}/1-1:1.29.0/intervals`]);
+}
+
+// Total of an Infinite aggregation result (undefined if missing or failed)
+function seriesTotal(result) {
+    return result?.aggregatedTimeSeries?.[0]?.value;
+}
+
+// Update Dashboard Statistics
+function updateDashboardStats(results, meteringPoint) {
+    const consumption = (panel) => seriesTotal(results[`${meteringPoint}/1-1:1.29.0/${panel}`]) || 0;
+    
+    const yesterdayUsage = consumption('yesterday');
+    document.getElementById('todayUsage').textContent = `${yesterdayUsage.toFixed(2)} kWh`;
+    
+    const weekUsage = consumption('week');
+    document.getElementById('weekConsumption').textContent = `${weekUsage.toFixed(2)} kWh`;
+    
+    const monthUsage = consumption('month');
+    document.getElementById('monthConsumption').textContent = `${monthUsage.toFixed(2)} kWh`;
+    
+    // Estimate cost
+    const billing = config.billing || {};
+    const estimatedCost = monthUsage * (billing.energy_variable_rate_per_kwh || 0.15);
+    document.getElementById('monthCost').textContent = `€${estimatedCost.toFixed(2)}`;
+    
+    // Production is only queried for production/both meters (solar)
+    const yesterdayProduction = seriesTotal(results[`${meteringPoint}/1-1:2.29.0/yesterday`]);
+    document.getElementById('solarProduction').textContent =
+        yesterdayProduction === undefined ? 'N/A' : `${yesterdayProduction.toFixed(2)} kWh`;
 }
 
 // Initialize Charts
@@ -645,53 +620,33 @@ function initializeCharts() {
 
 // Update Yesterday's Chart (Shows yesterday's 15-minute intervals)
 // Note: Leneda does NOT provide live/real-time data - only historical data
-async function updateLiveChart() {
-    if (!config.metering_points || config.metering_points.length === 0) {
+function updateLiveChart(data) {
+    if (!data || data.error) {
+        console.error('Failed to fetch metering data', data?.error);
+        showStatus('No data available. Check configuration.', 'error');
         return;
     }
     
-    const meteringPoint = config.metering_points[0].code;
+    // Columnar series: first timestamp, fixed step (seconds) and flat values (null = missing)
+    const values = data.values || [];
+    if (values.length === 0) {
+        showStatus('No data available for yesterday. Data appears 1 day later.', 'warning');
+        return;
+    }
     
-    // IMPORTANT: Leneda only provides data from PREVIOUS days
-    // Fetch yesterday's 15-minute interval data
-    const yesterday = new Date();
-    yesterday.setDate(yesterday.getDate() - 1);
-    const yesterdayStart = new Date(yesterday.getFullYear(), yesterday.getMonth(), yesterday.getDate(), 0, 0, 0);
-    const yesterdayEnd = new Date(yesterday.getFullYear(), yesterday.getMonth(), yesterday.getDate(), 23, 59, 59);
+    const start = new Date(data.start).getTime();
+    const labels = values.map((value, index) => new Date(start + index * data.step * 1000));
     
-    try {
-        const response = await fetch(`${API_BASE_URL}/api/metering-data?metering_point=${meteringPoint}&obis_code=1-1:1.29.0&start_date=${yesterdayStart.toISOString()}&end_date=${yesterdayEnd.toISOString()}`);
-        
-        if (response.ok) {
-            const data = await response.json();
-            const items = data.items || [];
-            
-            if (items.length === 0) {
-                showStatus('No data available for yesterday. Data appears 1 day later.', 'warning');
-                return;
-            }
-            
-            const labels = items.map(item => new Date(item.startedAt));
-            const values = items.map(item => item.value);
-            
-            charts.live.data.labels = labels;
-            charts.live.data.datasets[0].data = values;
-            charts.live.data.datasets[0].label = `Yesterday's Power (kW) - 15-min intervals`;
-            charts.live.update();
-            
-            // Update peak consumption from yesterday
-            if (values.length > 0) {
-                const peakValue = Math.max(...values);
-                const avgValue = values.reduce((a, b) => a + b, 0) / values.length;
-                document.getElementById('currentConsumption').textContent = `${peakValue.toFixed(2)} kW`;
-            }
-        } else {
-            console.error('Failed to fetch metering data');
-            showStatus('No data available. Check configuration.', 'error');
-        }
-    } catch (error) {
-        console.error('Error updating yesterday\'s chart:', error);
-        showStatus('Error fetching data from Leneda API', 'error');
+    charts.live.data.labels = labels;
+    charts.live.data.datasets[0].data = values;
+    charts.live.data.datasets[0].label = `Yesterday's Power (kW) - 15-min intervals`;
+    charts.live.update();
+    
+    // Update peak consumption from yesterday
+    const present = values.filter(value => value !== null);
+    if (present.length > 0) {
+        const peakValue = Math.max(...present);
+        document.getElementById('currentConsumption').textContent = `${peakValue.toFixed(2)} kW`;
     }
 }
 
@@ -743,7 +698,7 @@ async function updateChartData(period) {
     
     try {
         // Get consumption data
-        const consumptionResponse = await fetch(`${API_BASE_URL}/api/aggregated-data?metering_point=${meteringPoint}&obis_code=1-1:1.29.0&start_date=${formatDate(startDate)}&end_date=${formatDate(endDate)}&aggregation_level=${aggregationLevel}`);
+        const consumptionResponse = await fetch(`${API_BASE_URL}/api/aggregated-data?metering_point=${meteringPoint}&obis_code=1-1:1.29.0&start_date=${formatDate(startDate)}&end_date=${formatDate(endDate)}&aggregation_level=${aggregationLevel}&max_points=${MAX_CHART_POINTS}`);
         
         let consumptionItems = [];
         if (consumptionResponse.ok) {
@@ -752,7 +707,7 @@ async function updateChartData(period) {
         }
         
         // Try to get production data
-        const productionResponse = await fetch(`${API_BASE_URL}/api/aggregated-data?metering_point=${meteringPoint}&obis_code=1-1:2.29.0&start_date=${formatDate(startDate)}&end_date=${formatDate(endDate)}&aggregation_level=${aggregationLevel}`);
+        const productionResponse = await fetch(`${API_BASE_URL}/api/aggregated-data?metering_point=${meteringPoint}&obis_code=1-1:2.29.0&start_date=${formatDate(startDate)}&end_date=${formatDate(endDate)}&aggregation_level=${aggregationLevel}&max_points=${MAX_CHART_POINTS}`);
         
         let productionItems = [];
         if (productionResponse.ok) {
@@ -840,6 +795,10 @@ function displayInvoice(invoice) {
                 <span>Network Variable</span>
                 <span>€${invoice.breakdown.network_variable}</span>
             </div>
+            <div class="stat-row">
+                <span>Exceedance (${invoice.exceedance_kwh} kWh above ${invoice.reference_power_kw} kW)</span>
+                <span>€${invoice.breakdown.exceedance}</span>
+            </div>
             <div class="stat-row">
                 <span>Compensation Fund</span>
                 <span style="color: var(--success);">€${invoice.breakdown.compensation_fund}</span>
@@ -905,17 +864,69 @@ function hideStatus() {
 }
 
 // Auto Refresh
+// The server pushes a notification on /api/events when new readings land;
+// interval polling is only used while no event stream is available.
+let pollTimer = null;
+let pushRefreshTimer = null;
+
 function startAutoRefresh() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    
+    const events = new EventSource(`${API_BASE_URL}/api/events`);
+    events.onopen = () => {
+        console.log('📣 Event stream connected, polling stopped');
+        stopPolling();
+    };
+    events.onerror = () => {
+        // EventSource reconnects by itself unless the server refused the stream
+        if (events.readyState === EventSource.CLOSED) {
+            console.warn('📣 Event stream unavailable, falling back to polling');
+            startPolling();
+        }
+    };
+    events.addEventListener('data', (event) => {
+        const change = JSON.parse(event.data);
+        const shown = (config.metering_points || []).some(mp => mp.code === change.meteringPoint);
+        if (shown) {
+            console.log(`📣 New data for ${change.meteringPoint} ${change.obisCode} ${change.firstDay}..${change.lastDay}`);
+            schedulePushRefresh();
+        }
+    });
+}
+
+// Several series usually land together; refresh once for all of them
+function schedulePushRefresh() {
+    clearTimeout(pushRefreshTimer);
+    pushRefreshTimer = setTimeout(() => {
+        if (config.has_api_key && config.has_energy_id) {
+            updateDashboard()
+                .then(() => updateLastUpdated())
+                .catch(error => console.error('❌ Push refresh failed:', error));
+        }
+    }, 2000);
+}
+
+function startPolling() {
+    if (pollTimer) {
+        return;
+    }
     const interval = (config.display?.update_interval_seconds || 300) * 1000;
     
-    setInterval(() => {
+    pollTimer = setInterval(() => {
         if (config.has_api_key && config.has_energy_id) {
-            updateDashboardStats();
-            updateLiveChart();
+            updateDashboard().catch(error => console.error('❌ Auto-refresh failed:', error));
         }
     }, interval);
 }
 
+function stopPolling() {
+    clearInterval(pollTimer);
+    pollTimer = null;
+}
+
 // Utility Functions
 function formatDate(date) {
     return date.toISOString().split('T')[0];
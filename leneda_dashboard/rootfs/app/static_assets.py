@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - In-memory static asset cache (Pure Python stdlib)
+License: GPL-3.0
+
+Loads the frontend files once at startup, pre-compresses them and derives
+strong ETags from their content. app.js and styles.css are also published
+under fingerprinted names (app.<hash>.js) that index.html references, so
+browsers can cache them forever and only revalidate the small index.html.
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+try:
+    import brotli  # Optional, not part of the stdlib image
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Fingerprinted assets never change under the same name
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Everything else is cached but revalidated with If-None-Match on each use
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+FINGERPRINTED = ('.js', '.css')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 256
+
+_REFERENCE_RE = re.compile(r'(src|href)="([^"?#:]+)(?:\?[^"]*)?"')
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings an Accept-Encoding header allows (q > 0), lowercased"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header matches etag (weak comparison, as RFC 9110 asks)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag.removeprefix('W/') in tags
+
+
+class Asset:
+    """One static file held in memory together with its encoded variants"""
+
+    __slots__ = ('name', 'content_type', 'etag', 'cache_control', 'variants')
+
+    def __init__(self, name, content, cache_control):
+        self.name = name
+        mime_type, _ = mimetypes.guess_type(name)
+        mime_type = mime_type or 'application/octet-stream'
+        if mime_type.startswith('text/') or mime_type in ('application/javascript', 'image/svg+xml'):
+            mime_type += '; charset=utf-8'
+        self.content_type = mime_type
+        self.etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+        self.cache_control = cache_control
+        self.variants = {'identity': content}
+
+        if len(content) >= MIN_COMPRESS_SIZE and mime_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content)
+                if len(compressed) < len(content):
+                    self.variants['br'] = compressed
+
+    def negotiate(self, accept_encoding):
+        """Pick the smallest variant the client accepts; return (encoding, body)"""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header matches this asset's ETag"""
+        return etag_matches(if_none_match, self.etag)
+
+
+class StaticAssets:
+    """All files of the static directory, keyed by URL path"""
+
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self.assets = {}
+        self.fingerprints = {}
+        self.load()
+
+    def load(self):
+        """Read, fingerprint and pre-compress every file under static_dir"""
+        raw = {}
+        for root, _dirs, files in os.walk(self.static_dir):
+            for filename in files:
+                full_path = os.path.join(root, filename)
+                name = os.path.relpath(full_path, self.static_dir).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    raw[name] = f.read()
+
+        assets = {}
+        fingerprints = {}
+        for name, content in raw.items():
+            if name.endswith(FINGERPRINTED):
+                stem, ext = os.path.splitext(name)
+                digest = hashlib.sha256(content).hexdigest()[:12]
+                fingerprinted = f"{stem}.{digest}{ext}"
+                fingerprints[name] = fingerprinted
+                assets['/' + fingerprinted] = Asset(fingerprinted, content, IMMUTABLE_CACHE_CONTROL)
+
+        for name, content in raw.items():
+            if name.endswith('.html'):
+                content = self._rewrite_references(content, fingerprints)
+            assets['/' + name] = Asset(name, content, REVALIDATE_CACHE_CONTROL)
+
+        if '/index.html' in assets:
+            assets['/'] = assets['/index.html']
+
+        self.assets = assets
+        self.fingerprints = fingerprints
+        total = sum(len(asset.variants['identity']) for asset in assets.values())
+        logger.info(f"🗂️ Cached {len(raw)} static files ({total} bytes), "
+                    f"fingerprinted: {', '.join(fingerprints.values()) or 'none'}")
+
+    @staticmethod
+    def _rewrite_references(content, fingerprints):
+        """Point src/href attributes at the fingerprinted file names"""
+        def replace(match):
+            attribute, target = match.group(1), match.group(2)
+            if target in fingerprints:
+                return f'{attribute}="{fingerprints[target]}"'
+            return match.group(0)
+        return _REFERENCE_RE.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+    def get(self, path):
+        """Return the Asset for a URL path, or None"""
+        return self.assets.get(path)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Local time-series store (Pure Python stdlib)
+License: GPL-3.0
+
+Keeps every reading fetched from the Leneda API in a SQLite database under
+/data, keyed by metering point, OBIS code and timestamp. Leneda data is at
+least one day old and does not change once published, so closed days are
+fetched once and served locally afterwards.
+
+Coverage is tracked per UTC day: a copy is only final if it was fetched
+after its day passed the finalization horizon. Any other copy - of an open
+day, or one fetched before its day closed, possibly partial - is re-fetched
+after a short TTL, so every day is loaded once more after it finalizes.
+Until then a stale copy can still be served while it is being refreshed.
+
+Every store that changes a series' readings gets a new version number,
+recorded for each day it touched, so the version of a day range only moves
+when its data actually changed (used for HTTP ETags).
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+STORE_FILE = os.environ.get('LENEDA_STORE_FILE', '/data/leneda_cache.sqlite3')
+
+DAY_SECONDS = 86400
+
+# Days younger than this (counted from today, UTC) may still be corrected by
+# Leneda and are never treated as complete.
+FINALIZATION_DAYS = 2
+
+# Open (not yet finalized) days are re-fetched once their copy is this old
+OPEN_DAY_TTL_SECONDS = 900
+
+# Readings fetched per query when iterating a range, bounding memory per reader
+READ_PAGE_SIZE = 2048
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    metering_point TEXT NOT NULL,
+    obis_code TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    type TEXT,
+    version INTEGER,
+    calculated INTEGER,
+    PRIMARY KEY (metering_point, obis_code, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS series (
+    metering_point TEXT NOT NULL,
+    obis_code TEXT NOT NULL,
+    unit TEXT,
+    interval_length TEXT,
+    PRIMARY KEY (metering_point, obis_code)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS coverage (
+    metering_point TEXT NOT NULL,
+    obis_code TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    PRIMARY KEY (metering_point, obis_code, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS day_versions (
+    metering_point TEXT NOT NULL,
+    obis_code TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (metering_point, obis_code, day)
+) WITHOUT ROWID;
+
+-- Aggregated responses are computed locally from readings now
+DROP TABLE IF EXISTS aggregated_responses;
+"""
+
+
+def parse_timestamp(value):
+    """Parse a Leneda ISO timestamp (or YYYY-MM-DD date) into epoch seconds"""
+    if len(value) == 10:
+        value = f"{value}T00:00:00Z"
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def format_timestamp(ts):
+    """Format epoch seconds the way the Leneda API does"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def day_of(ts):
+    """Return the UTC day number (days since epoch) containing ts"""
+    return ts // DAY_SECONDS
+
+
+def first_open_day(now=None):
+    """Return the first day that is not yet finalized by Leneda"""
+    now = time.time() if now is None else now
+    return day_of(int(now)) - FINALIZATION_DAYS + 1
+
+
+# SQL condition for a coverage row holding a final copy: one fetched once
+# its day was older than the finalization horizon (see first_open_day)
+_FINAL_COPY = f'fetched_at >= (day + {FINALIZATION_DAYS}) * {DAY_SECONDS}'
+
+
+def day_runs(days):
+    """Group sorted day numbers into contiguous (first, last) runs"""
+    runs = []
+    for day in days:
+        if runs and runs[-1][1] == day - 1:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+class TimeSeriesStore:
+    """SQLite-backed store of Leneda readings, safe to share between threads"""
+
+    def __init__(self, path=STORE_FILE):
+        directory = os.path.dirname(path)
+        if path != ':memory:' and directory and not os.path.isdir(directory):
+            logger.warning(f"💾 Store directory {directory} missing, using in-memory store")
+            path = ':memory:'
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        logger.info(f"💾 Time-series store ready: {path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def missing_days(self, metering_point, obis_code, first_day, last_day, now=None, include_stale=True):
+        """Return the days in [first_day, last_day] that must be fetched upstream
+
+        With include_stale=False, copies that are not final and past their TTL
+        count as present; stale_days() lists them for a background refresh.
+        """
+        now = time.time() if now is None else now
+        # fetched_at > -1 holds for every stored copy, however old
+        fresh_after = int(now) - OPEN_DAY_TTL_SECONDS if include_stale else -1
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT day FROM coverage WHERE metering_point = ? AND obis_code = ? '
+                f'AND day BETWEEN ? AND ? AND ({_FINAL_COPY} OR fetched_at > ?)',
+                (metering_point, obis_code, first_day, last_day, fresh_after)
+            ).fetchall()
+        covered = {row[0] for row in rows}
+        return [day for day in range(first_day, last_day + 1) if day not in covered]
+
+    def stale_days(self, metering_point, obis_code, first_day, last_day, now=None):
+        """Return the days in [first_day, last_day] whose stored copy is not final and past its TTL"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT day FROM coverage WHERE metering_point = ? AND obis_code = ? '
+                f'AND day BETWEEN ? AND ? AND NOT {_FINAL_COPY} AND fetched_at <= ? ORDER BY day',
+                (metering_point, obis_code, first_day, last_day, int(now) - OPEN_DAY_TTL_SECONDS)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def coverage_state(self, metering_point, obis_code, first_day, last_day):
+        """Return (covered_days, oldest fetched_at among copies that are not final, or None)"""
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT COUNT(*), MIN(CASE WHEN NOT {_FINAL_COPY} THEN fetched_at END) FROM coverage '
+                'WHERE metering_point = ? AND obis_code = ? AND day BETWEEN ? AND ?',
+                (metering_point, obis_code, first_day, last_day)
+            ).fetchone()
+
+    def is_final(self, metering_point, obis_code, first_day, last_day):
+        """True if every day in [first_day, last_day] has a final copy, so its data can't change"""
+        if last_day < first_day:
+            return False
+        with self._lock:
+            final = self._conn.execute(
+                f'SELECT COUNT(*) FROM coverage WHERE metering_point = ? AND obis_code = ? '
+                f'AND day BETWEEN ? AND ? AND {_FINAL_COPY}',
+                (metering_point, obis_code, first_day, last_day)
+            ).fetchone()[0]
+        return final == last_day - first_day + 1
+
+    def range_version(self, metering_point, obis_code, first_day, last_day):
+        """Version of the last change to the readings of a day range (0 if never changed)"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COALESCE(MAX(version), 0) FROM day_versions '
+                'WHERE metering_point = ? AND obis_code = ? AND day BETWEEN ? AND ?',
+                (metering_point, obis_code, first_day, last_day)
+            ).fetchone()[0]
+
+    def save_time_series(self, metering_point, obis_code, first_day, last_day, series, now=None):
+        """Store a fetched Series covering [first_day, last_day]; return readings added or changed"""
+        now = int(time.time() if now is None else now)
+        rows = [(metering_point, obis_code, *row) for row in series.rows()]
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN')
+            before = self._conn.total_changes
+            # Unchanged readings are skipped, so total_changes counts only new data
+            self._conn.executemany(
+                'INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (metering_point, obis_code, ts) DO UPDATE SET '
+                'value = excluded.value, type = excluded.type, version = excluded.version, '
+                'calculated = excluded.calculated '
+                'WHERE value != excluded.value OR type IS NOT excluded.type '
+                'OR version IS NOT excluded.version OR calculated IS NOT excluded.calculated',
+                rows
+            )
+            changed = self._conn.total_changes - before
+            if changed:
+                version = self._conn.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM day_versions').fetchone()[0]
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO day_versions VALUES (?, ?, ?, ?)',
+                    [(metering_point, obis_code, day, version) for day in range(first_day, last_day + 1)]
+                )
+            self._conn.execute(
+                'INSERT INTO series VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (metering_point, obis_code) DO UPDATE SET '
+                'unit = COALESCE(excluded.unit, unit), '
+                'interval_length = COALESCE(excluded.interval_length, interval_length)',
+                (metering_point, obis_code, series.unit, series.interval_length)
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)',
+                [(metering_point, obis_code, day, now) for day in range(first_day, last_day + 1)]
+            )
+        logger.info(f"💾 Stored {len(rows)} readings for {obis_code} (days {first_day}-{last_day}), "
+                    f"{changed} new or changed")
+        return changed
+
+    def iter_readings(self, metering_point, obis_code, start_ts, end_ts, page_size=READ_PAGE_SIZE):
+        """Yield (ts, value, type, version, calculated) rows in ts order, one page at a time"""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT ts, value, type, version, calculated FROM readings '
+                    'WHERE metering_point = ? AND obis_code = ? AND ts BETWEEN ? AND ? '
+                    'ORDER BY ts LIMIT ?',
+                    (metering_point, obis_code, start_ts, end_ts, page_size)
+                ).fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                return
+            start_ts = rows[-1][0] + 1
+
+    def series_info(self, metering_point, obis_code):
+        """Return (unit, interval_length) for a stored series"""
+        with self._lock:
+            meta = self._conn.execute(
+                'SELECT unit, interval_length FROM series WHERE metering_point = ? AND obis_code = ?',
+                (metering_point, obis_code)
+            ).fetchone()
+        return meta if meta else (None, None)
+
+    def count_readings(self, metering_point, obis_code, start_ts, end_ts):
+        """Number of stored readings with start_ts <= ts <= end_ts"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM readings '
+                'WHERE metering_point = ? AND obis_code = ? AND ts BETWEEN ? AND ?',
+                (metering_point, obis_code, start_ts, end_ts)
+            ).fetchone()[0]
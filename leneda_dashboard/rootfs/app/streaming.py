@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Incremental JSON serialization (Pure Python stdlib)
+License: GPL-3.0
+
+A year of 15-minute data is ~35k items per series. Rather than building the
+whole response as one list of dicts, one string and one bytes object, these
+generators produce the JSON text piece by piece from the compact Series, and
+chunks() groups the pieces into blocks for chunked transfer encoding. Peak
+memory is the Series (about 11 bytes per interval) plus one block, whatever
+range is requested.
+"""
+
+import json
+
+# Size of the blocks written to the socket
+STREAM_CHUNK_SIZE = 16384
+
+_encoder = json.JSONEncoder()
+
+
+def json_fragments(data):
+    """Serialize any JSON value incrementally"""
+    return _encoder.iterencode(data)
+
+
+def time_series_fragments(series, extra=None):
+    """Serialize a Series as a Leneda-shaped time-series response, item by item"""
+    header = series.header()
+    header.update(extra or {})
+    yield _encoder.encode(header)[:-1]
+    yield ', "items": ['
+    separator = ''
+    for item in series.items():
+        yield separator
+        yield _encoder.encode(item)
+        separator = ', '
+    yield ']}'
+
+
+def chunks(fragments, size=STREAM_CHUNK_SIZE):
+    """Group string fragments into UTF-8 blocks of at least size bytes"""
+    buffer = bytearray()
+    for fragment in fragments:
+        buffer += fragment.encode('utf-8')
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Leneda Energy Dashboard - Time-of-use and dynamic tariffs (Pure Python stdlib)
+License: GPL-3.0
+
+Every 15-minute interval gets its own energy price:
+- flat: one rate for every interval
+- time_of_use: rates per local time window, e.g. "22:00-06:00=0.12,06:00-22:00=0.18"
+- dynamic: hourly prices from a CSV file ("2024-05-01T13:00:00Z,0.0874" per line)
+  plus a fixed markup
+
+The cost of a day is the dot product of its interval energies with the day's
+price vector. TariffEngine.costs() prices one consumption history against any
+number of tariffs in a single pass over the cached day profiles.
+"""
+
+import os
+import re
+import time
+import logging
+import operator
+import threading
+from array import array
+from collections import OrderedDict
+
+from store import DAY_SECONDS, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+TARIFF_TYPES = ('flat', 'time_of_use', 'dynamic')
+
+MINUTES_PER_DAY = 1440
+
+# Price files of candidate tariffs sent to /api/tariff-comparison must live here
+PRICES_DIR = os.environ.get('LENEDA_PRICES_DIR', '/share')
+
+_WINDOW_RE = re.compile(r'^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})=(-?\d+(?:\.\d+)?)$')
+
+
+def parse_windows(spec):
+    """Parse 'HH:MM-HH:MM=rate,...' into (start_minute, end_minute, rate) tuples"""
+    windows = []
+    for part in (spec or '').split(','):
+        part = part.strip().replace(' ', '')
+        if not part:
+            continue
+        match = _WINDOW_RE.match(part)
+        if not match:
+            raise ValueError(f"invalid time window '{part}', expected HH:MM-HH:MM=rate")
+        start_h, start_m, end_h, end_m = (int(g) for g in match.groups()[:4])
+        if start_h > 24 or end_h > 24 or start_m > 59 or end_m > 59:
+            raise ValueError(f"invalid time in window '{part}'")
+        windows.append((start_h * 60 + start_m, end_h * 60 + end_m, float(match.group(5))))
+    return windows
+
+
+def minute_rates(windows, default_rate):
+    """Rate for each minute of a local day; windows may wrap past midnight"""
+    rates = array('d', [default_rate]) * MINUTES_PER_DAY
+    for start, end, rate in windows:
+        end = end if end > start else end + MINUTES_PER_DAY
+        for minute in range(start, end):
+            rates[minute % MINUTES_PER_DAY] = rate
+    return rates
+
+
+def utc_offset_minutes(ts):
+    """Local UTC offset at ts, in minutes"""
+    return time.localtime(ts).tm_gmtoff // 60
+
+
+def prices_file_allowed(path, tariffs):
+    """True if path is the prices_file of one of tariffs, or a file under PRICES_DIR"""
+    if any(tariff.prices_file == path for tariff in tariffs):
+        return True
+    root = os.path.realpath(PRICES_DIR)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+
+class PriceTable:
+    """Hourly prices loaded from a CSV file, re-read when the file changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.prices = {}
+        self.version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return (prices by hour start timestamp, version)"""
+        try:
+            st = os.stat(self.path)
+        except OSError as e:
+            if self.version is not None:
+                logger.warning(f"💶 Price table {self.path} unavailable: {e}")
+            self.prices, self.version = {}, None
+            return self.prices, self.version
+        version = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if version != self.version:
+                self.prices = self._load()
+                self.version = version
+            return self.prices, self.version
+
+    def _load(self):
+        prices = {}
+        skipped = 0
+        with open(self.path, 'r') as f:
+            for line in f:
+                fields = [field.strip() for field in line.replace(';', ',').split(',')]
+                if len(fields) < 2 or not fields[0] or fields[0].startswith('#'):
+                    continue
+                try:
+                    ts = parse_timestamp(fields[0])
+                    prices[ts - ts % 3600] = float(fields[1])
+                except ValueError:
+                    skipped += 1  # header line or malformed row
+        logger.info(f"💶 Loaded {len(prices)} hourly prices from {self.path}"
+                    + (f" ({skipped} lines skipped)" if skipped else ''))
+        return prices
+
+
+class TariffEngine:
+    """Prices cached consumption series against flat, time-of-use and dynamic tariffs"""
+
+    def __init__(self, aggregator, max_cached_results=1024, max_price_tables=16):
+        self.aggregator = aggregator
+        self.max_cached_results = max_cached_results
+        self.max_price_tables = max_price_tables
+        self._tables = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def price_table(self, path):
+        with self._lock:
+            table = self._tables.get(path)
+            if table is None:
+                table = self._tables[path] = PriceTable(path)
+                while len(self._tables) > self.max_price_tables:
+                    self._tables.popitem(last=False)
+            else:
+                self._tables.move_to_end(path)
+        return table
+
+    def _pricer(self, tariff, fallback_rate):
+        """Return (price_vector(day, slots, step), version) for one tariff"""
+        if tariff.type == 'time_of_use':
+            rates = minute_rates(parse_windows(tariff.windows), tariff.rate_per_kwh)
+
+            def price_vector(day, slots, step):
+                start = day * DAY_SECONDS
+                step_minutes = step // 60
+                offset = utc_offset_minutes(start)
+                if offset == utc_offset_minutes(start + DAY_SECONDS - 1):
+                    prices = array('d', (rates[(offset + i * step_minutes) % MINUTES_PER_DAY]
+                                         for i in range(slots)))
+                else:
+                    # Daylight saving time switches during this day
+                    prices = array('d', (rates[(utc_offset_minutes(start + i * step) + i * step_minutes)
+                                               % MINUTES_PER_DAY] for i in range(slots)))
+                return prices, 0
+            return price_vector, None
+
+        if tariff.type == 'dynamic':
+            hourly, version = self.price_table(tariff.prices_file).get()
+            markup = tariff.markup_per_kwh
+
+            def price_vector(day, slots, step):
+                start = day * DAY_SECONDS
+                prices = array('d', bytes(8 * slots))
+                missing = 0
+                for i in range(slots):
+                    ts = start + i * step
+                    price = hourly.get(ts - ts % 3600)
+                    if price is None:
+                        missing += 1
+                        price = fallback_rate
+                    prices[i] = price + markup
+                return prices, missing
+            return price_vector, version
+
+        def price_vector(day, slots, step):
+            return array('d', [tariff.rate_per_kwh]) * slots, 0
+        return price_vector, None
+
+    def costs(self, metering_point, obis_code, first_day, last_day, tariffs, fallback_rate):
+        """Energy cost of [first_day, last_day] under each tariff, in one pass over the days
+
+        Returns a list of dicts (one per tariff) with energy_kwh, cost and the
+        number of intervals that had no dynamic price and used fallback_rate.
+        """
+        pricers = [self._pricer(tariff, fallback_rate) for tariff in tariffs]
+        closed = self.aggregator.store.is_final(metering_point, obis_code, first_day, last_day)
+        keys = [(metering_point, obis_code, first_day, last_day, tariff, fallback_rate, version)
+                for tariff, (_, version) in zip(tariffs, pricers)]
+
+        results = [None] * len(tariffs)
+        if closed:
+            with self._lock:
+                for i, key in enumerate(keys):
+                    if key in self._results:
+                        self._results.move_to_end(key)
+                        results[i] = self._results[key]
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            profiles, _, step = self.aggregator.day_profiles(metering_point, obis_code, first_day, last_day)
+            energy = 0.0
+            totals = [0.0] * len(tariffs)
+            missing = [0] * len(tariffs)
+            for day, profile in enumerate(profiles, start=first_day):
+                values = profile.energy
+                energy += profile.total
+                for i in pending:
+                    prices, unpriced = pricers[i][0](day, len(values), step)
+                    totals[i] += sum(map(operator.mul, values, prices))
+                    missing[i] += unpriced
+            for i in pending:
+                results[i] = {'energy_kwh': energy, 'cost': totals[i], 'unpriced_intervals': missing[i]}
+
+            if closed:
+                with self._lock:
+                    for i in pending:
+                        self._results[keys[i]] = results[i]
+                    while len(self._results) > self.max_cached_results:
+                        self._results.popitem(last=False)
+        return results